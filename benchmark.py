@@ -0,0 +1,441 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+""" stl2scad benchmark suite.
+
+Generate synthetic stl meshes over a range of sizes, and time each stage of the
+stl2scad conversion pipeline on them: load, dedup, analyze, split, write.
+
+Meshes:
+- sphere: a single closed (uv) sphere surface with about N facets
+- tetrahedrons: a grid of disjoint tetrahedrons, about N facets total
+- vertex: pairs of tetrahedrons that meet at a single vertex
+- edge: pairs of tetrahedrons that meet along a single edge
+
+Each mesh is saved as both binary and ascii stl.  Results (seconds, facets per
+second, and optionally peak traced memory) for every stage are written to a
+json file, so runs can be compared for regressions.
+
+python benchmark.py --sizes 1000,10000,100000 --memory
+python benchmark.py --compare benchmark_results.json --output new_results.json
+
+With --check, run the (quick) regression checks for option combinations that
+have broken before, instead of timing anything.
+
+python benchmark.py --check
+"""
+
+import os
+import sys
+import io
+import json
+import time
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import threading
+import contextlib
+import numpy as np
+from stl import mesh, Mode
+import stl2scad
+
+# Pseudo constants
+# the unit tetrahedron: points, and faces ordered for outward normals
+TETRA_POINTS = np.array ([[ 0, 0, 0 ], [ 1, 0, 0 ], [ 0, 1, 0 ], [ 0, 0, 1 ]], dtype = np.float32 )
+TETRA_FACES = np.array ([[ 0, 2, 1 ], [ 0, 1, 3 ], [ 1, 2, 3 ], [ 0, 3, 2 ]])
+
+
+def polyhedron2mesh ( points, faces, name ):
+    """ polyhedron2mesh ( points, faces, name )
+
+    Create a numpy-stl mesh from polyhedron points and (triangle) faces
+
+    @param points - numpy array of vertex points, shape ( n, 3 )
+    @param faces - numpy array of vertex indexes for each face, shape ( m, 3 )
+    @param name - solid name for the mesh
+    @returns numpy-stl mesh.Mesh
+    """
+    data = np.zeros ( len ( faces ), dtype = mesh.Mesh.dtype )
+    data [ 'vectors' ] = np.asarray ( points, dtype = np.float32 ) [ faces ]
+    return mesh.Mesh ( data, name = name )
+# end polyhedron2mesh (…)
+
+
+def sphere_mesh ( facets ):
+    """ sphere_mesh ( facets )
+
+    Tessellated (uv) sphere, with twice as many segments around as rings from
+    pole to pole, sized to get close to the requested number of facets
+
+    @param facets - approximate number of facets to generate
+    @returns numpy-stl mesh.Mesh
+    """
+    rings = max ( 3, int ( round (( facets / 4.0 ) ** 0.5 )))
+    segments = 2 * rings
+    theta = np.linspace ( 0, np.pi, rings + 1 ) [ 1:-1 ] # latitude, without poles
+    phi = np.linspace ( 0, 2 * np.pi, segments, endpoint = False )
+    ring_points = np.stack ([
+        np.outer ( np.sin ( theta ), np.cos ( phi )),
+        np.outer ( np.sin ( theta ), np.sin ( phi )),
+        np.outer ( np.cos ( theta ), np.ones ( segments ))], axis = -1 ) * 50 + 50
+    points = np.concatenate (([[ 50, 50, 100 ]], ring_points.reshape (( -1, 3 )),
+        [[ 50, 50, 0 ]]))
+    south = len ( points ) - 1
+
+    seg = np.arange ( segments )
+    nxt = ( seg + 1 ) % segments
+    faces = [ np.stack ([ np.zeros ( segments, int ), 1 + seg, 1 + nxt ], axis = 1 )]
+    for ring in range ( rings - 2 ):
+        upper = 1 + ring * segments
+        lower = upper + segments
+        faces.append ( np.stack ([ upper + seg, lower + seg, lower + nxt ], axis = 1 ))
+        faces.append ( np.stack ([ upper + seg, lower + nxt, upper + nxt ], axis = 1 ))
+    last = 1 + ( rings - 2 ) * segments
+    faces.append ( np.stack ([ np.full ( segments, south ), last + nxt, last + seg ], axis = 1 ))
+    return polyhedron2mesh ( points, np.concatenate ( faces ), 'sphere' )
+# end sphere_mesh (…)
+
+
+def tetrahedrons_mesh ( facets ):
+    """ tetrahedrons_mesh ( facets )
+
+    Cubic grid of disjoint tetrahedrons, 4 facets each
+
+    @param facets - approximate number of facets to generate
+    @returns numpy-stl mesh.Mesh
+    """
+    count = max ( 1, facets // 4 )
+    side = int ( np.ceil ( count ** ( 1 / 3.0 )))
+    grid = np.stack ( np.unravel_index ( np.arange ( count ), ( side, side, side )), axis = 1 )
+    points = ( TETRA_POINTS [ np.newaxis ] + 2 * grid [ :, np.newaxis ]).reshape (( -1, 3 ))
+    faces = ( TETRA_FACES [ np.newaxis ] + 4 * np.arange ( count ) [ :, np.newaxis, np.newaxis ])
+    return polyhedron2mesh ( points, faces.reshape (( -1, 3 )), 'tetrahedrons' )
+# end tetrahedrons_mesh (…)
+
+
+def touching_mesh ( facets, shared ):
+    """ touching_mesh ( facets, shared )
+
+    Row of tetrahedron pairs, where the second of each pair is the first
+    reflected through a vertex, or rotated around an edge, so the 2 surfaces
+    meet at a single vertex or along a single edge (design.md test cases)
+
+    @param facets - approximate number of facets to generate
+    @param shared - 'vertex' or 'edge'
+    @returns numpy-stl mesh.Mesh
+    """
+    count = max ( 1, facets // 8 )
+    if shared == 'vertex': # reflect through vertex 0
+        second = -TETRA_POINTS
+        second_faces = TETRA_FACES [ :, ::-1 ] # reflection reverses the winding
+    else: # rotate 180° around the x axis: edge 0-1 is shared
+        second = TETRA_POINTS * np.array ([ 1, -1, -1 ], dtype = np.float32 )
+        second_faces = TETRA_FACES
+    pair_points = np.concatenate (( TETRA_POINTS, second ))
+    pair_faces = np.concatenate (( TETRA_FACES, second_faces + 4 ))
+    offsets = np.zeros (( count, 1, 3 ), dtype = np.float32 )
+    offsets [ :, 0, 0 ] = 3 * np.arange ( count )
+    points = ( pair_points [ np.newaxis ] + offsets ).reshape (( -1, 3 ))
+    faces = pair_faces [ np.newaxis ] + 8 * np.arange ( count ) [ :, np.newaxis, np.newaxis ]
+    return polyhedron2mesh ( points, faces.reshape (( -1, 3 )), shared )
+# end touching_mesh (…)
+
+
+MESH_GENERATORS = {
+    'sphere': sphere_mesh,
+    'tetrahedrons': tetrahedrons_mesh,
+    'vertex': lambda facets: touching_mesh ( facets, 'vertex' ),
+    'edge': lambda facets: touching_mesh ( facets, 'edge' )
+}
+
+
+def time_stage ( results, record, stage, trace_memory, operation ):
+    """ time_stage ( results, record, stage, trace_memory, operation )
+
+    Run and time a single pipeline stage, with console output suppressed
+
+    @param results - list to add the stage result record to
+    @param record - dictionary of information common to all stages of the case
+    @param stage - name of the stage
+    @param trace_memory - boolean true to record peak (traced) memory
+    @param operation - function (no arguments) that runs the stage
+    @returns the value returned by operation
+    """
+    if trace_memory:
+        tracemalloc.start ()
+    start_time = time.perf_counter ()
+    with contextlib.redirect_stdout ( io.StringIO ()):
+        rslt = operation ()
+    elapsed = time.perf_counter () - start_time
+    stage_record = dict ( record, stage = stage, seconds = elapsed,
+        facetsPerSecond = record [ 'facets' ] / elapsed if elapsed > 0 else None )
+    if trace_memory:
+        stage_record [ 'peakBytes' ] = tracemalloc.get_traced_memory () [ 1 ]
+        tracemalloc.stop ()
+    results.append ( stage_record )
+    print ( '{case:>12} {format:>6} {facets:>9} {stage:>9} {seconds:10.4f}s'.format (
+        **stage_record ))
+    return rslt
+# end time_stage (…)
+
+
+def benchmark_case ( results, work_dir, case, size, stl_mode, trace_memory ):
+    """ benchmark_case ( results, work_dir, case, size, stl_mode, trace_memory )
+
+    Generate one mesh, save it, then time each pipeline stage on it
+
+    @param results - list to add the stage result records to
+    @param work_dir - folder to write the stl and scad files in
+    @param case - name of the mesh generator
+    @param size - approximate number of facets to generate
+    @param stl_mode - numpy-stl Mode.BINARY or Mode.ASCII
+    @param trace_memory - boolean true to record peak (traced) memory
+    """
+    fmt = 'binary' if stl_mode == Mode.BINARY else 'ascii'
+    case_dir = os.path.join ( work_dir, '{0}_{1}_{2}'.format ( case, fmt, size ))
+    os.makedirs ( case_dir )
+    stl_spec = os.path.join ( case_dir, case + '.stl' )
+    generated = MESH_GENERATORS [ case ]( size )
+    generated.save ( stl_spec, mode = stl_mode )
+    record = { 'case': case, 'format': fmt, 'facets': len ( generated ),
+        'bytes': os.path.getsize ( stl_spec )}
+    del generated
+
+    stl_mesh = time_stage ( results, record, 'load', trace_memory,
+        lambda: stl2scad.get_mesh ( stl_spec ))
+    mdl = stl2scad.new_scad_model ( stl_spec )
+    mdl.solid = case
+    stl2scad.generate_module_name ( mdl )
+    time_stage ( results, record, 'dedup', trace_memory,
+        lambda: stl2scad.mesh2minimized_polyhedron ( mdl, stl_mesh ))
+    del stl_mesh
+    if stl_mode == Mode.ASCII:
+        text_mdl = stl2scad.new_scad_model ( stl_spec )
+        time_stage ( results, record, 'text', trace_memory,
+            lambda: stl2scad.ascii_stl2minimized_polyhedron ( text_mdl, stl_spec ))
+        del text_mdl
+    time_stage ( results, record, 'analyze', trace_memory,
+        lambda: stl2scad.check_surface_integrity ( mdl ))
+    time_stage ( results, record, 'split', trace_memory,
+        lambda: stl2scad.polyhedron2disjoint_surfaces ( mdl ))
+    # split models are written as one file per object: time writing the
+    # largest object, so the file system overhead does not swamp the result
+    largest = max ( mdl.objects, key = lambda obj: len ( obj.faces ))
+    mdl.objects = [ largest ]
+    time_stage ( results, record, 'write', trace_memory,
+        lambda: stl2scad.model2file ( mdl ))
+# end benchmark_case (…)
+
+
+def compare_results ( previous_spec, results ):
+    """ compare_results ( previous_spec, results )
+
+    Show the time ratio of the current results to a previous results file, for
+    the matching case / format / size / stage records
+
+    @param previous_spec - file specification of previous benchmark results
+    @param results - list of current stage result records
+    """
+    with open ( previous_spec, encoding = 'utf-8' ) as f_prev:
+        previous = json.load ( f_prev ) [ 'results' ]
+    lookup = {( rec [ 'case' ], rec [ 'format' ], rec [ 'facets' ], rec [ 'stage' ]): rec
+        for rec in previous }
+    print ( '\ncurrent / previous time' )
+    for rec in results:
+        prev = lookup.get (( rec [ 'case' ], rec [ 'format' ], rec [ 'facets' ], rec [ 'stage' ]))
+        if prev is None or prev [ 'seconds' ] <= 0:
+            continue
+        ratio = rec [ 'seconds' ] / prev [ 'seconds' ]
+        print ( '{case:>12} {format:>6} {facets:>9} {stage:>9} {0:8.2f}x{1}'.format (
+            ratio, '  <== slower' if ratio > 1.25 else '', **rec ))
+# end compare_results (…)
+
+
+def check_cache_merge_analyze ( work_dir ):
+    """ check_cache_merge_analyze ( work_dir )
+
+    Analyze a cached conversion that has merged (polygon) faces: the cache
+    hit must not hand polygon faces to the triangle face checks
+
+    @param work_dir - folder to write the stl and cache files in
+    """
+    stl_spec = os.path.join ( work_dir, 'tets.stl' )
+    tetrahedrons_mesh ( 40 ).save ( stl_spec, mode = Mode.BINARY )
+    options = { 'cache': os.path.join ( work_dir, 'cache' ), 'split': True,
+        'merge_faces': True }
+    first = stl2scad.convert ( stl_spec, **options )
+    again = stl2scad.convert ( stl_spec, analyze = True, **options )
+    assert len ( again.objects ) == len ( first.objects ) == 10
+# end check_cache_merge_analyze (…)
+
+
+def check_pipeline_failure ( work_dir ):
+    """ check_pipeline_failure ( work_dir )
+
+    Fail the conversion of one file in the middle of a --pipeline run: the
+    other files must still be converted, without the run stopping or hanging
+
+    @param work_dir - folder to write the stl and scad files in
+    """
+    file_specs = [ os.path.join ( work_dir, name + '.stl' ) for name in 'abc' ]
+    for file_spec in file_specs:
+        tetrahedrons_mesh ( 8 ).save ( file_spec, mode = Mode.BINARY )
+    build_scad_model = stl2scad.build_scad_model
+
+    def failing_build ( scad_model, file_spec, data = None ):
+        if file_spec == file_specs [ 1 ]:
+            raise RuntimeError ( 'simulated conversion failure' )
+        return build_scad_model ( scad_model, file_spec, data )
+    # end failing_build (…)
+
+    current_dir = os.getcwd ()
+    stl2scad.build_scad_model = failing_build
+    try:
+        os.chdir ( work_dir )
+        stl2scad.get_cmd_line_args ([ '--pipeline', '--overwrite' ] + file_specs )
+        stl2scad.initialize ()
+        with contextlib.redirect_stderr ( io.StringIO ()):
+            results = stl2scad.process_stl_files_pipelined (
+                stl2scad.CMD_LINE_ARGS.file, [])
+    finally:
+        stl2scad.build_scad_model = build_scad_model
+        os.chdir ( current_dir )
+    assert results == [ True, False, True ], results
+# end check_pipeline_failure (…)
+
+
+def check_pipeline_read_failure ( work_dir ):
+    """ check_pipeline_read_failure ( work_dir )
+
+    Fail reading one file in the middle of a --pipeline run with an error that
+    is not an OSError: the reader must still hand that file to the main loop,
+    so the run finishes instead of hanging
+
+    @param work_dir - folder to write the stl and scad files in
+    """
+    file_specs = [ os.path.join ( work_dir, name + '.stl' ) for name in 'abc' ]
+    for file_spec in file_specs:
+        tetrahedrons_mesh ( 8 ).save ( file_spec, mode = Mode.BINARY )
+
+    def failing_open ( file_spec, *args, **kwargs ):
+        if file_spec == file_specs [ 1 ]:
+            raise MemoryError ( 'simulated read failure' )
+        return open ( file_spec, *args, **kwargs ) # pylint: disable=unspecified-encoding
+    # end failing_open (…)
+
+    results = []
+    current_dir = os.getcwd ()
+    setattr ( stl2scad, 'open', failing_open ) # shadow the builtin for the reader
+    try:
+        os.chdir ( work_dir )
+        stl2scad.get_cmd_line_args ([ '--pipeline', '--overwrite' ] + file_specs )
+        stl2scad.initialize ()
+        with contextlib.redirect_stderr ( io.StringIO ()):
+            runner = threading.Thread ( daemon = True,
+                target = lambda: results.extend ( stl2scad.process_stl_files_pipelined (
+                    stl2scad.CMD_LINE_ARGS.file, [])))
+            runner.start ()
+            runner.join ( 60 )
+    finally:
+        delattr ( stl2scad, 'open' )
+        os.chdir ( current_dir )
+    assert not runner.is_alive (), 'pipeline hung'
+    assert results == [ True, False, True ], results
+# end check_pipeline_read_failure (…)
+
+
+REGRESSION_CHECKS = {
+    'cache merge analyze': check_cache_merge_analyze,
+    'pipeline failure': check_pipeline_failure,
+    'pipeline read failure': check_pipeline_read_failure
+}
+
+
+def regression_checks ():
+    """ regression_checks ()
+
+    Run each regression check in its own (temporary) folder, with console
+    output suppressed
+
+    @returns number of failed checks
+    """
+    failed = 0
+    for name, check in REGRESSION_CHECKS.items ():
+        with tempfile.TemporaryDirectory ( prefix = 'stl2scad_check_' ) as work_dir:
+            try:
+                with contextlib.redirect_stdout ( io.StringIO ()):
+                    check ( work_dir )
+                print ( '{0:>24} ok'.format ( name ))
+            except Exception as exc: # pylint: disable=broad-except
+                print ( '{0:>24} FAILED {1!r}'.format ( name, exc ))
+                failed += 1
+    return failed
+# end regression_checks (…)
+
+
+def main ():
+    '''run the benchmark suite, returning the process exit status'''
+    parser = argparse.ArgumentParser (
+        prog = 'benchmark',
+        description = 'Time the stl2scad conversion stages on generated meshes' )
+    parser.add_argument ( '--sizes',
+        default = '1000,10000,100000',
+        help = 'comma separated list of (approximate) facet counts' )
+    parser.add_argument ( '--cases',
+        default = ','.join ( MESH_GENERATORS ),
+        help = 'comma separated list of meshes to generate (default: all)' )
+    parser.add_argument ( '--formats',
+        default = 'binary,ascii',
+        help = 'comma separated list of stl file formats (default: binary,ascii)' )
+    parser.add_argument ( '--memory',
+        action = 'store_true',
+        help = 'record peak traced memory for each stage (slower)' )
+    parser.add_argument ( '--output',
+        default = 'benchmark_results.json',
+        help = 'file to save the results to (default: benchmark_results.json)' )
+    parser.add_argument ( '--compare',
+        help = 'previous results file to compare against' )
+    parser.add_argument ( '--check',
+        action = 'store_true',
+        help = 'run the regression checks, instead of the benchmarks' )
+    args = parser.parse_args ()
+
+    if args.check:
+        return 1 if regression_checks () else 0
+
+    stl2scad.get_cmd_line_args ([ '--split' ])
+    stl2scad.initialize ()
+    modes = { 'binary': Mode.BINARY, 'ascii': Mode.ASCII }
+
+    results = []
+    with tempfile.TemporaryDirectory ( prefix = 'stl2scad_bench_' ) as work_dir:
+        for size in [ int ( sz ) for sz in args.sizes.split ( ',' )]:
+            for case in args.cases.split ( ',' ):
+                for fmt in args.formats.split ( ',' ):
+                    benchmark_case ( results, work_dir, case, size, modes [ fmt ], args.memory )
+
+    with open ( args.output, 'w', encoding = 'utf-8' ) as f_out:
+        json.dump ({
+            'version': stl2scad.STL2SCAD_VERSION,
+            'python': platform.python_version (),
+            'numpy': np.__version__,
+            'platform': platform.platform (),
+            'time': time.strftime ( '%Y-%m-%dT%H:%M:%S' ),
+            'results': results }, f_out, indent = 1 )
+    print ( '\nresults saved to {0}'.format ( args.output ))
+    if args.compare:
+        compare_results ( args.compare, results )
+    return 0
+# end main (…)
+
+
+# Run the benchmarks
+if __name__ == '__main__':
+    sys.exit ( main ())
+
+# cSpell:disable
+# cSpell:enable
+# names, variable names, keywords
+#   cSpell:words tracemalloc nxt
+# cSpell:enableCompoundWords
@@ -18,49 +18,249 @@ pipenv install
 
 import os
 import sys
+import re
+import io
+import hashlib
+import heapq
 import argparse
-import array
-import time # DEBUG
-from functools import wraps # DEBUG
-import numpy as np
-from stl import mesh
+import contextlib
+import concurrent.futures
+import traceback
+import zipfile
+import mmap
+import time
+import json
+import tracemalloc
+import threading
+import queue
+import tempfile
+import contextvars
+import csv
+import typing
 
 # Pseudo constants
 # Semantic Versioning 2.0.0 # http://semver.org/
 STL2SCAD_VERSION = '0.0.6'
+# number of points or faces formatted together when writing a .scad file
+SCAD_BLOCK_ROWS = 4096
+# binary stl file layout: header, facet count, then facet records
+STL_HEADER_SIZE = 80
+STL_COUNT_SIZE = 4
+# coordinate rounding, relative to the largest coordinate, when comparing
+# (translated) surfaces for --instances
+INSTANCE_TOLERANCE = 1e-6
+# distance from the plane, relative to the largest coordinate, for --merge-faces
+COPLANAR_TOLERANCE = 1e-6
+# approximate memory used to dedup each vertex in memory, for --memory-budget
+DEDUP_BYTES_PER_VERTEX = 64
+# most temporary files to spill vertexes to, for an out of core dedup
+MAX_SPILL_BUCKETS = 256
+# triangles in each leaf of the bounding volume hierarchy, for --voids and --analyze
+BVH_LEAF_SIZE = 8
+# overlap, relative to the largest coordinate, for triangles to intersect (--analyze)
+INTERSECTION_TOLERANCE = 1e-9
+# leaf pairs (up to BVH_LEAF_SIZE squared triangle pairs each) checked together for self
+# intersection, to limit the memory used
+INTERSECTION_BATCH = 16384
+# smallest determinant, relative to the cubed trace, of a quadric that can be solved for the
+# point with the least error (--decimate-ratio, --decimate-faces)
+QUADRIC_SINGULAR = 1e-9
 
 # regular globals: might be better implemented as singleton
 # objectSequence = 0 # use when multiple stl input files, and overriding output
 # file or module name
-CMD_LINE_ARGS = None # command line line argument information used throughout
-CFG = {}
 
 
-def elapsed_time ( context ):
-    """ elapsed_time ( context )
+class ContextSettings:
+    """ ContextSettings ( name, process_value )
 
-    Elapsed time reporting decorator
+    Settings that the conversion code uses as module globals: the parsed command
+    line arguments, or the processing configuration.
 
-    NOTE: Decorators need to be defined before use
+    The value comes from a context variable when that is set, so each convert()
+    call uses its own settings, without changing (or being changed by) any
+    other conversion, and otherwise from the process wide value set from the
+    command line.  Attribute and item lookups go to the current value.
 
-    IDEA: Move to external common library, then import
+    @param name - name for the context variable
+    @param process_value - initial process wide value
+    """
+    __slots__ = ( 'context_value', 'process_value' )
+
+    def __init__ ( self, name, process_value ):
+        self.context_value = contextvars.ContextVar ( name )
+        self.process_value = process_value
+    # end __init__ (…)
+
+    def current ( self ):
+        """ the settings value for the current context """
+        return self.context_value.get ( self.process_value )
+
+    def __getattr__ ( self, name ):
+        return getattr ( self.current (), name )
+
+    def __getitem__ ( self, key ):
+        return self.current () [ key ]
+
+    def __setitem__ ( self, key, value ):
+        self.current () [ key ] = value
+# end class ContextSettings
+
+
+# command line line argument information used throughout
+CMD_LINE_ARGS = ContextSettings ( 'CMD_LINE_ARGS', None )
+CFG = ContextSettings ( 'CFG', {})
+# heavy libraries, only imported (by import_libraries) when a conversion runs
+if typing.TYPE_CHECKING: # let the linter see the real modules
+    import numpy as np
+    from stl import mesh
+else:
+    np = None # pylint: disable=invalid-name
+    mesh = None # pylint: disable=invalid-name
 
-    @param context - string to include in elapsed time report
-    @returns elapsed time decorator
+
+class ThreadProfile ( threading.local ):
+    """ ThreadProfile ()
+
+    The stage timing report for the stl file being processed.  Each thread has
+    its own report, so that --pipeline stages for different files do not mix.
     """
-    def decorator ( timed_function ):
-        @wraps ( timed_function )
-        def wrapper ( *args, **kwargs ):
-            start_time = time.time ()
-            rslt = timed_function ( *args, **kwargs )
-            end_time = time.time ()
-            print ( 'elapsed time for {0}: {1}'.format ( context, end_time - start_time ))
-            return rslt
-        # end wrapper (…)
-        return wrapper
-    # end decorator (…)
-    return decorator
-# end elapsed_time (…)
+    report = None # default for every thread
+# end class ThreadProfile
+
+
+PROFILE = ThreadProfile ()
+
+
+def start_file_profile ( mdl ):
+    """ start_file_profile ( mdl )
+
+    Start collecting the profile report for a single stl file, when --profile
+    is active
+
+    @inputs global CMD_LINE_ARGS - parsed command line arguments
+    @param mdl - the (new) 3d scad model for the stl file
+    @outputs global PROFILE
+    """
+    if not CMD_LINE_ARGS.profile:
+        PROFILE.report = None
+        return
+    if CMD_LINE_ARGS.profile_memory and not tracemalloc.is_tracing ():
+        tracemalloc.start ()
+    PROFILE.report = {
+        'stlFile': os.path.join ( mdl.stl_path, mdl.stl_file ),
+        'stages': [],
+        'counts': {},
+        'start': time.perf_counter ()
+    }
+# end start_file_profile (…)
+
+
+@contextlib.contextmanager
+def profile_stage ( stage ):
+    """ profile_stage ( stage )
+
+    Context manager to record the elapsed time (and optionally the peak traced
+    memory) of a processing stage in the file profile report.  Does nothing when
+    not profiling.
+
+    @inputs global PROFILE
+    @param stage - name of the stage to record
+    """
+    if PROFILE.report is None:
+        yield
+        return
+    if tracemalloc.is_tracing ():
+        tracemalloc.reset_peak ()
+    start_time = time.perf_counter ()
+    yield
+    stage_record = { 'stage': stage, 'seconds': time.perf_counter () - start_time }
+    if tracemalloc.is_tracing ():
+        stage_record [ 'peakBytes' ] = tracemalloc.get_traced_memory () [ 1 ]
+    PROFILE.report [ 'stages' ].append ( stage_record )
+# end profile_stage (…)
+
+
+def profile_counts ( mdl ):
+    """ profile_counts ( mdl )
+
+    Record the current object, face and point counts of the model in the file
+    profile report.  Does nothing when not profiling.
+
+    @inputs global PROFILE
+    @param mdl - the 3d scad model
+    """
+    if PROFILE.report is None:
+        return
+    PROFILE.report [ 'counts' ] = {
+        'objects': len ( mdl.objects ),
+        'faces': sum ( len ( obj.faces ) for obj in mdl.objects ),
+        'points': sum ( len ( obj.points ) for obj in mdl.objects ),
+        'copies': sum ( len ( obj.copies ) for obj in mdl.objects if obj.copies is not None )
+    }
+# end profile_counts (…)
+
+
+def finish_file_profile ( mdl, good, save_report = True ):
+    """ finish_file_profile ( mdl, good, save_report )
+
+    Complete the profile report for a single stl file, and save it as json, next
+    to the .scad file(s)
+
+    @inputs global PROFILE
+    @param mdl - the 3d scad model for the stl file
+    @param good - boolean false if the file could not be converted
+    @param save_report - false to only return the report, without saving it
+    @returns the completed report, or None when not profiling
+    """
+    if PROFILE.report is None:
+        return None
+    report = PROFILE.report
+    report [ 'seconds' ] = time.perf_counter () - report.pop ( 'start' )
+    report [ 'converted' ] = bool ( good )
+    if not save_report:
+        return report
+    if mdl.model is None: # failed before a module name was available
+        mdl.model = os.path.splitext ( mdl.stl_file ) [ 0 ]
+    report_spec = os.path.splitext ( full_scad_file_spec ( mdl, '' )) [ 0 ] + '.profile.json'
+    with open ( report_spec, 'w', encoding = 'utf-8' ) as f_report:
+        json.dump ( report, f_report, indent = 1 )
+    return report
+# end finish_file_profile (…)
+
+
+def save_run_profile ( reports ):
+    """ save_run_profile ( reports )
+
+    Save the run level profile summary, combining the per file reports
+
+    @inputs global CMD_LINE_ARGS - parsed command line arguments
+    @param reports - list of per file profile reports
+    """
+    stage_totals = {}
+    for report in reports:
+        for stage_record in report [ 'stages' ]:
+            total = stage_totals.setdefault ( stage_record [ 'stage' ],
+                { 'seconds': 0.0, 'count': 0 })
+            total [ 'seconds' ] += stage_record [ 'seconds' ]
+            total [ 'count' ] += 1
+            if 'peakBytes' in stage_record:
+                total [ 'peakBytes' ] = max ( total.get ( 'peakBytes', 0 ),
+                    stage_record [ 'peakBytes' ])
+    summary = {
+        'version': STL2SCAD_VERSION,
+        'files': len ( reports ),
+        'converted': sum ( 1 for report in reports if report [ 'converted' ]),
+        'seconds': sum ( report [ 'seconds' ] for report in reports ),
+        'faces': sum ( report [ 'counts' ].get ( 'faces', 0 ) for report in reports ),
+        'stages': stage_totals,
+        'reports': [{ 'stlFile': report [ 'stlFile' ], 'seconds': report [ 'seconds' ]}
+            for report in reports ]
+    }
+    with open ( CMD_LINE_ARGS.profile_summary, 'w', encoding = 'utf-8' ) as f_summary:
+        json.dump ( summary, f_summary, indent = 1 )
+    print ( 'profile summary ==> {0}'.format ( CMD_LINE_ARGS.profile_summary ))
+# end save_run_profile (…)
 
 
 def mesh2polyhedron ( mdl, msh ):
@@ -75,11 +275,11 @@ def mesh2polyhedron ( mdl, msh ):
     @outputs updated mdl
     """
     pts = np.reshape( msh.vectors, ( -1, 3 )) # change shape( facets, 3, 3 ) to ( facets * 3, 3 )
-    face_points = np.reshape( np.arange( 0, len ( pts )), ( -1, 3 ))
+    face_points = np.reshape( np.arange( 0, len ( pts ), dtype = np.int32 ), ( -1, 3 ))
     # straight start to finish point sequence
 
     # scad polyhedron details
-    mdl [ 'objects' ].append ({ 'points': pts, 'faces': face_points })
+    mdl.objects.append ( ScadObject ( pts, face_points ))
 # end mesh2polyhedron (…)
 
 
@@ -91,27 +291,328 @@ def mesh2minimized_polyhedron ( mdl, msh ):
     Remove duplicate vertices, and adjust the face indices to match the collapsed
     set of data points.
 
+    @inputs global CMD_LINE_ARGS - parsed command line arguments
+
     @param mdl - the 3d scad model to update
     @param msh - the stl mesh (numpy-stl) to get model information from
     @outputs updated mdl
     """
     pnt_vectors = np.reshape ( msh.vectors, ( -1, 3 )) # ( n, 3, 3 ) to ( 3n, 3 )
-    # convert vertex point with x,y,z coordinates to single string that can be compared easily
-    pnt_strings = [ point2str ( pt ) for pt in  pnt_vectors ] # 3n strings, not a numpy array
-
-    # unq_strings = unique vector string representations from pnt_strings
-    # vector_idx = indexes into pnt_strings that gave entries in unq_strings
-    # face_points = for each ptString entry, index in unq_strings
-    _unq_strings, vector_idx, face_points = np.unique (
-        pnt_strings, return_index = True, return_inverse = True )
+    # unq_points = unique vertex points from pnt_vectors
+    # face_points = for each pnt_vectors entry, index in unq_points
+    unq_points, face_points = unique_vertexes ( pnt_vectors )
+    if CMD_LINE_ARGS.legacy_order:
+        unq_points, face_points = text_ordered_vertexes ( unq_points, face_points )
 
     # scad polyhedron details
-    mdl [ 'objects' ].append ({
-        'points': np.array([ pnt_vectors[i] for i in vector_idx]), # recreate numeric vectors
-        'faces': np.reshape ( face_points, ( -1, 3 )) }) # vectors lookup for face point groups
+    mdl.objects.append ( ScadObject ( unq_points,
+        np.reshape ( face_points, ( -1, 3 )))) # vectors lookup for face point groups
 # end mesh2minimized_polyhedron (…)
 
 
+def vertex_order_keys ( pts ):
+    """ vertex_order_keys ( pts )
+
+    Map floating point vertex coordinates to unsigned integer keys that sort in
+    the same order as the (single precision) values.  Every distinct bit pattern
+    gets a distinct key, so -0 and 0 stay separate, the same as they do when
+    compared as point2str text.
+
+    @param pts - numpy array of vertex points, shape ( n, 3 )
+    @returns numpy uint32 array of sortable coordinate keys, shape ( n, 3 )
+    """
+    bits = np.ascontiguousarray ( pts, dtype = np.float32 ).view ( np.uint32 )
+    # negative values: flip all bits; positive values: flip only the sign bit
+    return np.where ( bits & 0x80000000, ~bits, bits | 0x80000000 )
+# end vertex_order_keys (…)
+
+
+def unique_vertexes ( pts ):
+    """ unique_vertexes ( pts )
+
+    Collapse duplicate vertex points, working directly on the numeric data.
+
+    Points are the same when all of their (single precision) coordinates are
+    identical, which is the same rule as comparing the point2str text.  The
+    unique points are ordered by x, then y, then z coordinate.
+
+    @param pts - numpy array of vertex points, shape ( n, 3 )
+    @returns tuple with contiguous float32 array of unique points, shape ( u, 3 ),
+      and int32 array with the unique point index for each input point
+    """
+    order, is_new, inverse = unique_order_keys ( vertex_order_keys ( pts ))
+    unq_points = np.ascontiguousarray ( pts [ order [ is_new ]], dtype = np.float32 )
+    return unq_points, inverse
+# end unique_vertexes (…)
+
+
+def unique_order_keys ( keys ):
+    """ unique_order_keys ( keys )
+
+    Sort vertex_order_keys, and find the unique (sorted) keys
+
+    @param keys - numpy uint32 array of sortable coordinate keys, shape ( n, 3 )
+    @returns tuple of numpy arrays: the sort order of the keys, flags for the
+      first of each run of identical sorted keys, and the (int32) unique key
+      index for each input key
+    """
+    # pack x and y to a single sort key: 2 sort passes instead of 3
+    xy_keys = keys [ :, 0 ].astype ( np.uint64 ) << np.uint64 ( 32 ) | keys [ :, 1 ]
+    order = np.lexsort (( keys [ :, 2 ], xy_keys ))
+    del xy_keys
+    sorted_keys = keys [ order ]
+    del keys
+
+    # flag the first of each run of identical (sorted) points
+    is_new = np.empty ( len ( sorted_keys ), dtype = bool )
+    is_new [ :1 ] = True
+    np.any ( sorted_keys [ 1: ] != sorted_keys [ :-1 ], axis = 1, out = is_new [ 1: ])
+    del sorted_keys
+
+    inverse = np.empty ( len ( order ), dtype = np.int32 )
+    inverse [ order ] = np.cumsum ( is_new ) - 1
+    return order, is_new, inverse
+# end unique_order_keys (…)
+
+
+def text_ordered_vertexes ( pts, point_idx ):
+    """ text_ordered_vertexes ( pts, point_idx )
+
+    Reorder unique vertex points to the (sorted) sequence of their point2str
+    text.  That is the order that earlier versions produced, by using the
+    formatted strings as the comparison keys, so the generated .scad files are
+    identical.  Only the already unique points get formatted.
+
+    @param pts - numpy array of unique vertex points, shape ( u, 3 )
+    @param point_idx - numpy array of indexes into pts
+    @returns tuple of reordered points, and point_idx adjusted to match
+    """
+    text_order = np.argsort ( np.array ([ point2str ( pt ) for pt in pts ]), kind = 'stable' )
+    new_idx = np.empty ( len ( text_order ), dtype = np.int32 )
+    new_idx [ text_order ] = np.arange ( len ( text_order ), dtype = np.int32 )
+    return pts [ text_order ], new_idx [ point_idx ]
+# end text_ordered_vertexes (…)
+
+
+def spilled_minimized_polyhedron ( mdl, msh ):
+    """ spilled_minimized_polyhedron ( mdl, msh )
+
+    Populate .scad 3d polyhedron model from a stored stl mesh, the same as
+    mesh2minimized_polyhedron, but without using more than the --memory-budget
+    for the (normally full size) dedup work arrays.
+
+    External sort: the vertexes are read from the mesh a chunk at a time, and
+    spilled to temporary bucket files, by ranges of the sort (x then y) key.  The
+    range limits are picked from a sample of the vertexes, so the buckets are
+    about the same size.  Each bucket is then (memory mapped and) sorted by
+    itself, which gives the unique points in the same order as sorting them all
+    together.  The points and the face point indexes are written to (memory
+    mapped) temporary files as each bucket is finished.
+
+    @inputs global CMD_LINE_ARGS - parsed command line arguments
+
+    @param mdl - the 3d scad model to update
+    @param msh - the stl mesh (numpy-stl) to get model information from
+    @returns boolean false when the dedup fits in the memory budget, and
+      nothing was done
+    @outputs updated mdl
+    """
+    vertex_count = 3 * len ( msh.vectors )
+    budget_vertexes = CMD_LINE_ARGS.memory_budget * 1024 * 1024 // DEDUP_BYTES_PER_VERTEX
+    if CMD_LINE_ARGS.memory_budget <= 0 or vertex_count <= budget_vertexes:
+        return False
+    chunk_facets = max ( 1, budget_vertexes // 3 )
+    spill_record = np.dtype ([( 'keys', np.uint32, 3 ), ( 'vertex', np.int64 )])
+
+    # bucket limits (for the packed x and y sort key) from a sample of the vertexes
+    bucket_count = min ( MAX_SPILL_BUCKETS, 2 * -( -vertex_count // budget_vertexes ))
+    sample_keys = vertex_order_keys ( np.reshape ( msh.vectors [
+        ::max ( 1, len ( msh.vectors ) // chunk_facets )], ( -1, 3 )))
+    sample_keys = np.sort ( sample_keys [ :, 0 ].astype ( np.uint64 ) << np.uint64 ( 32 ) |
+        sample_keys [ :, 1 ])
+    bucket_limits = np.unique ( sample_keys [ len ( sample_keys ) *
+        np.arange ( 1, bucket_count ) // bucket_count ])
+    del sample_keys
+
+    spill_files = [ tempfile.TemporaryFile () for _limit in range ( len ( bucket_limits ) + 1 )]
+    for start in range ( 0, len ( msh.vectors ), chunk_facets ):
+        keys = vertex_order_keys ( np.reshape ( msh.vectors [ start: start + chunk_facets ],
+            ( -1, 3 )))
+        records = np.empty ( len ( keys ), dtype = spill_record )
+        records [ 'keys' ] = keys
+        records [ 'vertex' ] = np.arange ( 3 * start, 3 * start + len ( keys ))
+        bucket = np.searchsorted ( bucket_limits, keys [ :, 0 ].astype ( np.uint64 ) <<
+            np.uint64 ( 32 ) | keys [ :, 1 ], side = 'right' )
+        del keys
+        bucket_order = np.argsort ( bucket, kind = 'stable' )
+        bucket_starts = np.searchsorted ( bucket [ bucket_order ],
+            np.arange ( len ( spill_files ) + 1 ))
+        records = records [ bucket_order ]
+        for idx, f_spill in enumerate ( spill_files ):
+            records [ bucket_starts [ idx ]: bucket_starts [ idx + 1 ]].tofile ( f_spill )
+
+    points_file = tempfile.TemporaryFile ()
+    face_points = np.memmap ( tempfile.TemporaryFile (), dtype = np.int32, mode = 'w+',
+        shape = ( vertex_count, ))
+    point_total = 0
+    for f_spill in spill_files:
+        f_spill.flush ()
+        if f_spill.tell () > 0:
+            records = np.memmap ( f_spill, dtype = spill_record, mode = 'r' )
+            keys = np.array ( records [ 'keys' ])
+            order, is_new, inverse = unique_order_keys ( keys )
+            face_points [ records [ 'vertex' ]] = point_total + inverse
+            unq_keys = keys [ order [ is_new ]]
+            del records, keys, order, is_new, inverse
+            order_keys2points ( unq_keys ).tofile ( points_file )
+            point_total += len ( unq_keys )
+        f_spill.close ()
+
+    points_file.flush ()
+    unq_points = np.memmap ( points_file, dtype = np.float32, mode = 'r',
+        shape = ( point_total, 3 )) if point_total else np.empty (( 0, 3 ), np.float32 )
+    face_points.flush ()
+    if CMD_LINE_ARGS.legacy_order:
+        unq_points, face_points = text_ordered_vertexes ( unq_points, face_points )
+    mdl.objects.append ( ScadObject ( unq_points, np.reshape ( face_points, ( -1, 3 ))))
+    return True
+# end spilled_minimized_polyhedron (…)
+
+
+def order_keys2points ( keys ):
+    """ order_keys2points ( keys )
+
+    Convert vertex_order_keys back to the (single precision) vertex coordinates
+
+    @param keys - numpy uint32 array of sortable coordinate keys, shape ( n, 3 )
+    @returns numpy float32 array of vertex points, shape ( n, 3 )
+    """
+    return np.where ( keys & 0x80000000, keys ^ 0x80000000, ~keys ).astype (
+        np.uint32 ).view ( np.float32 )
+# end order_keys2points (…)
+
+
+def weld_vertexes ( mdl ):
+    """ weld_vertexes ( mdl )
+
+    Merge vertex points that are within the --weld distance of each other, then
+    drop the faces that no longer have 3 different vertex points.
+
+    Points closer than the distance are linked (close_point_pairs), and every
+    connected set of linked points becomes the lowest point index of the set.
+    Points that are no longer used are dropped.
+
+    @inputs global CMD_LINE_ARGS - parsed command line arguments
+
+    @param mdl - the 3d scad model to update
+    @outputs updated mdl
+    """
+    for obj in mdl.objects:
+        # points as text (--keep-text) are converted to numbers
+        point_a, point_b = close_point_pairs ( obj.points.astype ( np.float64 ),
+            CMD_LINE_ARGS.weld )
+        labels = connected_labels ( len ( obj.points ), point_a, point_b )
+        faces = labels [ obj.faces ]
+        degenerate = (( faces [ :, 0 ] == faces [ :, 1 ]) | ( faces [ :, 1 ] == faces [ :, 2 ]) |
+            ( faces [ :, 2 ] == faces [ :, 0 ]))
+        faces = faces [ ~degenerate ]
+        used = np.zeros ( len ( obj.points ), dtype = bool )
+        used [ faces ] = True
+        new_index = np.cumsum ( used ) - 1
+        if CMD_LINE_ARGS.verbose:
+            print ( '{0} vertexes welded, {1} degenerate faces dropped'.format (
+                len ( obj.points ) - np.count_nonzero ( used ), np.count_nonzero ( degenerate )))
+        obj.point_buffer = obj.points [ used ]
+        obj.point_range = ( 0, len ( obj.point_buffer ))
+        obj.face_buffer = new_index [ faces ].astype ( np.int32 )
+        obj.face_range = ( 0, len ( obj.face_buffer ))
+        obj.edge_index = None
+# end weld_vertexes (…)
+
+
+def close_point_pairs ( points, distance ):
+    """ close_point_pairs ( points, distance )
+
+    Find the pairs of points that are within a distance of each other, using a
+    uniform spatial hash grid.
+
+    The grid cells are the size of the distance, so close points are always in
+    the same or neighbouring cells.  The points are sorted by the hash of their
+    cell, so the points of all of the cells with the same hash are a range of
+    the sorted points, and each run of points from a single cell is a 'cell'
+    below.  The points of every cell are paired with the points in the range
+    for the same cell,
+    and for each of the 13 neighbour cells 'after' it (the other 13 neighbours
+    see the cell as after them), one neighbour offset at a time for all of the
+    cells.  Different cells with the same hash only add pairs that are then
+    too far apart.
+
+    @param points - numpy float64 array of points, shape ( n, 3 )
+    @param distance - the greatest distance between points of a pair
+    @returns tuple of numpy arrays: point index pairs, each pair at least once
+    """
+    cells = np.floor ( points / distance ).astype ( np.int64 )
+    cell_primes = np.array ([ 73856093, 19349663, 83492791 ], dtype = np.int64 )
+    cell_hashes = cells * cell_primes
+    point_keys = cell_hashes [ :, 0 ] ^ cell_hashes [ :, 1 ] ^ cell_hashes [ :, 2 ]
+    point_order = np.argsort ( point_keys )
+    sorted_keys = point_keys [ point_order ]
+    sorted_cells = cells [ point_order ]
+    del cells, cell_hashes, point_keys
+    is_first = np.empty ( len ( points ), dtype = bool )
+    is_first [ :1 ] = True
+    np.any ( sorted_cells [ 1: ] != sorted_cells [ :-1 ], axis = 1, out = is_first [ 1: ])
+    cell_first = np.flatnonzero ( is_first )
+    cell_size = np.diff ( np.append ( cell_first, len ( points )))
+    grid_cells = sorted_cells [ cell_first ]
+    del sorted_cells
+    # the range of sorted points for each hash
+    is_first [ 1: ] = sorted_keys [ 1: ] != sorted_keys [ :-1 ]
+    key_first = np.flatnonzero ( is_first )
+    key_size = np.diff ( np.append ( key_first, len ( points )))
+    hash_keys = sorted_keys [ key_first ]
+    del sorted_keys, is_first
+
+    pairs_a, pairs_b = [], []
+    for offset in [( dx, dy, dz ) for dx in ( 0, 1 ) for dy in ( -1, 0, 1 )
+            for dz in ( -1, 0, 1 ) if ( dx, dy, dz ) >= ( 0, 0, 0 )]:
+        neighbour_hashes = ( grid_cells + offset ) * cell_primes
+        neighbour_keys = ( neighbour_hashes [ :, 0 ] ^ neighbour_hashes [ :, 1 ] ^
+            neighbour_hashes [ :, 2 ])
+        del neighbour_hashes
+        # searching for sorted values is much faster
+        key_order = np.argsort ( neighbour_keys )
+        neighbour_key = np.empty ( len ( grid_cells ), dtype = np.int64 )
+        neighbour_key [ key_order ] = np.minimum ( np.searchsorted ( hash_keys,
+            neighbour_keys [ key_order ]), len ( hash_keys ) - 1 )
+        near = hash_keys [ neighbour_key ] == neighbour_keys
+        if offset == ( 0, 0, 0 ): # only the cell itself
+            near &= key_size [ neighbour_key ] > 1
+        near = np.flatnonzero ( near )
+        neighbour_first = key_first [ neighbour_key [ near ]]
+        neighbour_size = key_size [ neighbour_key [ near ]]
+
+        # every point of each cell, with every point of the neighbour range
+        pair_count = cell_size [ near ] * neighbour_size
+        pair_cell = np.repeat ( np.arange ( len ( near )), pair_count )
+        pair_seq = np.arange ( len ( pair_cell )) - np.repeat (
+            np.cumsum ( pair_count ) - pair_count, pair_count )
+        point_a = point_order [ cell_first [ near ] [ pair_cell ] +
+            pair_seq // neighbour_size [ pair_cell ]]
+        point_b = point_order [ neighbour_first [ pair_cell ] +
+            pair_seq % neighbour_size [ pair_cell ]]
+        del pair_cell, pair_seq
+        if offset == ( 0, 0, 0 ): # each pair in the same cell once
+            keep = point_a < point_b
+            point_a, point_b = point_a [ keep ], point_b [ keep ]
+        between = points [ point_a ] - points [ point_b ]
+        close = np.einsum ( 'ij,ij->i', between, between ) <= distance * distance
+        pairs_a.append ( point_a [ close ])
+        pairs_b.append ( point_b [ close ])
+    return np.concatenate ( pairs_a ), np.concatenate ( pairs_b )
+# end close_point_pairs (…)
+
+
 def polyhedron2disjoint_surfaces ( mdl ):
     """ polyhedron2disjoint_surfaces( mdl )
 
@@ -121,154 +622,1364 @@ def polyhedron2disjoint_surfaces ( mdl ):
     The total number of faces and points in the generated polyhedrons will be the
     same as the number of faces in the input polyhedron.
 
-    This will likely fail, or not split, disjoint surfaces that actually have one
-    or more vertex points in common.
-    TODO detect / handle in later versions
+    Faces are on the same surface when they share an edge (the same 2 vertex
+    points, in the opposite direction).  Surfaces that only touch at a vertex
+    point become separate polyhedrons.  Surfaces that meet along an edge are
+    kept together.
+    TODO detect / handle the shared edge case in later versions
 
     @param mdl - the 3d scad model to update
     @outputs updated mdl
     """
-    def faces2edge_hashes ( faces ):
-        """ faces2edge_hashes ( faces )
+    disjoint_polyhedron = []
 
-        Generate edge based hashes from the vertex point indexes of the faces.  These
-        are used to match adjacent (edge to edge) connected faces of a surface.
+    for obj in mdl.objects:
+        surface_labels = label_face_surfaces ( obj.half_edges )
+        disjoint_polyhedron.extend ( surfaces2polyhedrons ( obj, surface_labels ))
+    # end for obj in mdl.objects
 
-        @param faces - array of face vertex indexes for each face of a polyhedron
-        @returns dictionary of hashes used for locating disjoint surfaces in the faces
+    mdl.objects = disjoint_polyhedron
+# end polyhedron2disjoint_surfaces(…)
+
+
+def index_half_edges ( mdl ):
+    """ index_half_edges ( mdl )
+
+    Build the half edge index of every (triangle face) object in the model, so
+    the stages that use the edge topology share it, and the time to build it is
+    recorded separately.
+
+    @inputs global CMD_LINE_ARGS - parsed command line arguments
+
+    @param mdl - the 3d scad model
+    @outputs half edge index attached to the model objects
+    """
+    index_bytes = sum ( obj.half_edges.nbytes () for obj in mdl.objects
+        if obj.face_starts is None )
+    if CMD_LINE_ARGS.verbose:
+        print ( 'half edge index uses {0} bytes'.format ( index_bytes ))
+# end index_half_edges (…)
+
+
+def face_edge_keys ( faces ):
+    """ face_edge_keys ( faces )
+
+    Generate edge based hashes from the vertex point indexes of the faces.  These
+    are used to match adjacent (edge to edge) connected faces of a surface.
+
+    Each hash is a 64 bit integer, with the index of the first endpoint of the
+    directed edge in the upper 32 bits, and the index of the second endpoint in
+    the lower 32 bits.  Edges are in face order, 3 per face: the edge index
+    divided by 3 is the face index.
+
+    @param faces - array of face vertex indexes for each face of a polyhedron
+    @returns tuple of int64 numpy arrays of forward and reverse direction edge hashes
+    """
+    edge_start = np.asarray ( faces, dtype = np.int64 )
+    edge_end = np.roll ( edge_start, -1, axis = 1 )
+    edge_start = np.reshape ( edge_start, -1 )
+    edge_end = np.reshape ( edge_end, -1 )
+    return edge_start << 32 | edge_end, edge_end << 32 | edge_start
+# end face_edge_keys (…)
+
+
+class HalfEdgeIndex:
+    """ HalfEdgeIndex ( faces )
+
+    The edge topology of a triangle mesh, built once, then shared by the
+    surface checks, the surface split, and the coplanar face merge.
+
+    Every face has 3 half edges (directed edges), in face order: the half edge
+    index divided by 3 is the face index, so the face of an edge does not need
+    to be stored.  The half edges are sorted by their ( start point, end point )
+    key, so the half edges going the reverse direction are found by binary
+    search.  Only int32 arrays are kept: the keys are dropped after
+    the search.
+
+    @param faces - numpy array of point indexes for each triangle, shape ( m, 3 )
+    """
+    __slots__ = ( 'edge_order', 'edge_count', 'first_match', 'match_count', 'twin_edges' )
+
+    def __init__ ( self, faces ):
+        fwd_keys, rev_keys = face_edge_keys ( faces )
+        edge_order = np.argsort ( fwd_keys, kind = 'stable' )
+        sorted_keys = fwd_keys [ edge_order ]
+        del fwd_keys
+
+        # the number of instances of each directed edge, from the runs of equal keys
+        run_first = np.empty ( len ( sorted_keys ), dtype = bool )
+        run_first [ :1 ] = True
+        np.not_equal ( sorted_keys [ 1: ], sorted_keys [ :-1 ], out = run_first [ 1: ])
+        run_starts = np.append ( np.flatnonzero ( run_first ), len ( sorted_keys ))
+        self.edge_count = np.empty ( len ( sorted_keys ), dtype = np.int32 )
+        self.edge_count [ edge_order ] = np.repeat ( np.diff ( run_starts ),
+            np.diff ( run_starts ))
+        del run_first, run_starts
+
+        # range of (sorted) edges that match the reverse of each edge.  Searching
+        # for sorted values is much faster than searching in (random) edge order
+        rev_order = np.argsort ( rev_keys )
+        rev_keys = rev_keys [ rev_order ]
+        self.first_match = np.empty ( len ( rev_order ), dtype = np.int32 )
+        self.match_count = np.empty ( len ( rev_order ), dtype = np.int32 )
+        self.first_match [ rev_order ] = np.searchsorted ( sorted_keys, rev_keys, side = 'left' )
+        self.match_count [ rev_order ] = np.searchsorted ( sorted_keys, rev_keys,
+            side = 'right' )
+        self.match_count -= self.first_match
+        del rev_keys, rev_order
+
+        self.edge_order = edge_order.astype ( np.int32 )
+        self.twin_edges = None
+    # end __init__ (…)
+
+    def matched_pairs ( self ):
+        """ matched_pairs ()
+
+        Every pairing of a half edge with a half edge going the reverse direction
+
+        @returns tuple of numpy arrays: half edge, and matching (reverse) half edge
         """
-        hashed_face_edges = [ array.array ( 'L', [
-            oneFace [ 0 ] << 32 | oneFace [ 1 ],
-            oneFace [ 1 ] << 32 | oneFace [ 2 ],
-            oneFace [ 2 ] << 32 | oneFace [ 0 ]])
-            for oneFace in faces] # generate edge hashes by face
-        hashed_edges = np.reshape ( hashed_face_edges, -1 ).tolist()
-
-        edge_hashes = {
-            'byFace': hashed_face_edges, # used in add_face_and_edges
-            'byEdge': hashed_edges # used in get_adjacent_face
-        }
-        return edge_hashes
-    # end faces2edge_hashes (…)
-
-    ######## end of nested function definitions #######
+        edge_idx = np.repeat ( np.arange ( len ( self.match_count )), self.match_count )
+        match_offset = np.arange ( len ( edge_idx )) - np.repeat (
+            np.cumsum ( self.match_count ) - self.match_count, self.match_count )
+        return edge_idx, self.edge_order [ np.repeat ( self.first_match,
+            self.match_count ) + match_offset ]
+    # end matched_pairs (…)
 
-    disjoint_polyhedron = []
+    def twins ( self ):
+        """ twins ()
 
-    for obj in mdl [ 'objects' ]:
-        edge_hashes = faces2edge_hashes ( obj [ 'faces' ])
-        closed_surfaces = [] # disjoint surfaces for a single object
+        The twin of each half edge: the only half edge going the reverse
+        direction, when that matches only this half edge
 
-        remaining_faces = set ( np.arange ( 0, len ( obj [ 'faces' ])))
-        while len ( remaining_faces ) > 0: # more faces to process
-            # Collect the set of faces for a (the next) closed surface
-            surface_faces = get_faces_of_surface( obj, edge_hashes, remaining_faces )
-            closed_surfaces.append ( surface_faces ) # add surface to list
+        @returns numpy int32 array with the twin half edge of each half edge, or -1
+        """
+        if self.twin_edges is None:
+            twin = np.where ( self.match_count == 1, self.edge_order [
+                np.minimum ( self.first_match, len ( self.edge_order ) - 1 )], -1 )
+            single = twin >= 0
+            single [ single ] = twin [ twin [ single ]] == np.flatnonzero ( single )
+            twin [ ~single ] = -1
+            self.twin_edges = twin.astype ( np.int32 )
+        return self.twin_edges
+    # end twins (…)
+
+    def nbytes ( self ):
+        """ the memory used by the index arrays """
+        return sum ( getattr ( self, name ).nbytes for name in self.__slots__
+            if getattr ( self, name ) is not None )
+# end class HalfEdgeIndex
+
+
+def label_face_surfaces ( half_edges ):
+    """ label_face_surfaces ( half_edges )
+
+    Label every face with the surface it is part of, in a single pass over all
+    of the edges.
+
+    Each directed edge is matched to the face(s) containing the reverse
+    direction edge (from the half edge index).  The matched face pairs are then
+    grouped into connected sets.
+
+    @param half_edges - HalfEdgeIndex for the faces of a polyhedron
+    @returns numpy array with the surface label for each face: the lowest face
+      index on the same surface
+    """
+    edge_idx, match_idx = half_edges.matched_pairs ()
+    return connected_labels ( len ( half_edges.edge_order ) // 3, # 3 edges/face
+        edge_idx // 3, match_idx // 3 )
+# end label_face_surfaces (…)
 
-            remaining_faces = remaining_faces.difference ( surface_faces )
-        # end while len ( remaining_faces ) > 0
 
-        for face_set in closed_surfaces:
-            disjoint_polyhedron.append ( surface2polyhedron ( face_set, obj ))
-        # end for face_set in closed_surfaces
-    # end for obj in mdl [ 'objects' ]
+def connected_labels ( count, node_a, node_b ):
+    """ connected_labels ( count, node_a, node_b )
 
-    mdl [ 'objects' ] = disjoint_polyhedron
-# end polyhedron2disjoint_surfaces(…)
+    Find the connected sets of nodes in an (undirected) graph.
 
+    Vectorized union-find: every pass hooks the root of each linked pair of sets
+    to the lower of the 2 roots, then compresses the paths by pointer jumping.
+    Each pass at least halves the number of roots that still have links to other
+    sets, so only a few passes are needed, even for huge graphs.
 
-@elapsed_time ( 'get_faces_of_surface' ) # DEBUG
-def get_faces_of_surface ( _obj, edge_data, faces ):
-    """ get_faces_of_surface ( obj, edge_data, faces )
+    @param count - the number of nodes in the graph
+    @param node_a - numpy array of node indexes for one end of each link
+    @param node_b - numpy array of node indexes for the other end of each link
+    @returns numpy array with the lowest node index in the same set, for each node
+    """
+    labels = np.arange ( count )
+    while True:
+        label_a = labels [ node_a ]
+        label_b = labels [ node_b ]
+        linking = label_a != label_b
+        if not linking.any ():
+            break
+        # links between nodes already in the same set never need to be seen again
+        node_a = node_a [ linking ]
+        node_b = node_b [ linking ]
+        label_a = label_a [ linking ]
+        label_b = label_b [ linking ]
+        np.minimum.at ( labels, np.maximum ( label_a, label_b ), np.minimum ( label_a, label_b ))
+
+        while True: # point every node directly at the root of its set
+            root_labels = labels [ labels ]
+            if np.array_equal ( root_labels, labels ):
+                break
+            labels = root_labels
+    return labels
+# end connected_labels (…)
+
+
+def surfaces2polyhedrons ( poly, labels ):
+    """ surfaces2polyhedrons ( poly, labels )
+
+    Create structures containing scad polyhedrons from the sets of (labelled)
+    faces that define closed surfaces within an existing polyhedron.
+
+    All of the surfaces are extracted together.  The faces are grouped by
+    surface, then the (surface, vertex) pairs are made unique to get the points
+    used by each surface, already in surface order.  Every surface polyhedron
+    is a range of the same (new) point and face buffers.
+
+    @param poly - object the closed surfaces are subsets of
+    @param labels - surface label for each face of poly
+    @returns list of ScadObject polyhedrons defining the surfaces
+    """
+    face_order = np.argsort ( labels, kind = 'stable' ) # keep face sequence in surface
+    sorted_labels = labels [ face_order ]
+    is_first = np.empty ( len ( sorted_labels ), dtype = bool )
+    is_first [ :1 ] = True
+    np.not_equal ( sorted_labels [ 1: ], sorted_labels [ :-1 ], out = is_first [ 1: ])
+    face_surface = np.cumsum ( is_first ) - 1 # surface sequence of each (sorted) face
+    face_starts = np.append ( np.flatnonzero ( is_first ), len ( face_order ))
+    surface_count = len ( face_starts ) - 1
+
+    # unique surface points, identified as surface * point count + point index
+    point_count = len ( poly.points )
+    surface_points = ( np.repeat ( face_surface, 3 ) * point_count +
+        np.reshape ( poly.faces [ face_order ], -1 ))
+    unique_points, point_idx = np.unique ( surface_points, return_inverse = True )
+    point_surface = unique_points // point_count
+    point_starts = np.searchsorted ( point_surface, np.arange ( surface_count + 1 ))
+
+    # surface faces with indexes to surface points
+    all_faces = np.reshape ( point_idx, ( -1, 3 )) - point_starts [ face_surface, np.newaxis ]
+    all_faces = all_faces.astype ( np.int32 )
+    all_points = poly.points [ unique_points % point_count ]
+
+    point_starts = point_starts.tolist ()
+    face_starts = face_starts.tolist ()
+    return [ ScadObject ( all_points, all_faces,
+        ( point_starts [ idx ], point_starts [ idx + 1 ]),
+        ( face_starts [ idx ], face_starts [ idx + 1 ]))
+        for idx in range ( surface_count )]
+# end surfaces2polyhedrons (…)
+
+
+def polyhedron_voids ( mdl ):
+    """ polyhedron_voids ( mdl )
+
+    Find the (closed) surfaces that are inside of other surfaces.  A surface
+    inside an odd number of other surfaces is a void, to be differenced out of
+    the surface that immediately contains it.  Surfaces inside an even number of
+    surfaces (an object inside of a void) stay separate objects.
+
+    Each void is given its container, and has its faces reversed if needed, so
+    it is an outward facing polyhedron that can be used in difference().
+
+    @param mdl - the 3d scad model to update
+    @outputs updated mdl
+    """
+    if len ( mdl.objects ) < 2:
+        return
+    points, point_object, triangles, triangle_faces, face_object = model_triangles ( mdl )
+    triangle_object = face_object [ triangle_faces ]
+    # the first point of each object is the start of its test ray
+    _objects, first_points = np.unique ( point_object, return_index = True )
+    corners = points [ triangles ]
+    inner, outer = surface_containment ( corners, triangle_object, points [ first_points ])
+    if len ( inner ) == 0:
+        return
+
+    obj_count = len ( mdl.objects )
+    depth = np.bincount ( inner, minlength = obj_count )
+    # the immediate container is the containing surface that is nested deepest
+    pair_order = np.lexsort (( depth [ outer ], inner ))
+    inner, outer = inner [ pair_order ], outer [ pair_order ]
+    last_pair = np.append ( inner [ 1: ] != inner [ :-1 ], True )
+    inner, outer = inner [ last_pair ], outer [ last_pair ]
+    is_void = ( depth [ inner ] % 2 == 1 ) & ( depth [ outer ] == depth [ inner ] - 1 )
+
+    # voids from a correctly oriented solid face inward: make them outward facing
+    corners -= points [ first_points ] [ triangle_object, np.newaxis ]
+    volume = np.bincount ( triangle_object, np.einsum ( 'ij,ij->i', corners [ :, 0 ],
+        np.cross ( corners [ :, 1 ], corners [ :, 2 ])), minlength = obj_count )
+    for void_idx, container_idx in zip ( inner [ is_void ].tolist (),
+            outer [ is_void ].tolist ()):
+        void = mdl.objects [ void_idx ]
+        void.container = mdl.objects [ container_idx ]
+        if volume [ void_idx ] < 0:
+            void.faces [ :] = void.faces [ :, ::-1 ].copy ()
+            void.edge_index = None
+    if CMD_LINE_ARGS.verbose:
+        print ( '{0} surfaces nested inside others, {1} voids'.format (
+            np.count_nonzero ( depth ), np.count_nonzero ( is_void )))
+# end polyhedron_voids (…)
 
-    Extract a single closed surface from the object face data
 
-    @param obj - 3d polyhedron object with (disjoint) surfaces
-    @param edge_data - dictionary with different formats of edge data and hashes
-    @param faces - object faces that are not assigned to a surface yet
-    @returns set of faces (indexes) on the closed surface
+def surface_containment ( corners, triangle_object, origins ):
+    """ surface_containment ( corners, triangle_object, origins )
+
+    Find the pairs of surfaces where one is inside of the other, by ray parity:
+    a ray (in the +x direction) from a point on one surface crosses another
+    closed surface an odd number of times when it starts inside of it.
+
+    Only surfaces with a bounding box that contains the start of the ray can
+    contain it, and the ray only needs to reach the far side of those boxes.
+    Both the surface boxes and the triangles are searched with bounding volume
+    hierarchies, so only the triangles near each (short) ray are tested,
+    instead of every triangle of every other surface.
+
+    @param corners - numpy float64 array of triangle corner points, shape ( t, 3, 3 )
+    @param triangle_object - numpy array with the surface of each triangle
+    @param origins - numpy array with the ray start point for each surface, shape ( n, 3 )
+    @returns tuple of numpy arrays: the inner and outer surface of each nested pair
+    """
+    obj_count = len ( origins )
+    tri_lower = corners.min ( axis = 1 )
+    tri_upper = corners.max ( axis = 1 )
+    surface_lower = np.full (( obj_count, 3 ), np.inf )
+    surface_upper = np.full (( obj_count, 3 ), -np.inf )
+    np.minimum.at ( surface_lower, triangle_object, tri_lower )
+    np.maximum.at ( surface_upper, triangle_object, tri_upper )
+    ray_idx, outer_idx = BoxTree ( surface_lower, surface_upper ).overlaps ( origins, origins )
+    other = ray_idx != outer_idx
+    candidate_keys = ray_idx [ other ] * obj_count + outer_idx [ other ]
+    ray_end = np.full ( obj_count, -np.inf )
+    np.maximum.at ( ray_end, ray_idx [ other ], surface_upper [ outer_idx [ other ], 0 ])
+
+    rays = np.flatnonzero ( ray_end > -np.inf )
+    ray_upper = origins [ rays ].copy ()
+    ray_upper [ :, 0 ] = ray_end [ rays ]
+    ray_idx, tri_idx = BoxTree ( tri_lower, tri_upper ).overlaps ( origins [ rays ], ray_upper )
+    ray_idx = rays [ ray_idx ]
+    pair_keys = ray_idx * obj_count + triangle_object [ tri_idx ]
+    candidate = np.isin ( pair_keys, candidate_keys )
+    ray_idx, tri_idx = ray_idx [ candidate ], tri_idx [ candidate ]
+    pair_keys = pair_keys [ candidate ]
+    crossed = ray_crosses_triangle ( corners [ tri_idx ], origins [ ray_idx ])
+    pair_keys, crossings = np.unique ( pair_keys [ crossed ], return_counts = True )
+    pair_keys = pair_keys [ crossings % 2 == 1 ]
+    return pair_keys // obj_count, pair_keys % obj_count
+# end surface_containment (…)
+
+
+class BoxTree:
+    """ BoxTree ( lower, upper )
+
+    Bounding volume hierarchy over a set of axis aligned boxes, to find the boxes
+    that overlap a (large) set of query boxes, without testing every pair.
+
+    The boxes are sorted by the Morton (z order) code of their centres, then
+    grouped into leaves of BVH_LEAF_SIZE boxes.  The tree is an implicit
+    complete binary tree over the leaves: each level is an array of bounds,
+    and the children of node n are nodes 2n and 2n + 1 of the next level.
+
+    @param lower - numpy array of the minimum corner of each box, shape ( n, 3 )
+    @param upper - numpy array of the maximum corner of each box, shape ( n, 3 )
     """
-    new_surface = { 'faceindex': set(), 'edgehash': []}
+    __slots__ = ( 'lower', 'upper', 'item_order', 'levels' )
+
+    def __init__ ( self, lower, upper ):
+        self.lower = lower
+        self.upper = upper
+        scene_lower = lower.min ( axis = 0, initial = np.inf )
+        scene_size = np.maximum ( upper.max ( axis = 0, initial = -np.inf ) - scene_lower,
+            np.finfo ( float ).tiny )
+        cells = np.clip ((( lower + upper ) / 2 - scene_lower ) / scene_size * 1024,
+            0, 1023 ).astype ( np.int64 )
+        morton = np.zeros ( len ( cells ), dtype = np.int64 )
+        for bit in range ( 10 ):
+            for axis in range ( 3 ):
+                morton |= (( cells [ :, axis ] >> bit ) & 1 ) << ( 3 * bit + axis )
+        self.item_order = np.argsort ( morton, kind = 'stable' )
+
+        leaf_starts = np.arange ( 0, len ( lower ), BVH_LEAF_SIZE )
+        node_lower = np.full (( 1 << int ( max ( len ( leaf_starts ) - 1, 0 )).bit_length (), 3 ),
+            np.inf )
+        node_upper = np.full ( node_lower.shape, -np.inf )
+        if len ( leaf_starts ) > 0:
+            node_lower [ :len ( leaf_starts )] = np.minimum.reduceat (
+                lower [ self.item_order ], leaf_starts )
+            node_upper [ :len ( leaf_starts )] = np.maximum.reduceat (
+                upper [ self.item_order ], leaf_starts )
+        self.levels = [( node_lower, node_upper )]
+        while len ( node_lower ) > 1:
+            node_lower = node_lower.reshape (( -1, 2, 3 )).min ( axis = 1 )
+            node_upper = node_upper.reshape (( -1, 2, 3 )).max ( axis = 1 )
+            self.levels.append (( node_lower, node_upper ))
+        self.levels.reverse () # root first
+    # end __init__ (…)
+
+    def overlaps ( self, query_lower, query_upper ):
+        """ overlaps ( query_lower, query_upper )
+
+        Find the boxes that overlap (or touch) each query box.  All of the
+        queries go down the tree together, one level at a time, keeping only
+        the ( query, node ) pairs that overlap.
+
+        @param query_lower - numpy array of the minimum corner of each query box
+        @param query_upper - numpy array of the maximum corner of each query box
+        @returns tuple of numpy arrays: query index, and box index, of each overlap
+        """
+        query_idx = np.arange ( len ( query_lower ))
+        node_idx = np.zeros ( len ( query_lower ), dtype = np.int64 )
+        for level, ( node_lower, node_upper ) in enumerate ( self.levels ):
+            if level > 0: # children of the nodes overlapped at the previous level
+                query_idx = np.repeat ( query_idx, 2 )
+                node_idx = np.reshape ( node_idx [ :, np.newaxis ] * 2 + [ 0, 1 ], -1 )
+            hit = boxes_overlap ( node_lower [ node_idx ], node_upper [ node_idx ],
+                query_lower [ query_idx ], query_upper [ query_idx ])
+            query_idx, node_idx = query_idx [ hit ], node_idx [ hit ]
+
+        first = node_idx * BVH_LEAF_SIZE
+        stop = np.minimum ( first + BVH_LEAF_SIZE, len ( self.item_order ))
+        item_idx = self.item_order [ range_indexes ( first, stop )]
+        query_idx = np.repeat ( query_idx, stop - first )
+        # the leaf overlaps, but not necessarily each box in it
+        hit = boxes_overlap ( self.lower [ item_idx ], self.upper [ item_idx ],
+            query_lower [ query_idx ], query_upper [ query_idx ])
+        return query_idx [ hit ], item_idx [ hit ]
+    # end overlaps (…)
+
+    def overlapping_pairs ( self, batch_size ):
+        """ overlapping_pairs ( batch_size )
+
+        Find the pairs of boxes in the tree that overlap (or touch) each other.
+        The tree is traversed against itself, one level at a time, keeping only
+        the ( node, node ) pairs that overlap.  Pairs of a node with itself
+        are kept until the leaves, where the box pairs are expanded a batch of
+        leaf pairs at a time.
+
+        @param batch_size - the number of leaf pairs to expand together
+        @returns (yields) tuple of numpy arrays: the box indexes of each pair
+        """
+        node_a = np.zeros ( 1, dtype = np.int64 )
+        node_b = np.zeros ( 1, dtype = np.int64 )
+        for level, ( node_lower, node_upper ) in enumerate ( self.levels ):
+            if level > 0: # child pairs, without the repeated child pair of a node with itself
+                child_a = ( node_a [ :, np.newaxis ] * 2 + [ 0, 0, 1, 1 ]).reshape ( -1 )
+                child_b = ( node_b [ :, np.newaxis ] * 2 + [ 0, 1, 0, 1 ]).reshape ( -1 )
+                keep = child_a <= child_b
+                keep |= np.repeat ( node_a < node_b, 4 )
+                node_a, node_b = child_a [ keep ], child_b [ keep ]
+            hit = boxes_overlap ( node_lower [ node_a ], node_upper [ node_a ],
+                node_lower [ node_b ], node_upper [ node_b ])
+            node_a, node_b = node_a [ hit ], node_b [ hit ]
+
+        leaf_lower, leaf_upper = self.levels [ -1 ]
+        slots = np.arange ( BVH_LEAF_SIZE )
+        # each pair once, and not with itself, inside a single leaf
+        same_leaf_pairs = slots [ :, np.newaxis ] < slots
+        for first in range ( 0, len ( node_a ), batch_size ):
+            leaf_a = node_a [ first: first + batch_size ]
+            leaf_b = node_b [ first: first + batch_size ]
+            items_a, near_a = self._leaf_items_near ( leaf_a, leaf_b, leaf_lower, leaf_upper )
+            items_b, near_b = self._leaf_items_near ( leaf_b, leaf_a, leaf_lower, leaf_upper )
+            candidate = near_a [ :, :, np.newaxis ] & near_b [ :, np.newaxis, : ]
+            candidate [ leaf_a == leaf_b ] &= same_leaf_pairs
+            pair_idx, slot_a, slot_b = np.nonzero ( candidate )
+            item_a = items_a [ pair_idx, slot_a ]
+            item_b = items_b [ pair_idx, slot_b ]
+            hit = boxes_overlap ( self.lower [ item_a ], self.upper [ item_a ],
+                self.lower [ item_b ], self.upper [ item_b ])
+            yield item_a [ hit ], item_b [ hit ]
+    # end overlapping_pairs (…)
+
+    def _leaf_items_near ( self, leaf, other_leaf, leaf_lower, leaf_upper ):
+        """ _leaf_items_near ( leaf, other_leaf, leaf_lower, leaf_upper )
+
+        Find the boxes in leaves that overlap the bounds of another leaf
+
+        @param leaf - numpy array of leaf indexes
+        @param other_leaf - numpy array of the other leaf index for each leaf
+        @param leaf_lower - numpy array of the minimum corner of all leaves
+        @param leaf_upper - numpy array of the maximum corner of all leaves
+        @returns tuple of numpy arrays, shape ( n, BVH_LEAF_SIZE ): the box index in
+            each leaf slot, and true where the slot box overlaps the other leaf
+        """
+        positions = leaf [ :, np.newaxis ] * BVH_LEAF_SIZE + np.arange ( BVH_LEAF_SIZE )
+        in_leaf = positions < len ( self.item_order )
+        items = self.item_order [ np.minimum ( positions, len ( self.item_order ) - 1 )]
+        other = np.repeat ( other_leaf, BVH_LEAF_SIZE )
+        slot_items = items.reshape ( -1 )
+        near = boxes_overlap ( self.lower [ slot_items ], self.upper [ slot_items ],
+            leaf_lower [ other ], leaf_upper [ other ])
+        return items, in_leaf & near.reshape ( items.shape )
+    # end _leaf_items_near (…)
+# end class BoxTree
+
+
+def boxes_overlap ( lower_a, upper_a, lower_b, upper_b ):
+    """ boxes_overlap ( lower_a, upper_a, lower_b, upper_b )
+
+    Test if pairs of axis aligned boxes overlap (or touch)
+
+    @param lower_a - numpy array of the minimum corner of each box, shape ( n, 3 )
+    @param upper_a - numpy array of the maximum corner of each box, shape ( n, 3 )
+    @param lower_b - numpy array of the minimum corner of the other box of each pair
+    @param upper_b - numpy array of the maximum corner of the other box of each pair
+    @returns numpy boolean array, true where the boxes overlap
+    """
+    overlap = ( lower_a [ :, 0 ] <= upper_b [ :, 0 ]) & ( upper_a [ :, 0 ] >= lower_b [ :, 0 ])
+    for axis in ( 1, 2 ): # columns, instead of reducing ( n, 3 ) arrays: much faster
+        overlap &= ( lower_a [ :, axis ] <= upper_b [ :, axis ])
+        overlap &= ( upper_a [ :, axis ] >= lower_b [ :, axis ])
+    return overlap
+# end boxes_overlap (…)
 
-    add_face_and_edges ( new_surface, faces.pop(), edge_data ) # get a starting face
-    # add the rest of the connected faces to complete the surface
-    cur_edge = 0
-    while cur_edge < len ( new_surface [ 'edgehash' ]):
-        next_face = get_adjacent_face ( new_surface, edge_data, cur_edge )
-        add_face_and_edges ( new_surface, next_face, edge_data ) # add new face + edges to surface
-        cur_edge += 1
-    # end while cur_edge < len ( new_surface [ 'edgehash' ])
 
-    return new_surface [ 'faceindex' ]
-    # remaining_faces = faces.difference ( new_surface [ 'faceindex' ])
-    # return ( remaining_faces, new_surface [ 'faceindex' ])
-# end get_faces_of_surface (…)
+def ray_crosses_triangle ( corners, starts ):
+    """ ray_crosses_triangle ( corners, starts )
 
+    Test if rays, in the +x direction, cross triangles.
 
-def add_face_and_edges ( surface, face_num, edge_data ):
-    """ add_face_and_edges ( surface, face_num, edge_data )
+    The triangle is projected to the y-z plane, where the ray is a point.  A
+    point exactly on an edge (or vertex) is only inside when the edge is a
+    'top left' edge, so a ray through the edge between 2 triangles of a surface
+    crosses exactly one of them.  Triangles seen edge on are never crossed.
 
-    Add a single face (by index) to the working surface, as well as all of the
-    edges for that face
+    @param corners - numpy array of triangle corner points, shape ( m, 3, 3 )
+    @param starts - numpy array of the ray start point for each triangle, shape ( m, 3 )
+    @returns numpy boolean array, true where the ray crosses the triangle
+    """
+    edge_start = corners [ :, :, 1: ]
+    edge_delta = np.roll ( edge_start, -1, axis = 1 ) - edge_start
+    to_start = starts [ :, np.newaxis, 1: ] - edge_start
+    edge_side = ( edge_delta [ :, :, 0 ] * to_start [ :, :, 1 ] -
+        edge_delta [ :, :, 1 ] * to_start [ :, :, 0 ])
+    area = ( edge_delta [ :, 0, 0 ] * -edge_delta [ :, 2, 1 ] -
+        edge_delta [ :, 0, 1 ] * -edge_delta [ :, 2, 0 ])
+    # make every projected triangle counter clockwise
+    orient = np.sign ( area ) [ :, np.newaxis ]
+    edge_side *= orient
+    edge_delta = edge_delta * orient [ :, :, np.newaxis ]
+    top_left = ( edge_delta [ :, :, 1 ] > 0 ) | (
+        ( edge_delta [ :, :, 1 ] == 0 ) & ( edge_delta [ :, :, 0 ] < 0 ))
+    inside = np.all (( edge_side > 0 ) | (( edge_side == 0 ) & top_left ), axis = 1 )
+    inside &= area != 0
+
+    # x of the triangle plane at the ray
+    first = corners [ inside, 0 ]
+    normal = np.cross ( corners [ inside, 1 ] - first, corners [ inside, 2 ] - first )
+    plane_x = first [ :, 0 ] - ( normal [ :, 1 ] * ( starts [ inside, 1 ] - first [ :, 1 ]) +
+        normal [ :, 2 ] * ( starts [ inside, 2 ] - first [ :, 2 ])) / normal [ :, 0 ]
+    inside [ inside ] = plane_x > starts [ inside, 0 ]
+    return inside
+# end ray_crosses_triangle (…)
+
+
+def polyhedron_instances ( mdl ):
+    """ polyhedron_instances ( mdl )
+
+    Collapse identical polyhedron objects (the same shape, at different
+    locations) to a single object, with the offsets of the other copies.
+
+    Each object gets a signature hash of its canonical form, so copies are
+    found by a dictionary lookup, instead of comparing every pair of objects.
+    The first object with each signature is kept.
 
-    @param surface - working surface structure (dictionary)
-    @param face_num - the index of the face to add from o [ 'faces' ], or None
-    @param edge_data - pregenerated edge (hash) data
-    @outputs updated surface
+    @param mdl - the 3d scad model to update
+    @outputs updated mdl
     """
-    if not face_num is None:
-        surface [ 'faceindex' ].add ( face_num )
-        surface [ 'edgehash' ].extend ( edge_data [ 'byFace' ][ face_num ])
-# end add_face_and_edges (…)
+    if len ( mdl.objects ) < 2:
+        return
+    signatures, origins = polyhedron_signatures ( mdl.objects )
+    # voids, and the objects they are in, are never collapsed to copies
+    containers = { id ( obj.container ) for obj in mdl.objects if obj.container is not None }
+    for idx, obj in enumerate ( mdl.objects ):
+        if obj.container is not None or id ( obj ) in containers:
+            signatures [ idx ] = idx
+    unique_objects = {} # signature to (first) object index
+    copy_offsets = [[] for _obj in mdl.objects ]
+    for idx, signature in enumerate ( signatures ):
+        first = unique_objects.setdefault ( signature, idx )
+        if first != idx:
+            copy_offsets [ first ].append ( origins [ idx ] - origins [ first ])
+    kept = sorted ( unique_objects.values ())
+    for idx in kept:
+        if copy_offsets [ idx ]:
+            mdl.objects [ idx ].copies = np.array ( copy_offsets [ idx ])
+    if CMD_LINE_ARGS.verbose:
+        print ( '{0} objects, {1} unique'.format ( len ( mdl.objects ), len ( kept )))
+    mdl.objects = [ mdl.objects [ idx ] for idx in kept ]
+# end polyhedron_instances (…)
+
 
+def polyhedron_signatures ( objects ):
+    """ polyhedron_signatures ( objects )
 
-def get_adjacent_face ( surface, edge_data, idx ):
-    """ get_adjacent_face ( surface, edge_data, idx )
+    Generate signature hashes that are the same for polyhedrons that only differ
+    by position (translation), and the order of their points and faces.
 
-    Get the number (index) of the face that includes the edge that is the reverse
-    direction of the passed (hashed) edge
+    All of the objects are processed together.  Points are moved so the minimum
+    corner of the object bounding box is at the origin, rounded to
+    INSTANCE_TOLERANCE times the largest coordinate (the precision of the stl
+    coordinates scales with their size), then sorted.  Faces are renumbered to the sorted
+    points, rotated to start at the lowest point index, then sorted.  The hash
+    of the canonical points and faces is the signature.
 
-    @param surface - working surface structure (dictionary)
-    @param edge_data - pre generated object edge data
-    @param idx - index of the edge to process (in surface [ 'edgehash' ])
-    @return face number to add to the surface
+    @param objects - list of ScadObject polyhedrons
+    @returns tuple of list of signature (bytes) for each object, and numpy
+      array of the bounding box minimum corner of each object, shape ( n, 3 )
     """
-    # get the existing stored edge hash from the surface
-    edge_hash = surface [ 'edgehash'][ idx ]
-    # get the edge end point indexes back from the (searchable) hash
-    # create a new hash for the reverse direction edge
-    reverse_edge = [ edge_hash & 0xffffffff, edge_hash >> 32 ]
-    reverse_hash = reverse_edge [ 0 ] << 32 | reverse_edge [ 1 ]
+    point_counts = np.array ([ len ( obj.points ) for obj in objects ])
+    face_counts = np.array ([ len ( obj.faces ) for obj in objects ])
+    point_starts = np.concatenate (([ 0 ], np.cumsum ( point_counts )))
+    face_starts = np.concatenate (([ 0 ], np.cumsum ( face_counts )))
+    point_object = np.repeat ( np.arange ( len ( objects )), point_counts )
+    face_object = np.repeat ( np.arange ( len ( objects )), face_counts )
+
+    # points as text (--keep-text) are converted to numbers
+    points = np.concatenate ([ obj.points for obj in objects ]).astype ( np.float64 )
+    origins = np.minimum.reduceat ( points, point_starts [ :-1 ], axis = 0 )
+    tolerance = INSTANCE_TOLERANCE * ( float ( np.abs ( points ).max ( initial = 0 )) or 1.0 )
+    grid_points = np.rint (( points - origins [ point_object ]) / tolerance ).astype ( np.int64 )
+    del points
+    point_order = np.lexsort (( grid_points [ :, 2 ], grid_points [ :, 1 ],
+        grid_points [ :, 0 ], point_object ))
+    grid_points = grid_points [ point_order ]
+    sorted_idx = np.empty ( len ( point_order ), dtype = np.int64 )
+    sorted_idx [ point_order ] = np.arange ( len ( point_order ))
+
+    faces = np.concatenate ([ obj.faces for obj in objects ]).astype ( np.int64 )
+    faces = sorted_idx [ faces + point_starts [ face_object, np.newaxis ]]
+    faces -= point_starts [ face_object, np.newaxis ]
+    first_vertex = np.argmin ( faces, axis = 1 )
+    faces = np.take_along_axis ( faces,
+        ( first_vertex [ :, np.newaxis ] + np.arange ( 3 )) % 3, axis = 1 )
+    faces = faces [ np.lexsort (( faces [ :, 2 ], faces [ :, 1 ], faces [ :, 0 ], face_object ))]
+
+    signatures = []
+    for idx in range ( len ( objects )):
+        hasher = hashlib.sha1 ( np.array ([ point_counts [ idx ], face_counts [ idx ]]).tobytes ())
+        hasher.update ( grid_points [ point_starts [ idx ]: point_starts [ idx + 1 ]].tobytes ())
+        hasher.update ( faces [ face_starts [ idx ]: face_starts [ idx + 1 ]].tobytes ())
+        signatures.append ( hasher.digest ())
+    return signatures, origins
+# end polyhedron_signatures (…)
+
+
+def decimate_polyhedrons ( mdl ):
+    """ decimate_polyhedrons ( mdl )
+
+    Reduce the number of faces of every object to the --decimate-ratio or
+    --decimate-faces target, for lighter OpenSCAD previews.
+
+    --decimate-ratio is the fraction of the faces of each object to keep.
+    --decimate-faces is the number of faces to keep for the whole model, shared
+    by the objects in proportion to their face counts.  All of the objects are
+    processed together (collapse_edges), then given new shared point and face
+    buffers.  With --keep-full, the reduced objects are kept as the previews of
+    the full objects, instead of replacing them.
 
-    if reverse_hash in surface [ 'edgehash' ]:
-        return None # Face already on the surface: do not add again
+    @inputs global CMD_LINE_ARGS - parsed command line arguments
 
-    # return the adjacent face index
-    return int ( edge_data [ 'byEdge' ].index ( reverse_hash ) / 3 ) # 3 edges/face
-# end get_adjacent_face (…)
+    @param mdl - the 3d scad model to update
+    @outputs updated mdl
+    """
+    if not mdl.objects:
+        return
+    point_counts = np.array ([ len ( obj.points ) for obj in mdl.objects ])
+    face_counts = np.array ([ len ( obj.faces ) for obj in mdl.objects ])
+    point_starts = np.concatenate (([ 0 ], np.cumsum ( point_counts )))
+    # points as text (--keep-text) are converted to numbers
+    points = np.concatenate ([ obj.points for obj in mdl.objects ]).astype ( np.float64 )
+    faces = np.concatenate ([ obj.faces.astype ( np.int64 ) + point_starts [ idx ]
+        for idx, obj in enumerate ( mdl.objects )])
+    face_object = np.repeat ( np.arange ( len ( mdl.objects )), face_counts )
+    # a single object keeps the half edge index it already has
+    half_edges = ( mdl.objects [ 0 ].half_edges if len ( mdl.objects ) == 1
+        else HalfEdgeIndex ( faces ))
+    target = CMD_LINE_ARGS.decimate_ratio
+    if CMD_LINE_ARGS.decimate_faces:
+        target = min ( CMD_LINE_ARGS.decimate_faces / max ( np.sum ( face_counts ), 1 ), 1.0 )
+    target_faces = np.round ( face_counts * target ).astype ( np.int64 )
+
+    points, kept_faces, faces = collapse_edges ( points, faces, half_edges, face_object,
+        target_faces )
+
+    # drop unused points, and make the face point indexes relative to the object
+    used = np.zeros ( len ( points ), dtype = bool )
+    used [ faces ] = True
+    new_index = np.cumsum ( used ) - 1
+    new_starts = np.concatenate (([ 0 ], np.cumsum ( used ))) [ point_starts ]
+    all_faces = ( new_index [ faces ] - new_starts [ face_object [ kept_faces ],
+        np.newaxis ]).astype ( np.int32 )
+    all_points = np.ascontiguousarray ( points [ used ], dtype = np.float32 )
+    object_faces = np.searchsorted ( face_object [ kept_faces ],
+        np.arange ( len ( mdl.objects ) + 1 )).tolist ()
+    new_starts = new_starts.tolist ()
 
+    if CMD_LINE_ARGS.verbose:
+        print ( '{0} faces decimated to {1}'.format ( len ( face_object ), len ( all_faces )))
+    for idx, obj in enumerate ( mdl.objects ):
+        reduced = ScadObject ( all_points, all_faces, ( new_starts [ idx ], new_starts [ idx + 1 ]),
+            ( object_faces [ idx ], object_faces [ idx + 1 ]))
+        if CMD_LINE_ARGS.keep_full:
+            obj.preview = reduced
+            continue
+        obj.point_buffer = reduced.point_buffer
+        obj.point_range = reduced.point_range
+        obj.face_buffer = reduced.face_buffer
+        obj.face_range = reduced.face_range
+        obj.edge_index = None
+# end decimate_polyhedrons (…)
+
+
+def collapse_edges ( points, faces, half_edges, face_object, target_faces ):
+    """ collapse_edges ( points, faces, half_edges, face_object, target_faces )
+
+    Simplify triangle meshes by edge collapse, with quadric error metrics.
+
+    Each vertex has a quadric (the sum of the area weighted squared distances to
+    the planes of its faces).  The edge that moves the surface least when its
+    2 vertexes are merged (at the point with the least error for the combined
+    quadric) is collapsed first, from a priority queue, until every object is
+    down to its target, or nothing else can be collapsed.  Queue entries are
+    stamped with the versions of their vertexes, and entries for changed
+    vertexes are skipped, instead of being removed.
+
+    Vertexes of open, or shared (non manifold), edges do not move, so the
+    boundaries of the surfaces are preserved.  An edge is not collapsed when
+    that would join surfaces together (the vertexes share other neighbours),
+    or flip a face over.  Edges never join different objects, so the objects
+    are reduced independently, even though they share the queue.
+
+    @param points - numpy float64 array of vertex points, shape ( n, 3 )
+    @param faces - numpy array of point indexes for each triangle, shape ( m, 3 )
+    @param half_edges - HalfEdgeIndex for the faces
+    @param face_object - numpy array with the object index of each face
+    @param target_faces - numpy array with the number of faces to reduce each object to
+    @returns tuple of numpy arrays: the (moved) points, the indexes of the faces
+      that are left, and the point indexes of those faces
+    """
+    # near the origin, to keep the precision
+    origin = points.min ( axis = 0, initial = np.inf ) if len ( points ) else np.zeros ( 3 )
+    points = points - origin
+    boundary = ( half_edges.match_count != 1 ) | ( half_edges.edge_count > 1 )
+    locked = np.zeros ( len ( points ), dtype = bool )
+    locked [ np.reshape ( faces, -1 ) [ boundary ]] = True
+    locked [ np.reshape ( np.roll ( faces, -1, axis = 1 ), -1 ) [ boundary ]] = True
+    face_counts = np.bincount ( face_object, minlength = len ( target_faces ))
+    # only objects with more faces than the target have edges to collapse
+    edge_points = np.unique ( np.sort ( np.reshape ( np.stack (( faces,
+        np.roll ( faces, -1, axis = 1 )), axis = 2 ), ( -1, 2 )), axis = 1 ), axis = 0 )
+    vertex_object = np.zeros ( len ( points ), dtype = np.int64 )
+    vertex_object [ faces ] = face_object [ :, np.newaxis ]
+    edge_points = edge_points [( face_counts > target_faces ) [ vertex_object [
+        edge_points [ :, 0 ]]]]
+
+    positions = points.tolist ()
+    quadrics = vertex_quadrics ( points, faces ).tolist ()
+    locked = locked.tolist ()
+    face_points = faces.tolist ()
+    vertex_faces = [ set () for _pnt in positions ]
+    for face in np.flatnonzero (( face_counts > target_faces ) [ face_object ]).tolist ():
+        for point in face_points [ face ]:
+            vertex_faces [ point ].add ( face )
+    vertex_object = vertex_object.tolist ()
+    face_counts = face_counts.tolist ()
+    target_faces = target_faces.tolist ()
+    stamps = [ 0 ] * len ( positions )
+    collapses = []
+    for point_a, point_b in edge_points.tolist ():
+        entry = collapse_entry ( point_a, point_b, positions, quadrics, locked, stamps )
+        if entry is not None:
+            collapses.append ( entry )
+    heapq.heapify ( collapses )
+
+    removed = set ()
+    while collapses:
+        _cost, _length, keep, drop, keep_stamp, drop_stamp, target = heapq.heappop ( collapses )
+        if stamps [ keep ] != keep_stamp or stamps [ drop ] != drop_stamp:
+            continue # a vertex changed (or is gone) since the entry was queued
+        obj = vertex_object [ keep ]
+        if face_counts [ obj ] <= target_faces [ obj ]:
+            continue
+        shared = vertex_faces [ keep ] & vertex_faces [ drop ]
+        neighbours_keep = { point for face in vertex_faces [ keep ]
+            for point in face_points [ face ]}
+        neighbours_drop = { point for face in vertex_faces [ drop ]
+            for point in face_points [ face ]}
+        opposite = { point for face in shared for point in face_points [ face ]}
+        if ( not shared or neighbours_keep & neighbours_drop != opposite or
+                neighbours_keep | neighbours_drop == opposite ):
+            continue # not an edge, would join surfaces, or would close up a surface
+        if collapse_flips_face ( positions, face_points,
+                ( vertex_faces [ keep ] | vertex_faces [ drop ]) - shared, keep, drop, target ):
+            continue
+
+        positions [ keep ] = target
+        quadrics [ keep ] = [ q_a + q_b for q_a, q_b in zip ( quadrics [ keep ],
+            quadrics [ drop ])]
+        for face in shared:
+            for point in face_points [ face ]:
+                vertex_faces [ point ].discard ( face )
+        for face in vertex_faces [ drop ]:
+            face_points [ face ] = [ keep if point == drop else point
+                for point in face_points [ face ]]
+        vertex_faces [ keep ] |= vertex_faces [ drop ]
+        vertex_faces [ drop ] = set ()
+        removed |= shared
+        face_counts [ obj ] -= len ( shared )
+        stamps [ keep ] += 1
+        stamps [ drop ] = -1
+        # the edges of the merged vertex have new errors
+        for point in ( neighbours_keep | neighbours_drop ) - { keep, drop }:
+            entry = collapse_entry ( keep, point, positions, quadrics, locked, stamps )
+            if entry is not None:
+                heapq.heappush ( collapses, entry )
+
+    kept_faces = np.ones ( len ( faces ), dtype = bool )
+    kept_faces [ list ( removed )] = False
+    kept_faces = np.flatnonzero ( kept_faces )
+    return ( np.array ( positions, dtype = np.float64 ).reshape (( -1, 3 )) + origin, kept_faces,
+        np.array ([ face_points [ face ] for face in kept_faces.tolist ()],
+            dtype = np.int64 ).reshape (( -1, 3 )))
+# end collapse_edges (…)
+
+
+def vertex_quadrics ( points, faces ):
+    """ vertex_quadrics ( points, faces )
+
+    Sum the (area weighted) plane quadrics of the faces around each vertex.
+
+    A plane ( a, b, c, d ) has the quadric matrix of the products of each pair
+    of plane coefficients.  The matrix is symmetric, so only the upper triangle
+    is kept: aa, ab, ac, ad, bb, bc, bd, cc, cd, dd.
+
+    @param points - numpy float64 array of vertex points, shape ( n, 3 )
+    @param faces - numpy array of point indexes for each triangle, shape ( m, 3 )
+    @returns numpy array of quadric coefficients for each vertex, shape ( n, 10 )
+    """
+    corners = points [ faces ]
+    normals = np.cross ( corners [ :, 1 ] - corners [ :, 0 ], corners [ :, 2 ] - corners [ :, 0 ])
+    double_area = np.sqrt ( np.sum ( normals * normals, axis = 1 ))
+    usable = double_area > 0 # degenerate faces have no plane
+    planes = np.zeros (( len ( faces ), 4 ))
+    planes [ usable, :3 ] = normals [ usable ] / double_area [ usable, np.newaxis ]
+    planes [ :, 3 ] = -np.sum ( planes [ :, :3 ] * corners [ :, 0 ], axis = 1 )
+    upper_row, upper_column = np.triu_indices ( 4 )
+    face_quadrics = ( planes [ :, upper_row ] * planes [ :, upper_column ] *
+        ( double_area [ :, np.newaxis ] / 2 ))
+    quadrics = np.zeros (( len ( points ), 10 ))
+    for coefficient in range ( 10 ):
+        for corner in range ( 3 ):
+            quadrics [ :, coefficient ] += np.bincount ( faces [ :, corner ],
+                weights = face_quadrics [ :, coefficient ], minlength = len ( points ))
+    return quadrics
+# end vertex_quadrics (…)
+
+
+def collapse_entry ( point_a, point_b, positions, quadrics, locked, stamps ):
+    """ collapse_entry ( point_a, point_b, positions, quadrics, locked, stamps )
+
+    Find where the vertexes of an edge should be merged to, and the error of
+    moving them there.  A locked vertex keeps its position, so the other vertex
+    is merged into it.  Otherwise the point with the least error for the
+    combined quadric is used, when it can be solved for, or the best of the
+    ends and middle of the edge.
+
+    Equal errors (a flat surface has none) are ordered by the edge length, so
+    the short edges are collapsed first, instead of the same vertex collecting
+    more and more edges.
+
+    @param point_a - index of a vertex of the edge
+    @param point_b - index of the other vertex of the edge
+    @param positions - list of [ x, y, z ] vertex positions
+    @param quadrics - list of the quadric coefficients of each vertex
+    @param locked - list of booleans, true for vertexes that can not be moved
+    @param stamps - list of the current version of each vertex
+    @returns tuple ( error, squared edge length, kept vertex, dropped vertex,
+        kept vertex stamp, dropped vertex stamp, merged position ) for the
+        priority queue, or None when neither vertex can move
+    """
+    if locked [ point_b ]:
+        if locked [ point_a ]:
+            return None
+        point_a, point_b = point_b, point_a
+    q_aa, q_ab, q_ac, q_ad, q_bb, q_bc, q_bd, q_cc, q_cd, q_dd = [ q_a + q_b
+        for q_a, q_b in zip ( quadrics [ point_a ], quadrics [ point_b ])]
+
+    def quadric_error ( pnt ):
+        x, y, z = pnt
+        return ( x * ( q_aa * x + 2 * ( q_ab * y + q_ac * z + q_ad )) +
+            y * ( q_bb * y + 2 * ( q_bc * z + q_bd )) + z * ( q_cc * z + 2 * q_cd ) + q_dd )
+
+    if locked [ point_a ]:
+        candidates = [ positions [ point_a ]]
+    else:
+        minor_a = q_bb * q_cc - q_bc * q_bc
+        minor_b = q_ab * q_cc - q_bc * q_ac
+        minor_c = q_ab * q_bc - q_bb * q_ac
+        determinant = q_aa * minor_a - q_ab * minor_b + q_ac * minor_c
+        if abs ( determinant ) > QUADRIC_SINGULAR * ( q_aa + q_bb + q_cc ) ** 3:
+            # Cramer's rule, for the point where the error gradient is zero
+            candidates = [[
+                ( -q_ad * minor_a + q_ab * ( q_bd * q_cc - q_bc * q_cd ) -
+                    q_ac * ( q_bd * q_bc - q_bb * q_cd )) / determinant,
+                ( q_aa * ( -q_bd * q_cc + q_bc * q_cd ) + q_ad * minor_b +
+                    q_ac * ( q_bd * q_ac - q_ab * q_cd )) / determinant,
+                ( q_aa * ( -q_bb * q_cd + q_bd * q_bc ) - q_ab * ( -q_ab * q_cd + q_bd * q_ac ) -
+                    q_ad * minor_c ) / determinant ]]
+        else:
+            candidates = [ positions [ point_a ], positions [ point_b ],
+                [( v_a + v_b ) / 2 for v_a, v_b in zip ( positions [ point_a ],
+                    positions [ point_b ])]]
+    error, target = min (( quadric_error ( pnt ), pnt ) for pnt in candidates )
+    length = sum (( v_a - v_b ) ** 2 for v_a, v_b in zip ( positions [ point_a ],
+        positions [ point_b ]))
+    return ( error, length, point_a, point_b, stamps [ point_a ], stamps [ point_b ], target )
+# end collapse_entry (…)
+
+
+def collapse_flips_face ( positions, face_points, faces, keep, drop, target ):
+    """ collapse_flips_face ( positions, face_points, faces, keep, drop, target )
+
+    Check if merging 2 vertexes would turn any of the remaining faces around
+    them over (or flat): the face normal would change direction.
+
+    @param positions - list of [ x, y, z ] vertex positions
+    @param face_points - list of the vertex indexes of each face
+    @param faces - the faces, around the vertexes, that are not removed
+    @param keep - index of the vertex that is kept
+    @param drop - index of the vertex that is merged into it
+    @param target - the [ x, y, z ] position of the merged vertex
+    @returns boolean true if a face would be flipped
+    """
+    for face in faces:
+        before = [ positions [ point ] for point in face_points [ face ]]
+        after = [ target if point in ( keep, drop ) else positions [ point ]
+            for point in face_points [ face ]]
+        normal_before = triangle_normal ( before )
+        normal_after = triangle_normal ( after )
+        if ( sum ( n_b * n_a for n_b, n_a in zip ( normal_before, normal_after )) <= 0 and
+                any ( normal_before )): # an already degenerate face has no direction
+            return True
+    return False
+# end collapse_flips_face (…)
+
+
+def triangle_normal ( corners ):
+    """ triangle_normal ( corners )
+
+    The (not normalized) normal vector of a single triangle
+
+    @param corners - list of 3 [ x, y, z ] corner points
+    @returns list with the [ x, y, z ] normal
+    """
+    ( x_0, y_0, z_0 ), ( x_1, y_1, z_1 ), ( x_2, y_2, z_2 ) = corners
+    u_x, u_y, u_z = x_1 - x_0, y_1 - y_0, z_1 - z_0
+    v_x, v_y, v_z = x_2 - x_0, y_2 - y_0, z_2 - z_0
+    return [ u_y * v_z - u_z * v_y, u_z * v_x - u_x * v_z, u_x * v_y - u_y * v_x ]
+# end triangle_normal (…)
 
-# @elapsed_time ( 'surface2polyhedron' ) # DEBUG
-def surface2polyhedron ( faces, poly ):
-    """ surface2polyhedron ( faces, poly )
 
-    Create structure containing an scad polyhedron from the subset of faces
-    (indexes) that define a closed surface within an existing polyhedron
+def merge_coplanar_faces ( mdl ):
+    """ merge_coplanar_faces ( mdl )
 
-    @param faces - close surface faces with vertex indexes to original polyhedron
-    @param o - object the close surface is a subset of
-    @returns 3d object dictionary of polyhedron defining the surface
+    Replace each set of edge connected triangle faces that are on the same
+    plane with a single polygon face.
+
+    All of the objects (and their --keep-full previews) are processed together,
+    with a new shared point and face buffer.  Points that are only inside
+    merged faces are no longer used, so are dropped.
+
+    @param mdl - the 3d scad model to update
+    @outputs updated mdl
+    """
+    objects = mdl.objects + [ obj.preview for obj in mdl.objects if obj.preview is not None ]
+    if not objects:
+        return
+    point_counts = np.array ([ len ( obj.points ) for obj in objects ])
+    face_counts = np.array ([ len ( obj.faces ) for obj in objects ])
+    point_starts = np.concatenate (([ 0 ], np.cumsum ( point_counts )))
+    points = np.concatenate ([ obj.points for obj in objects ])
+    faces = np.concatenate ([ obj.faces.astype ( np.int64 ) + point_starts [ idx ]
+        for idx, obj in enumerate ( objects )])
+    face_object = np.repeat ( np.arange ( len ( objects )), face_counts )
+    # a single object keeps the half edge index it already has
+    half_edges = ( objects [ 0 ].half_edges if len ( objects ) == 1
+        else HalfEdgeIndex ( faces ))
+
+    # points as text (--keep-text) are converted to numbers
+    labels, matched_edges = coplanar_face_labels ( points.astype ( np.float64 ), faces,
+        half_edges )
+    polygon_points, polygon_starts, polygon_faces = face_region_polygons (
+        faces, labels, matched_edges )
+
+    # drop unused points, and make the polygon point indexes relative to the object
+    used = np.zeros ( len ( points ), dtype = bool )
+    used [ polygon_points ] = True
+    new_index = np.cumsum ( used ) - 1
+    new_starts = np.concatenate (([ 0 ], np.cumsum ( used ))) [ point_starts ]
+    polygon_object = face_object [ polygon_faces ]
+    polygon_points = new_index [ polygon_points ] - np.repeat ( new_starts [ polygon_object ],
+        np.diff ( polygon_starts ))
+    all_points = points [ used ]
+    all_faces = polygon_points.astype ( np.int32 )
+    object_polygons = np.searchsorted ( polygon_object,
+        np.arange ( len ( objects ) + 1 )).tolist ()
+    new_starts = new_starts.tolist ()
+
+    if CMD_LINE_ARGS.verbose:
+        print ( '{0} faces merged to {1} polygons'.format (
+            len ( faces ), len ( polygon_faces )))
+    for idx, obj in enumerate ( objects ):
+        obj.point_buffer = all_points
+        obj.point_range = ( new_starts [ idx ], new_starts [ idx + 1 ])
+        obj.face_buffer = all_faces
+        obj.face_starts = polygon_starts
+        obj.face_range = ( object_polygons [ idx ], object_polygons [ idx + 1 ])
+        obj.edge_index = None
+# end merge_coplanar_faces (…)
+
+
+def coplanar_face_labels ( points, faces, half_edges ):
+    """ coplanar_face_labels ( points, faces, half_edges )
+
+    Label every face with the set of coplanar faces it is part of.
+
+    Faces sharing an edge (in opposite directions, and not used by any other
+    faces) are on the same plane when each of the vertexes of one face is
+    within the tolerance distance of the plane of the other face, and they
+    face the same way.  To stop a chain of nearly coplanar faces drifting
+    around a curved surface, every face also needs to be within the tolerance
+    of the plane of the first face of the set.  Sets that are not are split
+    back to single faces.
+
+    The tolerance distance is COPLANAR_TOLERANCE times the largest coordinate.
+
+    @param points - numpy float array of vertex points, shape ( n, 3 )
+    @param faces - numpy array of point indexes for each triangle, shape ( m, 3 )
+    @param half_edges - HalfEdgeIndex for the faces
+    @returns tuple of numpy array with the lowest face index in the same set,
+      for each face, and numpy array with the matching (reverse direction)
+      edge of each edge, or -1
+    """
+    corners = points [ faces ]
+    normals = np.cross ( corners [ :, 1 ] - corners [ :, 0 ], corners [ :, 2 ] - corners [ :, 0 ])
+    lengths = np.linalg.norm ( normals, axis = 1 )
+    has_plane = lengths > 0 # degenerate (zero area) faces are never merged
+    normals [ has_plane ] /= lengths [ has_plane, np.newaxis ]
+    offsets = np.einsum ( 'ij,ij->i', normals, corners [ :, 0 ])
+    tolerance = COPLANAR_TOLERANCE * max ( 1.0, float ( np.abs ( points ).max ( initial = 0 )))
+
+    # edges with exactly one matching reverse edge, which matches only them
+    matched_edges = half_edges.twins ()
+    edge_a = np.flatnonzero ( matched_edges > np.arange ( len ( matched_edges )))
+    face_a = edge_a // 3 # 3 edges / face
+    face_b = matched_edges [ edge_a ] // 3
+    coplanar = ( has_plane [ face_a ] & has_plane [ face_b ] &
+        ( np.einsum ( 'ij,ij->i', normals [ face_a ], normals [ face_b ]) > 0 ) &
+        ( plane_distances ( normals [ face_a ], offsets [ face_a ],
+            corners [ face_b ]) <= tolerance ) &
+        ( plane_distances ( normals [ face_b ], offsets [ face_b ],
+            corners [ face_a ]) <= tolerance ))
+    labels = connected_labels ( len ( faces ), face_a [ coplanar ], face_b [ coplanar ])
+
+    off_plane = plane_distances ( normals [ labels ], offsets [ labels ], corners ) > tolerance
+    drifted = np.isin ( labels, labels [ off_plane ])
+    labels [ drifted ] = np.flatnonzero ( drifted )
+    return labels, matched_edges
+# end coplanar_face_labels (…)
+
+
+def plane_distances ( normals, offsets, corners ):
+    """ plane_distances ( normals, offsets, corners )
+
+    Find the largest distance of the corners of faces from matching planes.
+
+    @param normals - numpy array of unit plane normals, shape ( m, 3 )
+    @param offsets - numpy array of plane distances from the origin, shape ( m, )
+    @param corners - numpy array of face vertex points, shape ( m, 3, 3 )
+    @returns numpy array of the largest (absolute) distance for each face
+    """
+    return np.abs ( np.einsum ( 'ij,ikj->ik', normals, corners ) -
+        offsets [ :, np.newaxis ]).max ( axis = 1 )
+# end plane_distances (…)
+
+
+def face_region_polygons ( faces, labels, matched_edges ):
+    """ face_region_polygons ( faces, labels, matched_edges )
+
+    Convert each set of (labelled) faces to a single polygon, following the
+    edges of the set that are not shared by 2 faces of the same set.
+
+    Only sets with a single boundary loop, that does not pass through any point
+    more than once, can be replaced by a polygon.  Sets with holes, or that only
+    touch at a point, are kept as the original triangles.  The points around
+    each loop are put in order by pointer jumping (list ranking), the same way
+    for all of the loops together.
+
+    @param faces - numpy array of point indexes for each triangle, shape ( m, 3 )
+    @param labels - numpy array with the lowest face index in the same set
+    @param matched_edges - numpy array with the matching (reverse) edge of each
+      edge, or -1
+    @returns tuple of numpy arrays: polygon point indexes, the start of each
+      polygon in those (plus the end of the last), and the (lowest) face index
+      the polygon replaces
+    """
+    labels = labels.copy ()
+    edge_labels = np.repeat ( labels, 3 ) # 3 edges / face
+    matched_labels = np.where ( matched_edges >= 0, edge_labels [ matched_edges ], -1 )
+    in_set = np.bincount ( labels, minlength = len ( labels )) [ labels ] > 1
+    boundary = np.flatnonzero ( np.repeat ( in_set, 3 ) & ( matched_labels != edge_labels ))
+    edge_start = np.reshape ( faces, -1 ) [ boundary ]
+    edge_end = np.reshape ( np.roll ( faces, -1, axis = 1 ), -1 ) [ boundary ]
+    boundary_labels = edge_labels [ boundary ]
+
+    # the next boundary edge of the same set starts where each edge ends
+    point_count = int ( faces.max ( initial = 0 )) + 1
+    start_keys = boundary_labels * point_count + edge_start
+    start_order = np.argsort ( start_keys )
+    sorted_keys = start_keys [ start_order ]
+    next_pos = np.minimum ( np.searchsorted ( sorted_keys, boundary_labels * point_count +
+        edge_end ), len ( sorted_keys ) - 1 )
+    next_edge = start_order [ next_pos ]
+    bad_edges = sorted_keys [ next_pos ] != boundary_labels * point_count + edge_end
+    bad_edges [ start_order [ 1: ][ sorted_keys [ 1: ] == sorted_keys [ :-1 ]]] = True
+    bad_sets = np.union1d ( boundary_labels [ bad_edges ], # or no boundary at all
+        np.setdiff1d ( labels [ in_set ], boundary_labels ))
+    edge_idx = np.arange ( len ( boundary ))
+    next_edge [ np.isin ( boundary_labels, bad_sets )] = edge_idx [
+        np.isin ( boundary_labels, bad_sets )]
+
+    # sets with more than a single loop
+    loop_roots = connected_labels ( len ( boundary ), edge_idx, next_edge )
+    root_edges = np.flatnonzero ( loop_roots == edge_idx )
+    loop_sets, loop_count = np.unique ( boundary_labels [ root_edges ], return_counts = True )
+    bad_sets = np.union1d ( bad_sets, loop_sets [ loop_count > 1 ])
+    bad_faces = np.isin ( labels, bad_sets )
+    labels [ bad_faces ] = np.flatnonzero ( bad_faces )
+    good_edges = ~np.isin ( boundary_labels, bad_sets )
+
+    # position of each boundary edge in its loop, counting from the root edge
+    succ = np.where ( loop_roots == edge_idx, edge_idx, next_edge )
+    steps = ( succ != edge_idx ).astype ( np.int64 )
+    while True:
+        succ_succ = succ [ succ ]
+        if np.array_equal ( succ_succ, succ ):
+            break
+        steps += steps [ succ ]
+        succ = succ_succ
+    loop_size = np.bincount ( loop_roots, minlength = len ( boundary )) [ loop_roots ]
+    loop_pos = ( loop_size - steps ) % np.maximum ( loop_size, 1 )
+
+    # single (unmerged) faces keep their 3 points
+    single_faces = np.flatnonzero (
+        np.bincount ( labels, minlength = len ( labels )) [ labels ] == 1 )
+    point_labels = np.concatenate (( np.repeat ( single_faces, 3 ), boundary_labels [ good_edges ]))
+    point_pos = np.concatenate (( np.tile ( np.arange ( 3 ), len ( single_faces )),
+        loop_pos [ good_edges ]))
+    polygon_points = np.concatenate (( np.reshape ( faces [ single_faces ], -1 ),
+        edge_start [ good_edges ]))
+    point_order = np.lexsort (( point_pos, point_labels ))
+    polygon_faces, polygon_sizes = np.unique ( point_labels, return_counts = True )
+    polygon_starts = np.concatenate (([ 0 ], np.cumsum ( polygon_sizes )))
+    return polygon_points [ point_order ], polygon_starts, polygon_faces
+# end face_region_polygons (…)
+
+
+def save_model_metrics ( mdl ):
+    """ save_model_metrics ( mdl )
+
+    Save the geometry metrics of every object of the model, as csv or json,
+    beside the .scad file(s)
+
+    @inputs global CMD_LINE_ARGS - parsed command line arguments
+
+    @param mdl - description of 3d OpenScad model (as polyhedrons)
+    @outputs .metrics.csv or .metrics.json file
     """
-    # get unique (poly) vertex indexes used in the closed surface faces
-    object_points = np.unique ( np.reshape ([ poly [ 'faces' ][ faceIdx ]
-        for faceIdx in faces ], -1 )).tolist ()
+    metrics = model_metrics ( mdl )
+    metrics_spec = '{0}.metrics.{1}'.format (
+        os.path.splitext ( full_scad_file_spec ( mdl, '' )) [ 0 ], CMD_LINE_ARGS.metrics )
+    names = list ( metrics )
+    rows = zip ( *[ metrics [ name ] if isinstance ( metrics [ name ], list )
+        else metrics [ name ].tolist () for name in names ])
+    with open ( metrics_spec, 'w', encoding = 'utf-8', newline = '' ) as f_metrics:
+        if CMD_LINE_ARGS.metrics == 'json':
+            json.dump ([ dict ( zip ( names, row )) for row in rows ], f_metrics, indent = 1 )
+        else: # vector metrics are a column per axis
+            writer = csv.writer ( f_metrics )
+            writer.writerow ([ name + axis for name in names
+                for axis in ( 'XYZ' if np.ndim ( metrics [ name ]) == 2 else [ '' ])])
+            writer.writerows ([ value for item in row
+                for value in ( item if isinstance ( item, list ) else [ item ])]
+                for row in rows )
+    # TODO handle --quiet
+    print ( 'object metrics ==> {0}'.format ( metrics_spec ))
+# end save_model_metrics (…)
+
+
+def model_metrics ( mdl ):
+    """ model_metrics ( mdl )
+
+    Calculate the geometry metrics of every object of the model together.
+
+    The faces of all of the objects are (fan) triangulated into one triangle
+    array, then each metric is a segmented sum (by object) of per triangle
+    values.  Volume and centroid use the (signed) tetrahedrons from each
+    triangle to the object bounding box minimum, so they are only meaningful
+    for closed surfaces: the centroid of an object without volume is the mean
+    of its points.  Polygon face areas are the length of the summed triangle
+    area vectors, so concave polygons are measured correctly.
+
+    @param mdl - description of 3d OpenScad model (as polyhedrons)
+    @returns dictionary of per object metrics: module name list, and numpy arrays
+    """
+    obj_count = len ( mdl.objects )
+    points, point_object, triangles, triangle_faces, face_object = model_triangles ( mdl )
+    triangle_object = face_object [ triangle_faces ]
+    point_counts = np.bincount ( point_object, minlength = obj_count )
+    face_counts = np.bincount ( face_object, minlength = obj_count )
+
+    # the points of each object are together, but the objects are not in order
+    object_first = np.full ( obj_count, len ( points ))
+    np.minimum.at ( object_first, point_object, np.arange ( len ( points )))
+    first_order = np.argsort ( object_first )
+    bbox_min = np.empty (( obj_count, 3 ))
+    bbox_max = np.empty (( obj_count, 3 ))
+    bbox_min [ first_order ] = np.minimum.reduceat ( points, object_first [ first_order ],
+        axis = 0 )
+    bbox_max [ first_order ] = np.maximum.reduceat ( points, object_first [ first_order ],
+        axis = 0 )
+    corners = points [ triangles ] - bbox_min [ triangle_object, np.newaxis ]
+    normals = np.cross ( corners [ :, 1 ] - corners [ :, 0 ], corners [ :, 2 ] - corners [ :, 0 ])
+    face_vectors = np.stack ([ np.bincount ( triangle_faces, normals [ :, axis ],
+        minlength = len ( face_object )) for axis in range ( 3 )], axis = 1 )
+    area = np.bincount ( face_object, 0.5 * np.linalg.norm ( face_vectors, axis = 1 ),
+        minlength = obj_count )
+    tetra_volume = np.einsum ( 'ij,ij->i', corners [ :, 0 ], normals ) / 6
+    volume = np.bincount ( triangle_object, tetra_volume, minlength = obj_count )
+    moment = np.stack ([ np.bincount ( triangle_object,
+        tetra_volume * corners [ :, :, axis ].sum ( axis = 1 ) / 4, minlength = obj_count )
+        for axis in range ( 3 )], axis = 1 )
+    mean_point = np.stack ([ np.bincount ( point_object, points [ :, axis ],
+        minlength = obj_count ) for axis in range ( 3 )], axis = 1 )
+    mean_point /= point_counts [ :, np.newaxis ]
+    has_volume = volume != 0
+    centroid = mean_point
+    centroid [ has_volume ] = ( moment [ has_volume ] / volume [ has_volume, np.newaxis ] +
+        bbox_min [ has_volume ])
+
     return {
-        'faces': np.array ([[ object_points.index ( pt )
-            for pt in poly [ 'faces' ][ faceIdx ]]
-            for faceIdx in faces ]), # surface faces with indexes to surface points
-        'points': np.array ([ poly [ 'points' ][ idx ]
-            for idx in object_points ])} # vertex points for the closed surface
-# end surface2polyhedron (…)
+        'module': object_module_names ( mdl ),
+        'facets': face_counts,
+        'vertexes': point_counts,
+        'copies': np.array ([ 0 if obj.copies is None else len ( obj.copies )
+            for obj in mdl.objects ]),
+        'volume': volume,
+        'area': area,
+        'bboxMin': bbox_min,
+        'bboxMax': bbox_max,
+        'centroid': centroid
+    }
+# end model_metrics (…)
+
+
+def model_triangles ( mdl ):
+    """ model_triangles ( mdl )
+
+    Collect the points and (triangulated) faces of all of the model objects,
+    without a separate copy for each object.
+
+    Objects that use the same buffers (all of the objects from a split) are
+    gathered together, with index arrays built from the object ranges.  The
+    points of each object stay together, and the triangle point indexes are
+    to the combined points.
+
+    @param mdl - description of 3d OpenScad model (as polyhedrons)
+    @returns tuple of numpy arrays: float64 points, object of each point,
+      triangle point indexes, face of each triangle, and object of each face
+    """
+    buffer_groups = {}
+    for idx, obj in enumerate ( mdl.objects ):
+        buffer_groups.setdefault (( id ( obj.point_buffer ), id ( obj.face_buffer ),
+            id ( obj.face_starts )), []).append ( idx )
+
+    points, point_object, triangles, triangle_faces, face_object = [], [], [], [], []
+    point_total = face_total = 0
+    for group in buffer_groups.values ():
+        first_obj = mdl.objects [ group [ 0 ]]
+        group = np.array ( group )
+        point_ranges = np.array ([ mdl.objects [ idx ].point_range for idx in group ])
+        face_ranges = np.array ([ mdl.objects [ idx ].face_range for idx in group ])
+        point_counts = point_ranges [ :, 1 ] - point_ranges [ :, 0 ]
+        face_counts = face_ranges [ :, 1 ] - face_ranges [ :, 0 ]
+        face_rows = range_indexes ( face_ranges [ :, 0 ], face_ranges [ :, 1 ])
+        group_face_object = np.repeat ( np.arange ( len ( group )), face_counts )
+        if first_obj.face_starts is None:
+            group_triangles = first_obj.face_buffer [ face_rows ].astype ( np.int64 )
+            group_faces = np.arange ( len ( face_rows ))
+        else:
+            group_triangles, group_faces = polygon_fans ( first_obj.face_buffer,
+                first_obj.face_starts [ face_rows ],
+                first_obj.face_starts [ face_rows + 1 ] - first_obj.face_starts [ face_rows ])
+        # face point indexes are relative to the start of the object points
+        point_shift = np.cumsum ( point_counts ) - point_counts + point_total
+        group_triangles += point_shift [ group_face_object [ group_faces ], np.newaxis ]
+
+        points.append ( first_obj.point_buffer [ range_indexes ( point_ranges [ :, 0 ],
+            point_ranges [ :, 1 ])])
+        point_object.append ( np.repeat ( group, point_counts ))
+        triangles.append ( group_triangles )
+        triangle_faces.append ( group_faces + face_total )
+        face_object.append ( group [ group_face_object ])
+        point_total += int ( point_counts.sum ())
+        face_total += len ( face_rows )
+    return ( np.concatenate ( points ).astype ( np.float64 ), np.concatenate ( point_object ),
+        np.concatenate ( triangles ), np.concatenate ( triangle_faces ),
+        np.concatenate ( face_object ))
+# end model_triangles (…)
+
+
+def range_indexes ( starts, stops ):
+    """ range_indexes ( starts, stops )
+
+    The indexes of a set of ranges, one range after the other
+
+    @param starts - numpy array with the first index of each range
+    @param stops - numpy array with the end (one past the last index) of each range
+    @returns numpy array of the indexes in all of the ranges
+    """
+    lengths = stops - starts
+    return np.repeat ( starts - np.cumsum ( lengths ) + lengths, lengths ) + np.arange (
+        lengths.sum ())
+# end range_indexes (…)
+
+
+def polygon_fans ( face_buffer, first_points, sizes ):
+    """ polygon_fans ( face_buffer, first_points, sizes )
+
+    Split polygon faces into triangles, fanning out from the first point of
+    each polygon
+
+    @param face_buffer - numpy array of the point indexes of all polygons together
+    @param first_points - numpy array with the offset in face_buffer of each polygon
+    @param sizes - numpy array with the number of points in each polygon
+    @returns tuple of numpy arrays: point indexes of each triangle, shape ( t, 3 ),
+      and the polygon (sequence in first_points) of each triangle
+    """
+    fan_counts = np.maximum ( sizes - 2, 0 )
+    fan_faces = np.repeat ( np.arange ( len ( fan_counts )), fan_counts )
+    first = first_points [ fan_faces ]
+    step = np.arange ( len ( fan_faces )) - np.repeat (
+        np.cumsum ( fan_counts ) - fan_counts, fan_counts ) + 1
+    return np.stack (( face_buffer [ first ], face_buffer [ first + step ],
+        face_buffer [ first + step + 1 ]), axis = 1 ).astype ( np.int64 ), fan_faces
+# end polygon_fans (…)
 
 
 def model2file ( mdl ):
@@ -276,64 +1987,309 @@ def model2file ( mdl ):
 
     Save 3d model polyhedron(s) to scad file(s)
 
+    A single object is saved as a module in its own file.  Multiple objects (or
+    copies of an object) are saved as one module per file, plus a wrapper file
+    that uses all of the modules, then calls them.  With --bundle, the modules
+    are saved together in a single file, with the calls at the end, or in
+    files of --bundle-size modules, plus the wrapper file.
+
+    @inputs global CMD_LINE_ARGS - parsed command line arguments
+
     @param mdl - description of 3d OpenScad model (as polyhedrons)
+    @returns boolean false if a file could not be created
     """
-    obj_cnt = len ( mdl [ 'objects' ])
-    obj_seq = '' if obj_cnt < 2 else 0
-    wrapper_file = None
-    w_file = None
-    for obj in mdl [ 'objects' ]:
-        if obj_seq == '':
-            m_name = mdl [ 'model' ]
-        else:
-            obj_seq += 1
-            # TODO implement CMD_LINE_ARGS.precision
-            m_name = '{0}{1:03d}'.format ( mdl [ 'model' ], obj_seq)
-
-        if not wrapper_file == mdl [ 'model' ]:
-            if not w_file is None:
-                # TODO handle --quiet
-                print ( 'object load wrapper ==> {0} '.format ( w_file.name ))
-                w_file.close ()
-            if obj_seq == '':
-                wrapper_file = None
-                w_file = None
-            else:
-                w_file = init_scad_file ( mdl, '' )
-                if w_file is None:
-                    print ( 'failed to create OpenSCAD module wrapper file' )
-                    return False
-                wrapper_file = mdl [ 'model' ]
-
-        o_file = init_scad_file ( mdl, obj_seq )
-        if o_file is None:
-            # return? raise?
-            print ( 'failed to create OpenSCAD module save file' )
-            return False # IDEA continue, but set failure flag
-        o_file.write ( CFG [ 'moduleFormat' ].format (
-            name  = m_name,
-            # pts   = CFG [ 'dataJoin' ].join ( obj [ 'points' ]), # points already stringified
-            pts   = CFG [ 'dataJoin' ].join ([ point2str ( pt ) for pt in obj [ 'points' ]]),
-            faces = CFG [ 'dataJoin' ].join ([ point2str ( pt ) for pt in obj [ 'faces' ]])))
-        if wrapper_file == mdl [ 'model' ]:
-            w_file.write ( 'use <{0}>\n'.format ( os.path.split ( o_file.name )[ 1 ]))
-            # TODO buffer the m_name calls until closing w_file, so the `use` all end up at the top
-            w_file.write ( '{0}();\n'.format ( m_name ))
-        # TODO handle --quiet
-        print ( '{0} ==> {1}'.format (
-            os.path.join ( mdl [ 'stlPath' ], mdl [ 'stlFile' ]),
-            o_file.name ))
-        o_file.close ()
-
-    if not wrapper_file is None:
-        # TODO handle --quiet
-        print ( 'object load wrapper ==> {0} '.format ( w_file.name ))
-        w_file.close()
+    if CMD_LINE_ARGS.watch: # a reconversion may need fewer files than before
+        remove_sequence_files ( mdl )
+    obj_cnt = len ( mdl.objects )
+    if obj_cnt == 1 and mdl.objects [ 0 ].copies is None:
+        return modules2file ( mdl, '', [( mdl.model, mdl.objects [ 0 ])],
+            [ CFG [ 'moduleCall' ].format ( name = mdl.model )]) is not None
+
+    # TODO implement CMD_LINE_ARGS.precision
+    modules = list ( zip ( object_module_names ( mdl ), mdl.objects ))
+    calls = model_calls ( modules )
+    file_size = 1
+    if CMD_LINE_ARGS.bundle:
+        file_size = CMD_LINE_ARGS.bundle_size or obj_cnt
+        if file_size >= obj_cnt: # everything in a single file
+            return modules2file ( mdl, '', modules, calls ) is not None
+
+    uses = []
+    for file_seq, start in enumerate ( range ( 0, obj_cnt, file_size )):
+        file_modules = modules [ start: start + file_size ]
+        # the call in a module file only runs when the file is opened directly
+        o_name = modules2file ( mdl, file_seq + 1, file_modules,
+            [ CFG [ 'moduleCall' ].format ( name = file_modules [ 0 ][ 0 ])]
+            if file_size == 1 else [])
+        if o_name is None:
+            return False
+        uses.append ( 'use <{0}>\n'.format ( os.path.split ( o_name ) [ 1 ]))
 
+    try:
+        w_file = init_scad_file ( mdl, '' )
+    except OSError as err: # includes FileExistsError, without --overwrite
+        print ( 'failed to create OpenSCAD module wrapper file: {0}'.format ( err ))
+        return False
+    with w_file:
+        w_file.write ( ''.join ( uses ))
+        w_file.write ( ''.join ( calls ))
+    # TODO handle --quiet
+    print ( 'object load wrapper ==> {0} '.format ( w_file.name ))
     return True
 # end model2file (…)
 
 
+def remove_sequence_files ( mdl ):
+    """ remove_sequence_files ( mdl )
+
+    Remove the numbered module .scad files saved for a previous conversion of
+    the model, so files that the new wrapper no longer uses do not look current
+
+    @param mdl - description of 3d OpenScad model (as polyhedrons)
+    @outputs removed .scad files
+    """
+    seq = 1
+    while os.path.exists ( full_scad_file_spec ( mdl, seq )):
+        os.remove ( full_scad_file_spec ( mdl, seq ))
+        seq += 1
+# end remove_sequence_files (…)
+
+
+def modules2file ( mdl, seq, modules, calls ):
+    """ modules2file ( mdl, seq, modules, calls )
+
+    Save polyhedron modules to a single .scad file, followed by module calls
+
+    @param mdl - description of 3d OpenScad model (as polyhedrons)
+    @param seq - sequence number of the file for the model
+    @param modules - list of ( module name, ScadObject ) tuples
+    @param calls - list of module call text to put after all of the modules
+    @returns the name of the created file, or None
+    """
+    try:
+        o_file = init_scad_file ( mdl, seq )
+    except OSError as err: # includes FileExistsError, without --overwrite
+        print ( 'failed to create OpenSCAD module save file: {0}'.format ( err ))
+        return None # IDEA continue, but set failure flag
+    with o_file:
+        write_scad_modules ( o_file, modules, calls )
+    # TODO handle --quiet
+    print ( '{0} ==> {1}'.format (
+        os.path.join ( mdl.stl_path, mdl.stl_file ),
+        o_file.name ))
+    return o_file.name
+# end modules2file (…)
+
+
+def model2text ( mdl ):
+    """ model2text ( mdl )
+
+    Generate the OpenSCAD source for a 3d model (model2stream)
+
+    @param mdl - description of 3d OpenScad model (as polyhedrons)
+    @returns string with the .scad file content
+    """
+    o_text = io.StringIO ()
+    model2stream ( mdl, o_text )
+    return o_text.getvalue ()
+# end model2text (…)
+
+
+def model2stream ( mdl, o_file ):
+    """ model2stream ( mdl, o_file )
+
+    Write the OpenSCAD source for a 3d model: all of the modules, followed by
+    the calls that place the objects.  The text matches a single --bundle file.
+
+    @inputs global CFG - processing configuration
+
+    @param mdl - description of 3d OpenScad model (as polyhedrons)
+    @param o_file - text stream to write the .scad source to
+    @outputs OpenSCAD modules and calls to o_file
+    """
+    modules = list ( zip ( object_module_names ( mdl ), mdl.objects ))
+    if len ( mdl.objects ) == 1 and mdl.objects [ 0 ].copies is None:
+        calls = [ CFG [ 'moduleCall' ].format ( name = mdl.model )]
+    else:
+        calls = model_calls ( modules )
+    write_scad_modules ( o_file, modules, calls )
+# end model2stream (…)
+
+
+def write_scad_modules ( o_file, modules, calls ):
+    """ write_scad_modules ( o_file, modules, calls )
+
+    Write polyhedron modules, followed by module calls
+
+    An object with a (--keep-full) preview is written as full and preview
+    modules, plus a module with the object name that uses the preview module
+    for OpenSCAD previews, and the full module otherwise.
+
+    @inputs global CFG - processing configuration
+
+    @param o_file - file handle (or text stream) to write the modules to
+    @param modules - list of ( module name, ScadObject ) tuples
+    @param calls - list of module call text to put after all of the modules
+    @outputs OpenSCAD modules and calls to o_file
+    """
+    for idx, ( m_name, obj ) in enumerate ( modules ):
+        if idx > 0:
+            o_file.write ( '\n' )
+        if obj.preview is None:
+            write_scad_module ( o_file, m_name, obj )
+            continue
+        write_scad_module ( o_file, m_name + '_full', obj )
+        o_file.write ( '\n' )
+        write_scad_module ( o_file, m_name + '_preview', obj.preview )
+        o_file.write ( '\n' + CFG [ 'previewModule' ].format ( name = m_name ))
+    if calls:
+        o_file.write ( '\n' + ''.join ( calls ))
+# end write_scad_modules (…)
+
+
+def object_module_names ( mdl ):
+    """ object_module_names ( mdl )
+
+    The OpenSCAD module names for the objects of a model: the model name for a
+    single object, otherwise the model name with the object sequence number
+
+    @param mdl - description of 3d OpenScad model (as polyhedrons)
+    @returns list of module names, one per object
+    """
+    if len ( mdl.objects ) == 1 and mdl.objects [ 0 ].copies is None:
+        return [ mdl.model ]
+    return [ '{0}{1:03d}'.format ( mdl.model, obj_seq + 1 )
+        for obj_seq in range ( len ( mdl.objects ))]
+# end object_module_names (…)
+
+
+def model_calls ( modules ):
+    """ model_calls ( modules )
+
+    Generate the OpenSCAD statements that place all of the objects of a model.
+    Voids are differenced out of the object that contains them.
+
+    @inputs global CMD_LINE_ARGS - parsed command line arguments
+    @inputs global CFG - processing configuration
+
+    @param modules - list of ( module name, ScadObject ) tuples
+    @returns list of module call text, one entry per object that is not a void
+    """
+    void_names = {} # container object to the module names of its voids
+    for m_name, obj in modules:
+        if obj.container is not None:
+            void_names.setdefault ( id ( obj.container ), []).append ( m_name )
+    calls = []
+    for m_name, obj in modules:
+        if obj.container is not None:
+            continue
+        if id ( obj ) in void_names:
+            calls.append ( 'difference() {{\n{0}}}\n'.format ( ''.join (
+                CMD_LINE_ARGS.indent + CFG [ 'moduleCall' ].format ( name = name )
+                for name in [ m_name ] + void_names [ id ( obj )])))
+        else:
+            calls.append ( module_calls ( m_name, obj ))
+    return calls
+# end model_calls (…)
+
+
+def module_calls ( m_name, obj ):
+    """ module_calls ( m_name, obj )
+
+    Generate the OpenSCAD statements that place an object, and any copies of it
+
+    @inputs global CFG - processing configuration
+
+    @param m_name - the name of the object module
+    @param obj - ScadObject to place
+    @returns text of the module call(s)
+    """
+    call = CFG [ 'moduleCall' ].format ( name = m_name )
+    if obj.copies is None:
+        return call
+    return call + ''.join ([ 'translate({0}) {1}'.format ( point2str ( offset ), call )
+        for offset in obj.copies ])
+# end module_calls (…)
+
+
+def write_scad_module ( o_file, m_name, obj ):
+    """ write_scad_module ( o_file, m_name, obj )
+
+    Write the OpenSCAD module for a single polyhedron object to an open file.
+
+    The points and faces are streamed to the file in blocks, instead of building
+    the complete module text in memory first.
+
+    @inputs global CFG - processing configuration
+
+    @param o_file - file handle to write the module to
+    @param m_name - the name for the module
+    @param obj - ScadObject with the points and faces for a 3d object
+    """
+    head, mid, tail = CFG [ 'moduleParts' ]
+    o_file.write ( head.format ( name = m_name ))
+    # points are either numbers, or coordinate text copied from an ascii stl file
+    write_scad_vectors ( o_file, obj.points,
+        '%s' if obj.points.dtype.kind == 'U' else '%.9g' )
+    o_file.write ( mid.format ( name = m_name ))
+    if obj.face_starts is None:
+        write_scad_vectors ( o_file, obj.faces, '%d' )
+    else:
+        write_scad_polygons ( o_file, obj.faces )
+    o_file.write ( tail.format ( name = m_name ))
+# end write_scad_module (…)
+
+
+def write_scad_vectors ( o_file, vectors, value_format ):
+    """ write_scad_vectors ( o_file, vectors, value_format )
+
+    Write a list of vectors (points or faces) to an .scad file, separated by
+    CFG [ 'dataJoin' ].
+
+    Each block of SCAD_BLOCK_ROWS vectors is formatted by a single string
+    formatting operation on the flattened block values, with a format string
+    that is built once and reused for every full block.  The formatted text is
+    the same as point2str creates for each vector.
+
+    @inputs global CFG - processing configuration
+
+    @param o_file - file handle to write the vectors to
+    @param vectors - numpy array of vectors, shape ( n, m )
+    @param value_format - printf style format for a single vector element
+    """
+    vector_format = '[{0}]'.format ( ', '.join ([ value_format ] * vectors.shape [ 1 ]))
+    join_format = CFG [ 'dataJoin' ].replace ( '%', '%%' )
+    block_format = join_format.join ([ vector_format ] * SCAD_BLOCK_ROWS )
+    for start in range ( 0, len ( vectors ), SCAD_BLOCK_ROWS ):
+        block = vectors [ start: start + SCAD_BLOCK_ROWS ]
+        if start > 0:
+            o_file.write ( CFG [ 'dataJoin' ])
+        if len ( block ) < SCAD_BLOCK_ROWS: # final partial block
+            block_format = join_format.join ([ vector_format ] * len ( block ))
+        o_file.write ( block_format % tuple ( np.reshape ( block, -1 ).tolist ()))
+# end write_scad_vectors (…)
+
+
+def write_scad_polygons ( o_file, polygons ):
+    """ write_scad_polygons ( o_file, polygons )
+
+    Write a list of polygon faces, with different numbers of points, to an .scad
+    file, separated by CFG [ 'dataJoin' ].
+
+    @inputs global CFG - processing configuration
+
+    @param o_file - file handle to write the faces to
+    @param polygons - list of numpy arrays of point indexes
+    """
+    for start in range ( 0, len ( polygons ), SCAD_BLOCK_ROWS ):
+        if start > 0:
+            o_file.write ( CFG [ 'dataJoin' ])
+        o_file.write ( CFG [ 'dataJoin' ].join ([ '[{0}]'.format (
+            ', '.join ( map ( str, polygon.tolist ())))
+            for polygon in polygons [ start: start + SCAD_BLOCK_ROWS ]]))
+# end write_scad_polygons (…)
+
+
 def point2str ( pnt ):
     """ point2str( pnt )
 
@@ -378,13 +2334,13 @@ def full_scad_file_spec ( mdl, seq ):
     # TODO handle --module
     f_name = '%s%s%s%sscad' % (
         '', # CMD_LINE_ARGS.prefix
-        mdl [ 'model' ],
+        mdl.model,
         sfx,
         os.path.extsep )
-    if mdl [ 'stlPath' ] == '':
+    if mdl.stl_path == '':
         return f_name
     # TODO handle --destination
-    return os.path.join ( os.path.relpath ( mdl [ 'stlPath' ]), f_name )
+    return os.path.join ( os.path.relpath ( mdl.stl_path ), f_name )
 # end full_scad_file_spec (…)
 
 
@@ -393,12 +2349,23 @@ def init_scad_file ( mdl, seq ):
 
     open and prepare a file to hold an OpenScad script
 
+    Existing files are only replaced with --overwrite (or --watch, which
+    reconverts to the same files): the file is opened with mode 'w' then, and
+    with mode 'x' (create a new file only) otherwise.
+
+    @inputs global CMD_LINE_ARGS - parsed command line arguments
+
     @param mdl - 3d scad model
     @param seq - object sequence number in the model
-    @returns file handle or None
+    @returns (text) file handle, opened for writing
+    @raises FileExistsError when the file already exists, without --overwrite
+      or --watch
+    @raises OSError when the file can not be created
     """
     full_spec = full_scad_file_spec ( mdl, seq )
-    return open ( full_spec, mode = 'x' )
+    return open ( full_spec,
+        mode = 'w' if CMD_LINE_ARGS.overwrite or CMD_LINE_ARGS.watch else 'x',
+        encoding = 'utf-8' )
 # end init_scad_file (…)
 
 
@@ -419,200 +2386,851 @@ def generate_module_name ( mdl ):
     """
     # TODO handle --module
     # print ( 'generate_module_name:\n{0}'.format ( mdl )) # DEBUG
-    if len ( mdl [ 'solid' ]) > 1:
-        mdl [ 'model' ] = mdl [ 'solid' ]
+    if len ( mdl.solid ) > 1:
+        mdl.model = mdl.solid
     else:
         # IDEA: with linux, remove (possible) multiple extentions?
-        split_name = os.path.splitext ( mdl [ 'stlFile' ])
+        split_name = os.path.splitext ( mdl.stl_file )
         # TODO replace manifest constants with named CFG values
         if len ( split_name [ 0 ] )> 1 and len ( split_name [ 1 ] )< 5:
-            mdl [ 'model' ] = split_name [ 0 ]
+            mdl.model = split_name [ 0 ]
         else:
-            mdl [ 'model' ] = mdl [ 'stlFile' ]
-    if len ( mdl [ 'model' ] ) < 2:
-        mdl [ 'model' ] = 'stlmodule'
+            mdl.model = mdl.stl_file
+    if len ( mdl.model ) < 2:
+        mdl.model = 'stlmodule'
 # end generate_module_name (…)
 
 
-def process_stl_file ( f_handle ):
-    """ process_stl_file ( f_handle )
+def process_stl_file ( f_handle, scad_output = None, content_hash = None ):
+    """ process_stl_file ( f_handle, scad_output, content_hash )
 
     process a single input stl file
 
+    The content is taken from the open handle (stl_file_content), and passed
+    through to the loader, so the file is read once, and never reopened by
+    name.  That also works for stdin.
+
     @inputs global CMD_LINE_ARGS - parsed command line arguments
 
-    @param f_handle - handle for stl file
-    @outputs converted .scad file(s)
+    @param f_handle - handle for stl file, opened in binary mode
+    @param scad_output - text stream to write the .scad source to, instead of
+      to files; None to save .scad files
+    @param content_hash - hashlib object already updated with the file content
+      (by --watch), so the --cache key does not hash it again
+    @returns boolean false if the file could not be converted
+    @outputs converted .scad file(s), or .scad source to scad_output
     """
     if CMD_LINE_ARGS.verbose:
         file_path_info ( f_handle )
-    scad_model = new_scad_model ( f_handle.name )
-    stl_mesh = get_mesh ( f_handle.name )
-    f_handle.close()
+    with f_handle:
+        data = stl_file_content ( f_handle )
+    # stdin has no file name: use the same name as for convert () of stl bytes
+    file_spec = 'stlmodule.stl' if f_handle is sys.stdin.buffer else f_handle.name
+    scad_model = new_scad_model ( file_spec )
+    start_file_profile ( scad_model )
+
+    good = build_scad_model ( scad_model, file_spec, data, content_hash )
+    del data
+    if good:
+        profile_counts ( scad_model )
+        # save the objects to .scad module files, or the --stdout stream
+        good = save_scad_model ( scad_model, scad_output )
+
+    finish_file_profile ( scad_model, good )
+    return good
+# end process_stl_file (…)
 
-    if stl_mesh is None:
-        return
-    scad_model [ 'solid' ] = stl_mesh.name.decode( "ascii" )
-    generate_module_name( scad_model )
-    if CMD_LINE_ARGS.verbose:
-        show_mesh_info( stl_mesh )
 
-    # TODO handle --mode «conversion_mode»
-    # «raw¦dedup¦split¦simplify¦«?other?»»
-    # mesh2polyhedron ( scad_model, stl_mesh ) # DEBUG
-    mesh2minimized_polyhedron ( scad_model, stl_mesh )
+def save_scad_model ( mdl, scad_output = None ):
+    """ save_scad_model ( mdl, scad_output )
+
+    Save the converted model to .scad file(s), or write it to a stream, plus
+    the --metrics report
 
-    print ( len ( scad_model [ 'objects' ][ 0 ]['faces' ]),
-        len ( scad_model [ 'objects' ][ 0 ]['points'])) # DEBUG
+    @inputs global CMD_LINE_ARGS - parsed command line arguments
+
+    @param mdl - description of 3d OpenScad model (as polyhedrons)
+    @param scad_output - text stream to write the .scad source to, instead of
+      to files; None to save .scad files
+    @returns boolean false if a file could not be created
+    @raises SystemExit when the reader of scad_output closed it (broken pipe)
+    @outputs .scad file(s) or .scad source to scad_output, and metrics file
+    """
+    with profile_stage ( 'write' ):
+        if scad_output is None:
+            good = model2file ( mdl )
+        else:
+            try:
+                model2stream ( mdl, scad_output )
+                scad_output.flush ()
+            except BrokenPipeError: # the consumer stopped reading (| head): exit quietly
+                # python flushes the stream again at exit: send that to devnull
+                devnull = os.open ( os.devnull, os.O_WRONLY )
+                os.dup2 ( devnull, scad_output.fileno ())
+                sys.exit ( 1 )
+            good = True
+    if good and CMD_LINE_ARGS.metrics:
+        with profile_stage ( 'metrics' ):
+            save_model_metrics ( mdl )
+    return good
+# end save_scad_model (…)
+
+
+def build_scad_model ( scad_model, file_spec, data = None, content_hash = None ):
+    """ build_scad_model ( scad_model, file_spec, data, content_hash )
+
+    Load an stl file, and process it to the scad polyhedron objects to save,
+    recording each processing stage in the profile report.
+
+    With a memory mapped (binary) stl file, the load stage does not actually
+    read anything, so the disk read time shows up in the dedup stage.
+
+    @inputs global CMD_LINE_ARGS - parsed command line arguments
+
+    @param scad_model - the (new) 3d scad model to populate
+    @param file_spec - full file path specification for the stl file
+    @param data - the stl file content, when it has already been read
+    @param content_hash - hashlib object updated with the stl file content, when
+      it has already been hashed
+    @returns boolean false if the file could not be loaded
+    @outputs populated scad_model
+    """
+    cache_key = None
+    if CMD_LINE_ARGS.cache:
+        with profile_stage ( 'cacheKey' ):
+            cache_key = conversion_cache_key ( file_spec, data, content_hash )
+        # analyze checks the full mesh, before it is split, decimated or
+        # merged: only the end result is cached, so reprocess to check it
+        if not CMD_LINE_ARGS.analyze:
+            with profile_stage ( 'cacheLoad' ):
+                cached = load_cached_model ( scad_model, cache_key )
+            if cached:
+                generate_module_name( scad_model )
+                return True
+
+    text_loaded = False
+    if CMD_LINE_ARGS.keep_text:
+        with profile_stage ( 'text' ):
+            text_loaded = ascii_stl2minimized_polyhedron ( scad_model, file_spec, data )
+    if not text_loaded:
+        with profile_stage ( 'load' ):
+            stl_mesh = get_mesh ( file_spec, data )
+
+        if stl_mesh is None:
+            return False
+        scad_model.solid = stl_mesh.name.decode( "ascii" )
+        if CMD_LINE_ARGS.verbose:
+            show_mesh_info( stl_mesh )
+
+        # TODO handle --mode «conversion_mode»
+        # «raw¦dedup¦split¦simplify¦«?other?»»
+        # mesh2polyhedron ( scad_model, stl_mesh ) # DEBUG
+        with profile_stage ( 'dedup' ):
+            if not spilled_minimized_polyhedron ( scad_model, stl_mesh ):
+                mesh2minimized_polyhedron ( scad_model, stl_mesh )
+    generate_module_name( scad_model )
+    if CMD_LINE_ARGS.weld:
+        with profile_stage ( 'weld' ):
+            weld_vertexes ( scad_model )
+
+    if CMD_LINE_ARGS.verbose:
+        print ( '{0} faces, {1} unique vertex points'.format (
+            len ( scad_model.objects [ 0 ].faces ),
+            len ( scad_model.objects [ 0 ].points )))
+    if CMD_LINE_ARGS.analyze or CMD_LINE_ARGS.split or CMD_LINE_ARGS.merge_faces:
+        with profile_stage ( 'halfEdges' ):
+            index_half_edges ( scad_model )
     if CMD_LINE_ARGS.analyze:
-        check_surface_integrity( scad_model )
+        with profile_stage ( 'analyze' ):
+            check_surface_integrity( scad_model )
 
     if CMD_LINE_ARGS.split:
-        polyhedron2disjoint_surfaces( scad_model )
+        with profile_stage ( 'split' ):
+            polyhedron2disjoint_surfaces( scad_model )
+        if CMD_LINE_ARGS.voids:
+            with profile_stage ( 'voids' ):
+                polyhedron_voids ( scad_model )
+        if CMD_LINE_ARGS.instances:
+            with profile_stage ( 'instances' ):
+                polyhedron_instances ( scad_model )
+
+    if CMD_LINE_ARGS.decimate_ratio or CMD_LINE_ARGS.decimate_faces:
+        with profile_stage ( 'decimate' ):
+            decimate_polyhedrons ( scad_model )
+
+    if CMD_LINE_ARGS.merge_faces:
+        with profile_stage ( 'merge' ):
+            merge_coplanar_faces ( scad_model )
+
+    if cache_key is not None:
+        with profile_stage ( 'cacheSave' ):
+            save_cached_model ( scad_model, cache_key )
+    return True
+# end build_scad_model (…)
 
-    model2file ( scad_model ) # save the objects to .scad module files
-# end process_stl_file (…)
+
+class ScadModel:
+    """ ScadModel ( stl_path, stl_file )
+
+    The 3D model converted from a single stl file: the polyhedron objects, and
+    the names used to save them as OpenSCAD modules
+
+    @param stl_path - path to folder containing stl file
+    @param stl_file - name of stl file, without path
+    """
+    __slots__ = ( 'stl_path', 'stl_file', 'solid', 'model', 'objects', 'profile' )
+
+    def __init__ ( self, stl_path, stl_file ):
+        self.stl_path = stl_path
+        self.stl_file = stl_file
+        self.solid = '' # solid name from the stl file
+        self.model = None # base scad module name
+        self.objects = [] # ScadObject polyhedrons
+        self.profile = None # convert () profile report
+    # end __init__ (…)
+# end class ScadModel
+
+
+class ScadObject:
+    """ ScadObject ( point_buffer, face_buffer, point_range = None, face_range = None,
+        face_starts = None )
+
+    A single polyhedron, as ranges of (possibly shared) point and face buffers.
+
+    All of the polyhedrons split from one source mesh use the same contiguous
+    float32 point and int32 face buffers, so the split does not allocate
+    separate arrays for every surface.  The face vertex indexes are relative to
+    the start of the object point range.  The points and faces properties are
+    (no copy) views of the buffer ranges.  Identical (translated) surfaces are
+    kept as a single object, with the offsets of the other copies.  A void is
+    a separate object, that knows the object it is differenced out of.  A
+    decimated (--keep-full) object has a reduced object to use for previews.
+
+    Triangle faces are the rows of the face buffer.  After merging coplanar
+    faces, the faces are polygons with different numbers of points: the face
+    buffer is then the point indexes of all of the polygons, one after the
+    other, and face_starts is the offset of each polygon in it.
+
+    @param point_buffer - numpy array of vertex points, shape ( n, 3 )
+    @param face_buffer - numpy array of point indexes for each face, shape ( m, 3 ),
+      or for all polygon faces together, shape ( k, )
+    @param point_range - tuple of ( start, stop ) rows used in point_buffer,
+      None for all rows
+    @param face_range - tuple of ( start, stop ) faces used from face_buffer,
+      None for all faces
+    @param face_starts - numpy array with the offset in face_buffer of each
+      polygon face, plus the end of the last one; None for triangle faces
+    """
+    __slots__ = ( 'point_buffer', 'face_buffer', 'point_range', 'face_range', 'face_starts',
+        'copies', 'edge_index', 'container', 'preview' )
+
+    def __init__ ( self, point_buffer, face_buffer, point_range = None, face_range = None,
+            face_starts = None ):
+        self.point_buffer = point_buffer
+        self.face_buffer = face_buffer
+        self.face_starts = face_starts
+        self.point_range = point_range or ( 0, len ( point_buffer ))
+        self.face_range = face_range or ( 0,
+            len ( face_buffer ) if face_starts is None else len ( face_starts ) - 1 )
+        self.copies = None # translation offsets of identical copies
+        self.edge_index = None # HalfEdgeIndex, built when first needed
+        self.container = None # the object this is a void in
+        self.preview = None # reduced ScadObject for OpenSCAD previews
+    # end __init__ (…)
+
+    @property
+    def points ( self ):
+        """ view of the object vertex points """
+        return self.point_buffer [ self.point_range [ 0 ]: self.point_range [ 1 ]]
+
+    @property
+    def faces ( self ):
+        """ view of the object faces, as indexes into points: a list of views
+        for polygon faces """
+        if self.face_starts is None:
+            return self.face_buffer [ self.face_range [ 0 ]: self.face_range [ 1 ]]
+        starts = self.face_starts [ self.face_range [ 0 ]: self.face_range [ 1 ] + 1 ]
+        return np.split ( self.face_buffer [ starts [ 0 ]: starts [ -1 ]],
+            starts [ 1:-1 ] - starts [ 0 ])
+
+    @property
+    def half_edges ( self ):
+        """ the HalfEdgeIndex for the (triangle) faces, built on first use """
+        if self.edge_index is None:
+            self.edge_index = HalfEdgeIndex ( self.faces )
+        return self.edge_index
+# end class ScadObject
 
 
 def new_scad_model ( src_spec ):
-    """ new_scad_model ( solid, srcPath, srcFile )
+    """ new_scad_model ( src_spec )
 
-    Create and initialize a dictionary to hold object data for a 3D model
+    Create and initialize a structure to hold object data for a 3D model
 
-    @param srcPath - path to folder containing stl file
-    @param srcFile - name of stl file, without path
-    @returns initialized stl model structure (dictionary)
+    @param src_spec - full file path specification for the stl file
+    @returns initialized ScadModel
     """
-    stl_path, stl_file = os.path.split ( src_spec )
-    return {
-        'stlPath': stl_path,
-        'stlFile': stl_file,
-        'objects': []
-    }
+    return ScadModel ( *os.path.split ( src_spec ))
 # end new_scad_model (…)
 
 
+def conversion_cache_key ( file_spec, data = None, content_hash = None ):
+    """ conversion_cache_key ( file_spec, data, content_hash )
+
+    Generate the key for the cached conversion of an stl file.
+
+    The key is a hash of the stl file content, plus the options that change the
+    cached (unique points, optionally split) objects.  Options that only change
+    the .scad text (--indent, --scad-version) are applied when the objects are
+    written, so do not need to be part of the key.
+
+    @inputs global CMD_LINE_ARGS - parsed command line arguments
+
+    @param file_spec - full file path specification for the stl file
+    @param data - the stl file content, when it has already been read
+    @param content_hash - hashlib object updated with the stl file content, when
+      it has already been hashed; it is copied, not changed
+    @returns hex digest string
+    """
+    if content_hash is not None:
+        hasher = content_hash.copy ()
+    else:
+        hasher = file_content_hash ( file_spec, data )
+    hasher.update ( repr ([ STL2SCAD_VERSION, CMD_LINE_ARGS.split, CMD_LINE_ARGS.instances,
+        CMD_LINE_ARGS.voids, CMD_LINE_ARGS.merge_faces, CMD_LINE_ARGS.weld,
+        CMD_LINE_ARGS.decimate_ratio, CMD_LINE_ARGS.decimate_faces, CMD_LINE_ARGS.keep_full,
+        CMD_LINE_ARGS.legacy_order, CMD_LINE_ARGS.keep_text ]).encode ( 'ascii' ))
+    return hasher.hexdigest ()
+# end conversion_cache_key (…)
+
+
+def file_content_hash ( file_spec, data = None ):
+    """ file_content_hash ( file_spec, data )
+
+    Hash the content of a file, a block at a time
+
+    @param file_spec - full file path specification for the file
+    @param data - the file content, when it has already been read
+    @returns hashlib sha256 object, updated with the file content
+    """
+    hasher = hashlib.sha256 ()
+    if data is not None:
+        hasher.update ( data )
+    else:
+        with open ( file_spec, 'rb' ) as f_stl:
+            for block in iter ( lambda: f_stl.read ( 1 << 20 ), b'' ):
+                hasher.update ( block )
+    return hasher
+# end file_content_hash (…)
+
+
+def load_cached_model ( mdl, cache_key ):
+    """ load_cached_model ( mdl, cache_key )
+
+    Populate the model objects from the conversion cache, if they are there
+
+    @inputs global CMD_LINE_ARGS - parsed command line arguments
+
+    @param mdl - the 3d scad model to update
+    @param cache_key - key for the stl file and options being converted
+    @returns boolean true if the objects were found in the cache
+    @outputs updated mdl
+    """
+    cache_spec = os.path.join ( CMD_LINE_ARGS.cache, cache_key + '.npz' )
+    try:
+        with np.load ( cache_spec ) as cached:
+            # pylint infers NpzFile items as a function, not an ndarray
+            # pylint: disable=no-member,unsubscriptable-object
+            mdl.solid = str ( cached [ 'solid' ])
+            buffers = [( cached [ 'points%d' % idx ], cached [ 'faces%d' % idx ])
+                for idx in range ( int ( cached [ 'count' ]))]
+            face_starts = [ cached [ 'faceStarts%d' % idx ]
+                if 'faceStarts%d' % idx in cached.files else None
+                for idx in range ( int ( cached [ 'count' ]))]
+            objects = []
+            copies = cached [ 'copies' ]
+            for buf, pt_start, pt_stop, fc_start, fc_stop, copy_count in (
+                    cached [ 'ranges' ].tolist ()):
+                obj = ScadObject ( *buffers [ buf ], ( pt_start, pt_stop ), ( fc_start, fc_stop ),
+                    face_starts [ buf ])
+                if copy_count:
+                    obj.copies, copies = copies [ :copy_count ], copies [ copy_count: ]
+                objects.append ( obj )
+            # (--keep-full) previews follow the model objects
+            containers = cached [ 'containers' ].tolist ()
+            previews = cached [ 'previews' ].tolist ()
+            mdl.objects = objects [ :len ( containers )]
+            for obj, container, preview in zip ( mdl.objects, containers, previews ):
+                if container >= 0:
+                    obj.container = objects [ container ]
+                if preview >= 0:
+                    obj.preview = objects [ preview ]
+    except ( OSError, ValueError, KeyError, zipfile.BadZipFile ): # not cached, or damaged
+        return False
+    os.utime ( cache_spec ) # most recently used
+    if CMD_LINE_ARGS.verbose:
+        print ( 'objects loaded from cache: {0}'.format ( cache_spec ))
+    return True
+# end load_cached_model (…)
+
+
+def save_cached_model ( mdl, cache_key ):
+    """ save_cached_model ( mdl, cache_key )
+
+    Save the model objects to the conversion cache, then remove the least
+    recently used entries, until the cache fits the size limit.
+
+    @inputs global CMD_LINE_ARGS - parsed command line arguments
+
+    @param mdl - the 3d scad model to save
+    @param cache_key - key for the stl file and options being converted
+    @outputs cache entry file
+    """
+    os.makedirs ( CMD_LINE_ARGS.cache, exist_ok = True )
+    cache_spec = os.path.join ( CMD_LINE_ARGS.cache, cache_key + '.npz' )
+    # each shared buffer is saved once, with the buffer ranges for every object
+    buffer_seq = {}
+    ranges = []
+    arrays = { 'solid': np.array ( mdl.solid )}
+    # (--keep-full) previews are saved after all of the model objects
+    objects = mdl.objects + [ obj.preview for obj in mdl.objects if obj.preview is not None ]
+    object_seq = { id ( obj ): idx for idx, obj in enumerate ( objects )}
+    for obj in objects:
+        buf = buffer_seq.setdefault ( id ( obj.point_buffer ), len ( buffer_seq ))
+        arrays [ 'points%d' % buf ] = obj.point_buffer
+        arrays [ 'faces%d' % buf ] = obj.face_buffer
+        if obj.face_starts is not None:
+            arrays [ 'faceStarts%d' % buf ] = obj.face_starts
+        ranges.append (( buf, ) + tuple ( obj.point_range ) + tuple ( obj.face_range ) +
+            ( 0 if obj.copies is None else len ( obj.copies ), ))
+    arrays [ 'count' ] = len ( buffer_seq )
+    arrays [ 'ranges' ] = np.array ( ranges, dtype = np.int64 ).reshape (( -1, 6 ))
+    arrays [ 'copies' ] = np.concatenate ([ np.empty (( 0, 3 ))] +
+        [ obj.copies for obj in mdl.objects if obj.copies is not None ])
+    arrays [ 'containers' ] = np.array ([ -1 if obj.container is None
+        else object_seq [ id ( obj.container )] for obj in mdl.objects ], dtype = np.int64 )
+    arrays [ 'previews' ] = np.array ([ -1 if obj.preview is None
+        else object_seq [ id ( obj.preview )] for obj in mdl.objects ], dtype = np.int64 )
+    # write to a temporary file first, so other processes never see a partial entry
+    work_spec = '{0}.{1}.tmp'.format ( cache_spec, os.getpid ())
+    with open ( work_spec, 'wb' ) as f_cache:
+        np.savez ( f_cache, **arrays )
+    os.replace ( work_spec, cache_spec )
+
+    entries = []
+    for entry in os.scandir ( CMD_LINE_ARGS.cache ):
+        if entry.name.endswith ( '.npz' ):
+            entries.append (( entry.stat ().st_mtime, entry.stat ().st_size, entry.path ))
+    cache_size = sum ( entry [ 1 ] for entry in entries )
+    for _mtime, entry_size, entry_spec in sorted ( entries ):
+        if cache_size <= CMD_LINE_ARGS.cache_size * 1024 * 1024:
+            break
+        try:
+            os.remove ( entry_spec )
+        except OSError: # already removed by another process
+            pass
+        cache_size -= entry_size
+# end save_cached_model (…)
+
+
 def check_surface_integrity ( mdl ):
     """ check_surface_integrity( mdl )
 
     Do checks to validate the integrity of the model surfaces.  Check for
     leaks, and more problems
 
-    TODO summarize checks based on documentation for the individual function calls
+    - every vertex point is used by at least 3 faces
+    - every face uses 3 different vertex points
+    - no (directed) edge is used more than once
+    - every (directed) edge has a matching reverse direction edge
+    - no faces intersect each other (unless --skip-intersections)
 
     IDEA is it practical to run (some of) these checks against the raw mesh data
     loaded by numpy-stl ??
     - not really.  Needs to start with the de-dupped point list for the checks
 
-    NOTE This code is **VERY** slow.  Both check functions.
+    Objects with merged (polygon) faces are skipped: the checks need the
+    triangle faces, and the half edge index built from them.
+
+    @inputs global CMD_LINE_ARGS - parsed command line arguments
 
     @param mdl - the 3d scad model to check
+    @returns list of problem reports (dictionaries of index arrays) by object
     """
-    for obj in mdl [ 'objects' ]:
-        # IDEA check for self intersecting surfaces: maybe a case where an edge
-        # is referenced twice? (twice in each direction)
-
-        # check_vertexes_of_faces ( obj [ 'faces'], len ( obj [ 'points' ]))
-        # check_vertexes_of_faces ( obj [ 'faces'], obj [ 'points' ])
-        if not check_vertexes_of_faces ( obj ):
+    reports = []
+    for obj in mdl.objects:
+        if obj.face_starts is not None:
+            if CMD_LINE_ARGS.verbose:
+                print ( 'skipping integrity checks for merged polygon faces' )
+            reports.append ({})
+            continue
+        report = check_vertexes_of_faces ( obj )
+        if any ( len ( idx ) > 0 for idx in report.values ()):
             print ( 'problem detected with face vertex references' )
 
-        # Edge endpoint (indexes) by face for whole object
-        edge_by_face = np.array ([[
-            [ fc [0], fc [1]],
-            [ fc [1], fc [2]],
-            [ fc [2], fc [0]]] for fc in obj [ 'faces' ]])
-        # The (directed) edges that make up the surface mesh
-        if not check_edge_reuse ( np.reshape ( edge_by_face, (-1, 2 )) ):
+        edge_report = check_edge_reuse ( obj.half_edges )
+        if any ( len ( idx ) > 0 for idx in edge_report.values ()):
             print ( 'problem detected with face edge usage' )
+        report.update ( edge_report )
+        if not CMD_LINE_ARGS.skip_intersections:
+            report.update ( check_self_intersection ( obj ))
+        reports.append ( report )
+    return reports
 # end check_surface_integrity (…)
 
 
-@elapsed_time ( 'check_vertexes_of_faces' ) # DEBUG
+def index_summary ( indexes, limit = 10 ):
+    """ index_summary ( indexes, limit )
+
+    format a (possibly very long) list of indexes for a problem report
+
+    @param indexes - sequence of integer indexes
+    @param limit - maximum number of indexes to show
+    @returns string with the leading indexes, and a count of the rest
+    """
+    shown = ', '.join ([ str ( idx ) for idx in indexes [ :limit ]])
+    if len ( indexes ) > limit:
+        return '{0} … (+{1} more)'.format ( shown, len ( indexes ) - limit )
+    return shown
+# end index_summary (…)
+
+
 def check_vertexes_of_faces ( obj ):
     """ check_vertexes_of_faces ( obj )
 
-    See if every vertex point in the object is part of at least 3 different faces
+    See if every vertex point in the object is part of at least 3 different faces,
+    and every face has 3 different vertex points
+
+    @inputs global CMD_LINE_ARGS - parsed command line arguments
 
-    @param obj - dictionary object with the points and faces for a 3d object
-    @returns boolean false if problem seen with the vertex references
+    @param obj - ScadObject with the points and faces for a 3d object
+    @returns dictionary of numpy arrays with the indexes of problem vertexes and faces
     """
-    all_good = True
+    faces = obj.faces
+    vertex_references = np.bincount ( np.reshape ( faces, -1 ),
+        minlength = len ( obj.points ))
+    problems = {
+        # vertexes that are not used for any face
+        'orphanVertexes': np.flatnonzero ( vertex_references == 0 ),
+        # Need at least 3 references to every vertex of a triangle mesh to have
+        # a closed surface
+        'sparseVertexes': np.flatnonzero (
+            ( vertex_references > 0 ) & ( vertex_references < 3 )),
+        # each face must have 3 different vertex indexes
+        'degenerateFaces': np.flatnonzero (( faces [ :, 0 ] == faces [ :, 1 ]) |
+            ( faces [ :, 1 ] == faces [ :, 2 ]) | ( faces [ :, 2 ] == faces [ :, 0 ]))
+    }
     reported_some = False
 
-    vertex_indexes = np.reshape ( obj [ 'faces' ], -1 ).tolist() # no count in np.array
-    vertex_references = [ vertex_indexes.count ( idx )
-        for idx in np.arange ( 0, len ( obj [ 'points' ]))]
-
-    if CMD_LINE_ARGS.verbose:
+    if CMD_LINE_ARGS.verbose and len ( vertex_references ) > 0:
         print ( 'Each face vertex is used from {0} to {1} times'.format (
-            min ( vertex_references ), max ( vertex_references )))
+            vertex_references.min (), vertex_references.max ()))
         reported_some = True
 
-    if min ( vertex_references ) < 3:
-        all_good = False
-        # Need at least 3 references to every vertex of a triangle mesh to have
-        # a closed surface
-        print ( 'Not enough face vertex references to close the surface' )
+    if len ( problems [ 'sparseVertexes' ]) > 0:
+        print ( 'Not enough face vertex references to close the surface at '
+            '{0} vertexes: {1}'.format ( len ( problems [ 'sparseVertexes' ]),
+            index_summary ( problems [ 'sparseVertexes' ])))
+        reported_some = True
+    if len ( problems [ 'orphanVertexes' ]) > 0:
+        print ( '{0} vertexes are not used for any face: {1}'.format (
+            len ( problems [ 'orphanVertexes' ]),
+            index_summary ( problems [ 'orphanVertexes' ])))
+        reported_some = True
+    if len ( problems [ 'degenerateFaces' ]) > 0:
+        print ( '{0} faces use the same vertex more than once: {1}'.format (
+            len ( problems [ 'degenerateFaces' ]),
+            index_summary ( problems [ 'degenerateFaces' ])))
         reported_some = True
-        if min ( vertex_references ) < 1: # orphan vertexes
-            print ( 'Some vertexes are not used for any face' )
-
-    # IDEA TODO make sure no vertex (index) is referenced more than once per face
-    #   - each face must have 3 different vertex indexes
 
     if reported_some:
         print ( '' )
-    return all_good
+    return problems
 # end check_vertexes_of_faces (…)
 
 
-@elapsed_time ( 'check_edge_reuse' ) # DEBUG
-def check_edge_reuse ( edges ):
-    """ check_edge_reuse ( edges )
+def check_self_intersection ( obj ):
+    """ check_self_intersection ( obj )
+
+    Find the faces of the object that intersect other faces of the object.
+
+    The triangles with overlapping bounding boxes are found by traversing a
+    BoxTree against itself, then tested together a batch at a time
+    (triangles_intersect).  Triangles that only touch are not intersecting, so
+    neighbours on the surface (that share a vertex point, or an edge) are only
+    found when they fold over, or through, each other.
+
+    @param obj - ScadObject with the points and (triangle) faces for a 3d object
+    @returns dictionary of numpy arrays with the indexes of the intersecting faces
+    """
+    faces = obj.faces
+    # points as text (--keep-text) are converted to numbers
+    points = obj.points.astype ( np.float64 )
+    corners = points [ faces ]
+    face_tree = BoxTree ( corners.min ( axis = 1 ), corners.max ( axis = 1 ))
+    del corners
+    tolerance = INTERSECTION_TOLERANCE * max ( 1.0, float ( np.abs ( points ).max ( initial = 0 )))
+    pairs_a, pairs_b = [], []
+    # ( 3, n ) rows of the x, y, z coordinates, and of the face corner points
+    coordinates = np.ascontiguousarray ( points.T )
+    face_points = np.ascontiguousarray ( faces.T )
+    for face_a, face_b in face_tree.overlapping_pairs ( INTERSECTION_BATCH ):
+        points_a, points_b = face_points [ :, face_a ], face_points [ :, face_b ]
+        # the corner of (the first) point shared by the faces, in each face
+        shared_a = np.full ( len ( face_a ), -1 )
+        shared_b = np.full ( len ( face_a ), -1 )
+        for corner_a in ( 2, 1, 0 ):
+            for corner_b in ( 2, 1, 0 ):
+                same = points_a [ corner_a ] == points_b [ corner_b ]
+                shared_a [ same ] = corner_a
+                shared_b [ same ] = corner_b
+        neighbour = shared_a >= 0
+        crossing = np.empty ( len ( face_a ), dtype = bool )
+        crossing [ ~neighbour ] = triangles_intersect ( coordinates,
+            points_a [ :, ~neighbour ], points_b [ :, ~neighbour ], tolerance )
+        crossing [ neighbour ] = neighbours_intersect ( coordinates,
+            rotate_points ( points_a [ :, neighbour ], shared_a [ neighbour ]),
+            rotate_points ( points_b [ :, neighbour ], shared_b [ neighbour ]), tolerance )
+        pairs_a.append ( face_a [ crossing ])
+        pairs_b.append ( face_b [ crossing ])
+    problems = {
+        'intersectingFaces': np.unique ( np.concatenate ( pairs_a + pairs_b +
+            [ np.empty ( 0, dtype = np.int64 )]))
+    }
+
+    if len ( problems [ 'intersectingFaces' ]) > 0:
+        print ( '{0} faces intersect other faces: {1}'.format (
+            len ( problems [ 'intersectingFaces' ]),
+            index_summary ( problems [ 'intersectingFaces' ])))
+        print ( 'problem detected with self intersecting surface' )
+    return problems
+# end check_self_intersection (…)
+
+
+def triangles_intersect ( coordinates, face_a, face_b, tolerance ):
+    """ triangles_intersect ( coordinates, face_a, face_b, tolerance )
+
+    Test pairs of triangles for intersection with the separating axis theorem.
+
+    Two triangles are separate when their projections onto some axis do not
+    overlap.  The candidate axes are the 2 face normals, and the 9 cross
+    products of an edge from each triangle.  Those are all perpendicular to
+    the plane of coplanar triangles, which only touch along them, so coplanar
+    pairs are instead tested on the 6 edge normals in the plane of each
+    triangle.  The axes are tested one at a time, and each only for the pairs
+    not already found to be separate.
+
+    @param coordinates - numpy float64 array of the point x, y, z rows, shape ( 3, n )
+    @param face_a - numpy array of the point index rows for the triangle corners,
+      shape ( 3, m )
+    @param face_b - numpy array of the point index rows for the other triangle of
+      each pair
+    @param tolerance - overlap distance still treated as touching
+    @returns numpy boolean array, true where the triangles intersect
+    """
+    origin = coordinates [ :, face_a [ 0 ]] # near the origin, to keep the precision
+    tri_a = [ coordinates [ :, face_a [ idx ]] - origin for idx in range ( 3 )]
+    tri_b = [ coordinates [ :, face_b [ idx ]] - origin for idx in range ( 3 )]
+    edges_a = [ tri_a [( idx + 1 ) % 3 ] - tri_a [ idx ] for idx in range ( 3 )]
+    edges_b = [ tri_b [( idx + 1 ) % 3 ] - tri_b [ idx ] for idx in range ( 3 )]
+    normal_a = vector_cross ( edges_a [ 0 ], edges_a [ 1 ])
+    normal_b = vector_cross ( edges_b [ 0 ], edges_b [ 1 ])
+    # tri_a projects to 0 on its own normal
+    margin = tolerance * np.sqrt ( vector_dot ( normal_a, normal_a ))
+    coplanar = np.all ([ np.abs ( vector_dot ( corner, normal_a )) <= margin
+        for corner in tri_b ], axis = 0 )
+    # the face normals separate most pairs, so are tested first
+    axis_vectors = [( normal_a, None ), ( normal_b, None )]
+    axis_vectors.extend (( edges_a [ i ], edges_b [ j ]) for i in range ( 3 )
+        for j in range ( 3 ))
+    plane_vectors = [( normal, edge ) for normal, edges in (( normal_a, edges_a ),
+        ( normal_b, edges_b )) for edge in edges ]
+
+    intersecting = np.zeros ( len ( origin [ 0 ]), dtype = bool )
+    for remaining, vectors in (( np.flatnonzero ( ~coplanar ), axis_vectors ),
+            ( np.flatnonzero ( coplanar ), plane_vectors )):
+        for first, second in vectors:
+            axis = first [ :, remaining ]
+            if second is not None:
+                axis = vector_cross ( axis, second [ :, remaining ])
+            extent_a = projection_extent ([ corner [ :, remaining ] for corner in tri_a ], axis )
+            extent_b = projection_extent ([ corner [ :, remaining ] for corner in tri_b ], axis )
+            margin = tolerance * np.sqrt ( vector_dot ( axis, axis ))
+            separated = (( extent_a [ 1 ] <= extent_b [ 0 ] + margin ) |
+                ( extent_b [ 1 ] <= extent_a [ 0 ] + margin )) & ( margin > 0 )
+            remaining = remaining [ ~separated ]
+        intersecting [ remaining ] = True
+    return intersecting
+# end triangles_intersect (…)
+
+
+def neighbours_intersect ( coordinates, face_a, face_b, tolerance ):
+    """ neighbours_intersect ( coordinates, face_a, face_b, tolerance )
+
+    Test pairs of triangles that share their first point for intersection.
+
+    Near the shared point, each triangle covers the angle between its 2 edges
+    from that point.  Triangles that are not coplanar can only meet along the
+    line where their planes cross, which goes through the shared point, so they
+    intersect (instead of only touching) when the same direction of the line is
+    strictly inside both angles.  The line is inside the angle of a triangle
+    when its other 2 points are on opposite sides of the plane of the other
+    triangle, and which side the first of them is on gives the direction.
+    Coplanar triangles intersect when their angles overlap: an edge, or the
+    middle, of one angle is strictly inside the other.
+
+    The points, faces and vectors are ( 3, m ) arrays of rows, which numpy
+    works with much faster than ( m, 3 ) rows of vectors.
+
+    @param coordinates - numpy float64 array of the point x, y, z rows, shape ( 3, n )
+    @param face_a - numpy array of the point index rows for the triangle corners,
+      shape ( 3, m )
+    @param face_b - numpy array of the point index rows for the other triangle of
+      each pair
+    @param tolerance - distance from an edge still treated as touching
+    @returns numpy boolean array, true where the triangles intersect
+    """
+    corner = coordinates [ :, face_a [ 0 ]]
+    edges_a = [ coordinates [ :, face_a [ idx ]] - corner for idx in ( 1, 2 )]
+    edges_b = [ coordinates [ :, face_b [ idx ]] - corner for idx in ( 1, 2 )]
+    normal_a = vector_cross ( edges_a [ 0 ], edges_a [ 1 ])
+    normal_b = vector_cross ( edges_b [ 0 ], edges_b [ 1 ])
+    # side of the plane of the other triangle, scaled by its normal length
+    sides_a = [ vector_dot ( edge, normal_b ) for edge in edges_a ]
+    sides_b = [ vector_dot ( edge, normal_a ) for edge in edges_b ]
+    margin_a = tolerance * np.sqrt ( vector_dot ( normal_b, normal_b ))
+    margin_b = tolerance * np.sqrt ( vector_dot ( normal_a, normal_a ))
+    coplanar = ( np.abs ( sides_b [ 0 ]) <= margin_b ) & ( np.abs ( sides_b [ 1 ]) <= margin_b )
+
+    forward_a = ( sides_a [ 0 ] > margin_a ) & ( sides_a [ 1 ] < -margin_a )
+    backward_a = ( sides_a [ 0 ] < -margin_a ) & ( sides_a [ 1 ] > margin_a )
+    forward_b = ( sides_b [ 0 ] < -margin_b ) & ( sides_b [ 1 ] > margin_b )
+    backward_b = ( sides_b [ 0 ] > margin_b ) & ( sides_b [ 1 ] < -margin_b )
+    intersecting = ( forward_a & forward_b ) | ( backward_a & backward_b )
+
+    overlap = np.zeros ( np.count_nonzero ( coplanar ), dtype = bool )
+    for edges, normal, other in (( edges_a, normal_a, edges_b ), ( edges_b, normal_b, edges_a )):
+        first, second = [ edge [ :, coplanar ] for edge in edges ]
+        rays = [ edge [ :, coplanar ] for edge in other ]
+        rays.append ( rays [ 0 ] / np.sqrt ( vector_dot ( rays [ 0 ], rays [ 0 ])) +
+            rays [ 1 ] / np.sqrt ( vector_dot ( rays [ 1 ], rays [ 1 ]))) # the middle
+        for ray in rays:
+            overlap |= ray_inside_angle ( first, second, normal [ :, coplanar ], ray, tolerance )
+    intersecting [ coplanar ] = overlap
+    return intersecting
+# end neighbours_intersect (…)
+
+
+def ray_inside_angle ( first, second, normal, ray, tolerance ):
+    """ ray_inside_angle ( first, second, normal, ray, tolerance )
+
+    Test if directions from the corner of triangles are strictly inside the
+    angle between the 2 triangle edges from that corner
+
+    @param first - numpy array of the first edge vector from the corner, shape ( 3, m )
+    @param second - numpy array of the second edge vector from the corner
+    @param normal - numpy array of the cross product of the edges
+    @param ray - numpy array of the direction to test for each
+    @param tolerance - distance of the edge ends from the ray line still treated
+      as on the ray
+    @returns numpy boolean array, true where the ray is inside the angle
+    """
+    margin = tolerance * np.sqrt ( vector_dot ( normal, normal ) * vector_dot ( ray, ray ))
+    return (( vector_dot ( vector_cross ( first, ray ), normal ) > margin ) &
+        ( vector_dot ( vector_cross ( ray, second ), normal ) > margin ))
+# end ray_inside_angle (…)
+
+
+def vector_cross ( vec_a, vec_b ):
+    """ vector_cross ( vec_a, vec_b )
+
+    Cross products of vectors stored as x, y, z rows
+
+    @param vec_a - numpy array of vectors, shape ( 3, m )
+    @param vec_b - numpy array of vectors, shape ( 3, m )
+    @returns numpy array of the cross product vectors, shape ( 3, m )
+    """
+    product = np.empty ( np.broadcast_shapes ( vec_a.shape, vec_b.shape ))
+    product [ 0 ] = vec_a [ 1 ] * vec_b [ 2 ] - vec_a [ 2 ] * vec_b [ 1 ]
+    product [ 1 ] = vec_a [ 2 ] * vec_b [ 0 ] - vec_a [ 0 ] * vec_b [ 2 ]
+    product [ 2 ] = vec_a [ 0 ] * vec_b [ 1 ] - vec_a [ 1 ] * vec_b [ 0 ]
+    return product
+# end vector_cross (…)
+
+
+def vector_dot ( vec_a, vec_b ):
+    """ vector_dot ( vec_a, vec_b )
 
-    Verify that every (directed) edge has a matching reverse direction edge
+    Dot products of vectors stored as x, y, z rows
 
-    @param edges - numpy array of surface edges
-    @returns boolean false if problem seen with the edges that are in the surface
+    @param vec_a - numpy array of vectors, shape ( 3, m )
+    @param vec_b - numpy array of vectors, shape ( 3, m )
+    @returns numpy array of the dot products, shape ( m, )
     """
-    # print ( 'check_edge_reuse' ) # TRACE
-    all_good = True
+    return vec_a [ 0 ] * vec_b [ 0 ] + vec_a [ 1 ] * vec_b [ 1 ] + vec_a [ 2 ] * vec_b [ 2 ]
+# end vector_dot (…)
 
-    # print ( 'face edges shape: {0}'.format ( edges.shape )) # DEBUG
-    # print ( 'face edges shape: {0}; content:\n{1}'.format (
-    #     edges.shape, edges )) # DEBUG
-    # print ( 'face edges shape: {0}; content:\n{1}'.format (
-    #     edges.shape, edges.tolist ())) # DEBUG
 
-    # print ( edges == ( 3, 0 ))
-    # print (( edges == ( 3, 0 )).all (axis = 1 ))
-    # print ( np.where(( edges == ( 3, 0 )).all ( axis = 1 )))
-    # print ( np.where(( edges == ( 0, 3 )).all ( axis = 1 )))
-    # print ([ np.where(( edges == ( 3, 0 )).all ( axis = 1 ))[ 0 ][ 0 ]])
-    # print ([ np.where(( edges == ( 0, 3 )).all ( axis = 1 ))[ 0 ][ 0 ]])
-    # print ( np.where(( edges == ( 0, 3 )).all ( axis = 1 ))[ 0 ].size )
+def rotate_points ( faces, first ):
+    """ rotate_points ( faces, first )
 
-    # the number of instances (in faces) of each edge
-    edge_counts = [ np.where(( edges == ( edg [ 0 ], edg [ 1 ])).all (
-        axis = 1 ))[ 0 ].size for edg in edges ]
-    # print('Edge usage counts: {0}'.format ( edge_counts )) # DEBUG
-    # print('{0} Edges used exactly once'.format(edge_counts.count(1))) # DEBUG == len(edges)
-    if max ( edge_counts ) > 1:
-        all_good = False
+    Rotate the point order of triangle faces, keeping the winding direction
+
+    @param faces - numpy array of the point index rows for the triangle corners, shape ( 3, m )
+    @param first - numpy array of the face corner to move to the start, for each
+    @returns numpy array of the rotated faces, shape ( 3, m )
+    """
+    order = ( first + np.arange ( 3 ) [ :, np.newaxis ]) % 3
+    return faces [ order, np.arange ( len ( first ))]
+# end rotate_points (…)
+
+
+def projection_extent ( corners, axis ):
+    """ projection_extent ( corners, axis )
+
+    Project the corners of triangles onto an axis for each
+
+    @param corners - list of numpy arrays of the x, y, z rows of each triangle
+      corner, shape ( 3, m )
+    @param axis - numpy array of the (not normalized) axis for each triangle, shape ( 3, m )
+    @returns tuple of numpy arrays: the minimum, and maximum, projected corner
+    """
+    projected = [ vector_dot ( corner, axis ) for corner in corners ]
+    return ( np.minimum ( np.minimum ( projected [ 0 ], projected [ 1 ]), projected [ 2 ]),
+        np.maximum ( np.maximum ( projected [ 0 ], projected [ 1 ]), projected [ 2 ]))
+# end projection_extent (…)
+
+
+def check_edge_reuse ( half_edges ):
+    """ check_edge_reuse ( half_edges )
+
+    Verify that every (directed) edge is used once, and has a matching reverse
+    direction edge
+
+    The number of instances of each edge, and of the reverse direction edge,
+    are already counted in the half edge index.  Edge indexes are in face
+    order, 3 per face: the edge index divided by 3 is the face index.
+
+    @param half_edges - HalfEdgeIndex for the faces of a polyhedron
+    @returns dictionary of numpy arrays with the indexes of problem edges
+    """
+    problems = {
         # These are directed edges: no edge should be reused
-        print ( 'Duplicate edges encountered' )
+        'duplicateEdges': np.flatnonzero ( half_edges.edge_count > 1 ),
+        'unmatchedEdges': np.flatnonzero ( half_edges.match_count < 1 )
+    }
 
-    # the number of instances (in faces) of edges going the reverse direction
-    counter_edge_counts = [ np.where(( edges == ( edg [ 1 ], edg [ 0 ])).all (
-        axis = 1 ))[ 0 ].size for edg in edges ]
-    # print ( 'Reverse direction edge usage counts: {0}'.format ( counter_edge_counts )) # DEBUG
-    if min ( counter_edge_counts ) < 1:
-        all_good = False
-        print ( 'Missing {0} reverse direction edges'.format ( counter_edge_counts.count ( 0 )))
+    if len ( problems [ 'duplicateEdges' ]) > 0:
+        print ( 'Duplicate edges encountered: {0} edges, in faces {1}'.format (
+            len ( problems [ 'duplicateEdges' ]),
+            index_summary ( np.unique ( problems [ 'duplicateEdges' ] // 3 ))))
+    if len ( problems [ 'unmatchedEdges' ]) > 0:
+        print ( 'Missing {0} reverse direction edges, in faces {1}'.format (
+            len ( problems [ 'unmatchedEdges' ]),
+            index_summary ( np.unique ( problems [ 'unmatchedEdges' ] // 3 ))))
 
     # IDEA TODO check that reverse edge is not in the same face
-    return all_good
+    return problems
 # end check_edge_reuse (…)
 
 
@@ -620,32 +3238,458 @@ def main ():
     '''the main function to start processing'''
     get_cmd_line_args()
     initialize ()
-    if CMD_LINE_ARGS.verbose:
-        print ( '\nstl2scad converter version %s' % STL2SCAD_VERSION )
-    for one_file in CMD_LINE_ARGS.file:
-        process_stl_file ( one_file )
+    scad_output = None
+    console = contextlib.nullcontext ()
+    if CMD_LINE_ARGS.stdout: # keep stdout for the .scad source only
+        scad_output = sys.stdout
+        console = contextlib.redirect_stdout ( sys.stderr )
+    with console:
+        if CMD_LINE_ARGS.verbose:
+            print ( '\nstl2scad converter version %s' % STL2SCAD_VERSION )
+        files = CMD_LINE_ARGS.file or [ sys.stdin.buffer ] # without files, run as a filter
+        profile_reports = []
+        if CMD_LINE_ARGS.watch:
+            results = watch_stl_folder ( CMD_LINE_ARGS.watch, profile_reports )
+        elif CMD_LINE_ARGS.jobs != 1 and len ( files ) > 1 and scad_output is None:
+            results = process_stl_files_parallel ( files, profile_reports )
+        elif CMD_LINE_ARGS.pipeline and len ( files ) > 1 and scad_output is None:
+            results = process_stl_files_pipelined ( files, profile_reports )
+        else:
+            results = process_stl_files ( files, profile_reports, scad_output )
+
+        if len ( results ) > 1 and not CMD_LINE_ARGS.watch:
+            failed = [ one_file.name for one_file, good in zip ( files, results )
+                if not good ]
+            print ( '\n{0} of {1} stl files converted'.format (
+                len ( results ) - len ( failed ), len ( results )))
+            for one_name in failed:
+                print ( '  failed: {0}'.format ( one_name ))
+        if CMD_LINE_ARGS.profile:
+            save_run_profile ( profile_reports )
 # end main (…)
 
 
-def get_cmd_line_args ():
-    """ get_cmd_line_args ()
+def watch_stl_folder ( folder, profile_reports ):
+    """ watch_stl_folder ( folder, profile_reports )
+
+    Keep converting the stl files in a folder (and below) as they are added or
+    changed, until interrupted (Ctrl-C).
+
+    The folder is polled every --watch-interval seconds.  A new or changed (size
+    or modification time) file is converted once it has stayed the same for a
+    full interval, so files that are still being written are left alone.  Files
+    that were only touched, with the same content hash as when last converted,
+    are skipped.  Files already in the folder at the start are only converted
+    when they change.  Only the folder is rescanned, and the .stl files hashed,
+    so each conversion avoids the interpreter and library startup time.  The
+    content hash is also the start of the --cache key, so the file is not
+    hashed twice.  Sequence (module) files left over from a previous conversion
+    of the file, into more objects, are removed when it is saved again.
+
+    @inputs global CMD_LINE_ARGS - parsed command line arguments
+
+    @param folder - path to the folder to watch
+    @param profile_reports - list to add the per file profile reports to
+    @returns list of booleans, false for conversions that failed
+    """
+    # file spec: ( size, mtime, content hash when last converted )
+    known = { file_spec: state + ( None, )
+        for file_spec, state in stl_file_states ( folder ).items ()}
+    pending = {} # changed file spec: ( size, mtime ) when last seen
+    results = []
+    print ( 'watching {0} stl files in {1}; Ctrl-C to stop'.format ( len ( known ), folder ))
+    try:
+        while True:
+            time.sleep ( CMD_LINE_ARGS.watch_interval )
+            for file_spec, state in stl_file_states ( folder ).items ():
+                if file_spec in known and known [ file_spec ][ :2 ] == state:
+                    pending.pop ( file_spec, None )
+                    continue
+                if pending.get ( file_spec ) != state: # still changing
+                    pending [ file_spec ] = state
+                    continue
+                del pending [ file_spec ]
+                content_hash = file_content_hash ( file_spec )
+                content_digest = content_hash.hexdigest ()
+                previous = known.get ( file_spec )
+                known [ file_spec ] = state + ( content_digest, )
+                if previous is not None and previous [ 2 ] == content_digest:
+                    continue # touched, but not changed
+                start_time = time.perf_counter ()
+                try: # the content hash is reused for the --cache key
+                    with open ( file_spec, 'rb' ) as f_handle:
+                        good = process_stl_file ( f_handle, content_hash = content_hash )
+                except Exception: # pylint: disable=broad-except
+                    traceback.print_exc ()
+                    good = False
+                results.append ( good )
+                if PROFILE.report is not None:
+                    profile_reports.append ( PROFILE.report )
+                print ( '{0} {1} in {2:.3f} seconds'.format ( file_spec,
+                    'converted' if good else 'failed', time.perf_counter () - start_time ))
+    except KeyboardInterrupt:
+        print ( '\nstopped watching {0}: {1} of {2} conversions good'.format (
+            folder, sum ( results ), len ( results )))
+    return results
+# end watch_stl_folder (…)
+
+
+def stl_file_states ( folder ):
+    """ stl_file_states ( folder )
+
+    Find the stl files in a folder (and below), with their size and modification
+    time
+
+    @param folder - path to the folder to search
+    @returns dictionary of file spec: ( size, modification time ) tuples
+    """
+    states = {}
+    for dir_path, _dir_names, file_names in os.walk ( folder ):
+        for file_name in file_names:
+            if os.path.splitext ( file_name ) [ 1 ].lower () != '.stl':
+                continue
+            file_spec = os.path.join ( dir_path, file_name )
+            try:
+                file_stat = os.stat ( file_spec )
+            except OSError: # removed since the folder was read
+                continue
+            states [ file_spec ] = ( file_stat.st_size, file_stat.st_mtime_ns )
+    return states
+# end stl_file_states (…)
+
+
+def process_stl_files ( files, profile_reports, scad_output = None ):
+    """ process_stl_files ( files, profile_reports, scad_output )
+
+    process stl files one at a time
+
+    @param files - list of (open) handles for the stl files
+    @param profile_reports - list to add the per file profile reports to
+    @param scad_output - text stream to write the .scad source to, instead of
+      to files; None to save .scad files
+    @returns list of booleans, false for files that could not be converted
+    """
+    results = []
+    for one_file in files:
+        results.append ( process_stl_file ( one_file, scad_output ))
+        if PROFILE.report is not None:
+            profile_reports.append ( PROFILE.report )
+    return results
+# end process_stl_files (…)
+
+
+def process_stl_files_parallel ( files, profile_reports ):
+    """ process_stl_files_parallel ( files, profile_reports )
+
+    process multiple stl files, spread across a pool of worker processes
+
+    Console output from each file is collected by the worker, and shown (in
+    command line order) when the file is finished, so output for different
+    files is never mixed together.
+
+    @inputs global CMD_LINE_ARGS - parsed command line arguments
+    @inputs global CFG - processing configuration
+
+    @param files - list of (open) handles for the stl files
+    @param profile_reports - list to add the per file profile reports to
+    @returns list of booleans, false for files that could not be converted
+    """
+    # open file handles can not be sent to other processes: send the names
+    file_names = [ one_file.name for one_file in files ]
+    for one_file in files:
+        one_file.close ()
+    worker_args = argparse.Namespace ( **vars ( CMD_LINE_ARGS.current ()))
+    worker_args.file = []
+
+    results = []
+    with concurrent.futures.ProcessPoolExecutor (
+            max_workers = CMD_LINE_ARGS.jobs or None,
+            initializer = init_worker, initargs = ( worker_args, CFG.current ())) as pool:
+        for good, console_text, report in pool.map ( convert_stl_file, file_names ):
+            print ( console_text, end = '' )
+            results.append ( good )
+            if report is not None:
+                profile_reports.append ( report )
+    return results
+# end process_stl_files_parallel (…)
+
+
+def process_stl_files_pipelined ( files, profile_reports ):
+    """ process_stl_files_pipelined ( files, profile_reports )
+
+    process multiple stl files, with reading, processing, and writing overlapped
+
+    A reader thread reads the content of the following files, while the main
+    thread builds the scad model for the current file, and a writer thread saves
+    the models that are already built.  The queues between the stages hold at
+    most --pipeline-depth files, which limits the memory used for files (and
+    models) that are waiting.
+
+    Like the --jobs workers, an error reading, converting or saving one file is
+    reported, and that file is counted as failed, without stopping the others.
+
+    @inputs global CMD_LINE_ARGS - parsed command line arguments
+
+    @param files - list of (open) handles for the stl files
+    @param profile_reports - list to add the per file profile reports to
+    @returns list of booleans, false for files that could not be converted
+    """
+    file_names = [ one_file.name for one_file in files ]
+    for one_file in files:
+        one_file.close ()
+    read_queue = queue.Queue ( maxsize = CMD_LINE_ARGS.pipeline_depth )
+    write_queue = queue.Queue ( maxsize = CMD_LINE_ARGS.pipeline_depth )
+    results = [ False ] * len ( file_names )
+    reports = [ None ] * len ( file_names )
+
+    def read_files ():
+        for file_spec in file_names:
+            start_time = time.perf_counter ()
+            data = None
+            try: # every file must reach the queue, or the main loop waits forever
+                with open ( file_spec, 'rb' ) as f_stl:
+                    data = f_stl.read ()
+            except OSError as err:
+                print ( '\n|%s| could not be read: %s' % ( file_spec, err ))
+            except Exception: # pylint: disable=broad-except
+                traceback.print_exc ()
+            read_queue.put (( file_spec, data, time.perf_counter () - start_time ))
+    # end read_files (…)
+
+    def write_models ():
+        while True:
+            item = write_queue.get ()
+            if item is None:
+                break
+            file_seq, scad_model, PROFILE.report = item
+            try:
+                results [ file_seq ] = save_scad_model ( scad_model )
+            except Exception: # pylint: disable=broad-except
+                traceback.print_exc ()
+            reports [ file_seq ] = finish_file_profile ( scad_model, results [ file_seq ])
+    # end write_models (…)
+
+    reader = threading.Thread ( target = read_files, daemon = True )
+    writer = threading.Thread ( target = write_models )
+    reader.start ()
+    writer.start ()
+    try:
+        for file_seq in range ( len ( file_names )):
+            file_spec, data, read_seconds = read_queue.get ()
+            scad_model = new_scad_model ( file_spec )
+            start_file_profile ( scad_model )
+            if PROFILE.report is not None:
+                PROFILE.report [ 'stages' ].append ({ 'stage': 'read', 'seconds': read_seconds })
+            try: # a file that fails must not stop the rest of the pipeline
+                good = data is not None and build_scad_model ( scad_model, file_spec, data )
+            except Exception: # pylint: disable=broad-except
+                traceback.print_exc ()
+                good = False
+            del data
+            if good:
+                profile_counts ( scad_model )
+                write_queue.put (( file_seq, scad_model, PROFILE.report ))
+            else:
+                reports [ file_seq ] = finish_file_profile ( scad_model, good )
+    finally:
+        write_queue.put ( None )
+        writer.join ()
+
+    profile_reports.extend ( report for report in reports if report is not None )
+    return results
+# end process_stl_files_pipelined (…)
+
+
+def init_worker ( cmd_line_args, cfg ):
+    """ init_worker ( cmd_line_args, cfg )
+
+    Setup the global state for a worker process, to match the main process
+
+    @param cmd_line_args - parsed command line arguments
+    @param cfg - processing configuration
+    @outputs global CMD_LINE_ARGS, CFG
+    """
+    import_libraries ()
+    CMD_LINE_ARGS.process_value = cmd_line_args
+    CFG.process_value = cfg
+# end init_worker (…)
+
+
+def convert_stl_file ( file_spec ):
+    """ convert_stl_file ( file_spec )
+
+    process a single stl file in a worker process, collecting the console output
+
+    @param file_spec - full file path specification for stl file to convert
+    @returns tuple of boolean success flag, console output text, and profile report
+    """
+    console = io.StringIO ()
+    with contextlib.redirect_stdout ( console ):
+        try:
+            with open ( file_spec, 'rb' ) as f_handle:
+                good = process_stl_file ( f_handle )
+        except Exception: # pylint: disable=broad-except
+            traceback.print_exc ( file = console )
+            good = False
+    return good, console.getvalue (), PROFILE.report
+# end convert_stl_file (…)
+
+
+def convert ( source, scad_text = False, **options ):
+    """ convert ( source, scad_text, **options )
+
+    Convert a single stl file to OpenSCAD polyhedron objects, for use as a
+    library, without any command line processing.
+
+    The options are the command line options, using the argparse destination
+    names (split = True, merge_faces = True, indent = '  ', …), with the same
+    dependencies between them as on the command line (resolve_options).  Each
+    call uses its own settings, so conversions can run at the same time (in
+    different threads) without interfering with each other, or with the
+    command line settings.  No .scad files are written.  With profile = True,
+    the stage timing report is returned as the profile attribute of the model,
+    instead of being saved as json.
+
+    @param source - stl file path, stl file content bytes, or binary file object
+    @param scad_text - true to also generate the OpenSCAD source text
+    @param options - conversion options, with the command line defaults
+    @returns ScadModel, or ( ScadModel, .scad text ) tuple when scad_text is true
+    @raises TypeError for an unknown option
+    @raises ValueError for options that can not be used together, or if the
+      source could not be loaded as an stl file
+    """
+    settings = cmd_line_parser ().parse_args ([])
+    for name, value in options.items ():
+        if not hasattr ( settings, name ) or name == 'file':
+            raise TypeError ( 'convert() got an unexpected option {0!r}'.format ( name ))
+        setattr ( settings, name, value )
+    resolve_options ( settings )
+    return contextvars.copy_context ().run ( convert_in_context, settings, source,
+        scad_text )
+# end convert (…)
+
+
+def convert_in_context ( settings, source, scad_text ):
+    """ convert_in_context ( settings, source, scad_text )
+
+    Do the convert () processing, in a separate context with its own settings
+
+    @param settings - argparse.Namespace with the conversion options
+    @param source - stl file path, stl file content bytes, or binary file object
+    @param scad_text - true to also generate the OpenSCAD source text
+    @returns ScadModel, or ( ScadModel, .scad text ) tuple when scad_text is true
+    @outputs context CMD_LINE_ARGS, CFG
+    """
+    CMD_LINE_ARGS.context_value.set ( settings )
+    CFG.context_value.set ({})
+    initialize ()
+
+    data = None
+    if isinstance ( source, ( bytes, bytearray, memoryview )):
+        file_spec, data = 'stlmodule.stl', bytes ( source )
+    elif hasattr ( source, 'read' ):
+        file_spec, data = getattr ( source, 'name', 'stlmodule.stl' ), source.read ()
+    else:
+        file_spec = os.fspath ( source )
+    scad_model = new_scad_model ( str ( file_spec ))
+    start_file_profile ( scad_model )
+    if not build_scad_model ( scad_model, str ( file_spec ), data ):
+        raise ValueError ( '{0} could not be loaded as an STL file'.format ( file_spec ))
+    profile_counts ( scad_model )
+    if scad_text:
+        with profile_stage ( 'write' ):
+            text = model2text ( scad_model )
+    scad_model.profile = finish_file_profile ( scad_model, True, save_report = False )
+    if scad_text:
+        return scad_model, text
+    return scad_model
+# end convert_in_context (…)
+
+
+def import_libraries ():
+    """ import_libraries ()
+
+    Import the (slow to load) numerical libraries, the first time a conversion
+    is done.  Startup for --help and --version does not need them.
+
+    @outputs global np, mesh
+    """
+    global np, mesh # pylint: disable=global-statement,invalid-name
+    if np is None:
+        import numpy as np # pylint: disable=redefined-outer-name,import-outside-toplevel
+        from stl import mesh # pylint: disable=redefined-outer-name,import-outside-toplevel
+# end import_libraries (…)
+
+
+def get_cmd_line_args ( argv = None ):
+    """ get_cmd_line_args ( argv )
 
     Collect information from command line arguments
 
-    # TODO add verbose descriptions of the purpose and usage of the flags and options
+    @param argv - list of argument strings to use instead of sys.argv
     @outputs global CMD_LINE_ARGS
     """
-    global CMD_LINE_ARGS # The only place this is modified in any function
+    # save the collected information to a global structure
+    # Only modified here, and in init_worker
+    parser = cmd_line_parser ()
+    settings = parser.parse_args( argv )
+    try:
+        resolve_options ( settings )
+    except ValueError as err:
+        parser.error ( str ( err ))
+    CMD_LINE_ARGS.process_value = settings
+    # print ( CMD_LINE_ARGS.current ()) # DEBUG
+# end get_cmd_line_args (…)
+
+
+def resolve_options ( settings ):
+    """ resolve_options ( settings )
+
+    Apply the dependencies between options, for both the command line and
+    convert ().  --voids and --instances work on the disjoint surfaces, so
+    imply --split.  --merge-faces writes polygon faces, which the 2014.03
+    polyhedron triangles parameter can not hold.  Decimation takes either a
+    ratio, or a face count.  --watch converts the files in its folder, not
+    stl files given on the command line.
+
+    @param settings - argparse.Namespace with the conversion options
+    @outputs updated settings
+    @raises ValueError for options that can not be used together
+    """
+    if settings.voids or settings.instances:
+        settings.split = True
+    if settings.merge_faces and settings.scad_version == '2014.03':
+        raise ValueError ( '--merge-faces can not be used with --scad-version 2014.03' )
+    if settings.decimate_ratio is not None and settings.decimate_faces is not None:
+        raise ValueError ( '--decimate-ratio can not be used with --decimate-faces' )
+    if settings.decimate_ratio is not None and not 0 < settings.decimate_ratio <= 1:
+        raise ValueError ( '--decimate-ratio must be greater than 0, and at most 1' )
+    if settings.decimate_faces is not None and settings.decimate_faces < 1:
+        raise ValueError ( '--decimate-faces must be at least 1' )
+    if settings.watch and settings.file:
+        raise ValueError ( '--watch can not be used with stl files to convert' )
+# end resolve_options (…)
+
+
+def cmd_line_parser ():
+    """ cmd_line_parser ()
+
+    Create the parser for the command line arguments.  The same arguments are
+    the keyword options for convert ().
+
+    # TODO add verbose descriptions of the purpose and usage of the flags and options
+    @returns argparse.ArgumentParser
+    """
     parser = argparse.ArgumentParser (
         prog = 'stl2scad',
         description = 'Convert .stl format file to OpenSCAD script' )
     parser.add_argument ( '-v', '--version', action = 'version',
         version = '%(prog)s {ver}'.format ( ver = STL2SCAD_VERSION ))
-    parser.add_argument ( 'file', default = sys.stdin,
+    parser.add_argument ( 'file', default = [],
         nargs = '*',
-        type = argparse.FileType ( 'r' ),
+        type = argparse.FileType ( 'rb' ),
         # action = 'append',
-        help = 'The .stl file(s) to process' )
+        help = 'The .stl file(s) to process; - (or no files) to read from stdin' )
     # can not figure out how to tell parse to (also) accept -C without any
     # argument after it. "-C", "-C2014.03" should be treated the same
     parser.add_argument ( '-C', '--scad-version',
@@ -661,9 +3705,131 @@ def get_cmd_line_args ():
     parser.add_argument ( '-a', '--analyze',
         action = 'store_true',
         help = 'analyze the stl data for problems' )
+    parser.add_argument ( '--skip-intersections',
+        action = 'store_true',
+        help = 'with --analyze, skip checking for faces that intersect other '
+            'faces (the slowest of the checks)' )
     parser.add_argument ( '-s', '--split',
         action = 'store_true',
         help = 'output separate modules for each disjoint surface' )
+    parser.add_argument ( '--voids',
+        action = 'store_true',
+        help = 'difference surfaces that are inside of another surface (voids) '
+            'out of it (implies --split)' )
+    parser.add_argument ( '--instances',
+        action = 'store_true',
+        help = 'output a single module for identical surfaces, and translate() '
+            'it to the location of each copy (implies --split)' )
+    parser.add_argument ( '-m', '--merge-faces',
+        action = 'store_true',
+        help = 'replace connected triangle faces that are on the same plane '
+            'with a single polygon face (not with -C 2014.03)' )
+    parser.add_argument ( '-b', '--bundle',
+        action = 'store_true',
+        help = 'save all of the modules for an stl file in a single .scad file, '
+            'instead of a file for each one' )
+    parser.add_argument ( '--bundle-size',
+        type = int,
+        default = 0,
+        metavar = 'COUNT',
+        help = 'with --bundle, the maximum number of modules in each file, '
+            'plus a wrapper file to use them all; 0 for no limit (default: 0)' )
+    parser.add_argument ( '--legacy-order',
+        action = 'store_true',
+        help = 'order the polyhedron points by their text, matching the output '
+            'from version 0.0.6 and earlier' )
+    parser.add_argument ( '-t', '--keep-text',
+        action = 'store_true',
+        help = 'copy the vertex coordinate text from ascii stl files to the '
+            'scad points, without converting to numbers and back' )
+    parser.add_argument ( '-j', '--jobs',
+        type = int,
+        default = 1,
+        help = 'number of stl files to convert at the same time, using separate '
+            'processes; 0 for one per cpu (default: 1)' )
+    parser.add_argument ( '--pipeline',
+        action = 'store_true',
+        help = 'read the next stl files, and write the finished .scad files, '
+            'while converting the current one' )
+    parser.add_argument ( '--pipeline-depth',
+        type = int,
+        default = 2,
+        metavar = 'COUNT',
+        help = 'with --pipeline, the maximum number of files waiting to be '
+            'converted, and to be written (default: 2)' )
+    parser.add_argument ( '--weld',
+        type = float,
+        metavar = 'EPS',
+        help = 'merge vertexes that are within EPS distance of each other, and '
+            'drop faces that collapse' )
+    parser.add_argument ( '--decimate-ratio',
+        type = float,
+        metavar = 'RATIO',
+        help = 'reduce the number of faces by collapsing edges, for faster '
+            'previews: keep RATIO (greater than 0, up to 1) of the faces of each '
+            'object.  Slow for large models: the collapses run in python, at '
+            'several seconds per 100k faces' )
+    parser.add_argument ( '--decimate-faces',
+        type = int,
+        metavar = 'COUNT',
+        help = 'like --decimate-ratio, but keep (about) COUNT faces for the whole '
+            'model' )
+    parser.add_argument ( '--keep-full',
+        action = 'store_true',
+        help = 'with --decimate-ratio or --decimate-faces, save both the full and '
+            'the reduced modules: OpenSCAD previews use the reduced modules, and '
+            'renders the full ones' )
+    parser.add_argument ( '--memory-budget',
+        type = int,
+        default = 0,
+        metavar = 'MB',
+        help = 'the most memory to use when removing duplicate vertexes; larger '
+            'stl files are sorted in chunks, through temporary files; 0 for no '
+            'limit (default: 0)' )
+    parser.add_argument ( '--stdout',
+        action = 'store_true',
+        help = 'write the .scad source to stdout, instead of to files, with '
+            'console messages going to stderr; files are converted one at a '
+            'time (not with --watch)' )
+    parser.add_argument ( '--overwrite',
+        action = 'store_true',
+        help = 'replace existing .scad files' )
+    parser.add_argument ( '--watch',
+        metavar = 'DIR',
+        help = 'keep running, and convert stl files in the folder (and below) '
+            'when they are added or changed; existing .scad files are replaced, '
+            'and unused module files removed; no stl files can be given' )
+    parser.add_argument ( '--watch-interval',
+        type = float,
+        default = 1.0,
+        metavar = 'SECONDS',
+        help = 'with --watch, the time between checks for changed files '
+            '(default: 1.0)' )
+    parser.add_argument ( '--cache',
+        metavar = 'DIR',
+        help = 'folder to keep converted objects in, to skip loading and '
+            'processing when the same stl file is converted again (not '
+            'used to skip processing with --analyze)' )
+    parser.add_argument ( '--cache-size',
+        type = int,
+        default = 1024,
+        metavar = 'MB',
+        help = 'maximum size of the cache folder contents (default: 1024)' )
+    parser.add_argument ( '--metrics',
+        choices = [ 'csv', 'json' ],
+        help = 'save the volume, area, bounding box, centroid and counts of '
+            'each object beside the .scad file(s)' )
+    parser.add_argument ( '--profile',
+        action = 'store_true',
+        help = 'save stage timing and counts as json: one report beside the '
+            '.scad file(s) of each stl file, and a run summary' )
+    parser.add_argument ( '--profile-summary',
+        default = 'stl2scad_profile.json',
+        metavar = 'FILE',
+        help = 'file for the --profile run summary (default: stl2scad_profile.json)' )
+    parser.add_argument ( '--profile-memory',
+        action = 'store_true',
+        help = 'include the peak (traced) memory of each stage in --profile reports' )
     parser.add_argument ( '-V', '--verbose',
         # IDEA TODO change to numeric verbosity; change to count instances
         # nargs = 0,
@@ -684,10 +3850,8 @@ def get_cmd_line_args ():
 #  --opt v1 file1 --opt v2 file2
 # global sequence numbering
 
-    # save the collected information to a global structure
-    CMD_LINE_ARGS = parser.parse_args()
-    # print ( CMD_LINE_ARGS ) # DEBUG
-# end get_cmd_line_args (…)
+    return parser
+# end cmd_line_parser (…)
 
 
 def initialize ():
@@ -698,7 +3862,8 @@ def initialize ():
     @inputs global CMD_LINE_ARGS
     @outputs global CFG
     """
-    global CFG # The only place this is modified in any function
+    # CFG Only modified here, and in init_worker
+    import_libraries ()
 
     # Create some configuration values one time that will (or at least could)
     # get reused
@@ -710,8 +3875,7 @@ def initialize ():
         '{indent2}points=[\n{indent3}{lMark}pts{rMark}\n{indent2}],\n'
         '{indent2}{compat}=[\n{indent3}{lMark}faces{rMark}\n{indent2}]\n'
         '{indent1});\n'
-        '{rMark}{rMark}\n\n'
-        '{lMark}name{rMark}();\n'.format (
+        '{rMark}{rMark}\n'.format (
             lMark = '{',
             rMark = '}',
             indent1 = CMD_LINE_ARGS.indent * 1,
@@ -721,22 +3885,64 @@ def initialize ():
         ))
     # string to use to join a set of vectors for output to a .scad file
     CFG [ 'dataJoin' ] = ',\n{indent3}'.format ( indent3 = CMD_LINE_ARGS.indent * 3 )
+    # moduleFormat split around the points and faces data, for streamed output
+    module_head, module_rest = CFG [ 'moduleFormat' ].split ( '{pts}', 1 )
+    CFG [ 'moduleParts' ] = ( module_head, ) + tuple ( module_rest.split ( '{faces}', 1 ))
+    # statement to use (call) a module
+    CFG [ 'moduleCall' ] = '{name}();\n'
+    # module to pick the reduced (--keep-full) module for previews
+    CFG [ 'previewModule' ] = (
+        'module {lMark}name{rMark}() {lMark}{lMark}\n'
+        '{indent1}if ($preview) {lMark}name{rMark}_preview();\n'
+        '{indent1}else {lMark}name{rMark}_full();\n'
+        '{rMark}{rMark}\n'.format (
+            lMark = '{',
+            rMark = '}',
+            indent1 = CMD_LINE_ARGS.indent * 1
+        ))
     # print ( 'moduleFormat:\n%s' % CFG [ 'moduleFormat'] ) # DEBUG
     # print ( 'datajoin: "%s"' % CFG [ 'dataJoin' ] ) # DEBUG
 # end initialize (…)
 
 
-def get_mesh ( file_spec ):
-    """ get_mesh ( file_spec )
+def stl_file_content ( f_handle ):
+    """ stl_file_content ( f_handle )
+
+    Get the content of an open stl file, to pass to the loader, so the file
+    does not need to be opened again by name.
+
+    A regular file (including stdin redirected from one) is memory mapped from
+    the open handle, so the facet records of a binary stl file are still only
+    read when they are used.  Anything else (a pipe) is read to the end.
+
+    @param f_handle - handle for stl file, opened in binary mode
+    @returns the file content, as a read only mmap, or bytes
+    """
+    try:
+        return mmap.mmap ( f_handle.fileno (), 0, access = mmap.ACCESS_READ )
+    except ( OSError, ValueError, io.UnsupportedOperation ): # not a (non empty) regular file
+        return f_handle.read ()
+# end stl_file_content (…)
+
+
+def get_mesh ( file_spec, data = None ):
+    """ get_mesh ( file_spec, data )
 
     Load an (ascii or binary) stl file to a mesh structure
 
+    Binary stl files are memory mapped (map_binary_stl).  Anything else is loaded
+    by numpy-stl.
+
     @param file_spec - full file path specification for stl file to load
-    @returns numpy-stl mesh.Mesh.from_file or None
+    @param data - the stl file content, when it has already been read
+    @returns numpy-stl mesh.Mesh or None
     """
     stl_mesh = None
     try:
-        stl_mesh = mesh.Mesh.from_file( file_spec )
+        stl_mesh = map_binary_stl ( file_spec, data )
+        if stl_mesh is None: # not binary, let the library figure it out
+            stl_mesh = mesh.Mesh.from_file( file_spec,
+                fh = None if data is None else io.BytesIO ( data ))
     except AssertionError: # error cases explicitly checked for by the library code
         _t, err_details, _tb = sys.exc_info()
         print('\n|%s| is probably not a (valid) STL file.\nLibrary refused to load it. '
@@ -751,6 +3957,162 @@ def get_mesh ( file_spec ):
 # end get_mesh (…)
 
 
+def map_binary_stl ( file_spec, data = None ):
+    """ map_binary_stl ( file_spec, data )
+
+    Memory map a binary stl file, and use the facet records in place.
+
+    The file is used as a numpy structured array (the numpy-stl mesh dtype), so
+    nothing is read until it is used, nothing is copied, and the facet vertex
+    coordinates (mesh.vectors) are a strided view into the mapped file.  The
+    mapping is read only; normals are not recalculated.
+
+    A file is treated as binary stl when the size matches the facet count from
+    the header.  Files that do not match (ascii, damaged, truncated) are left
+    for numpy-stl to load (or reject).
+
+    When the file content has already been read, the facet records are used in
+    place in that, the same way.
+
+    @param file_spec - full file path specification for stl file to load
+    @param data - the stl file content, when it has already been read
+    @returns numpy-stl mesh.Mesh using the mapped data, or None
+    """
+    if data is not None:
+        facet_count = binary_stl_facet_count ( data, len ( data ))
+        if facet_count is None:
+            return None
+        mapped = data
+    else:
+        with open ( file_spec, 'rb' ) as f_stl:
+            file_size = os.fstat ( f_stl.fileno ()).st_size
+            facet_count = binary_stl_facet_count (
+                f_stl.read ( STL_HEADER_SIZE + STL_COUNT_SIZE ), file_size )
+            if facet_count is None:
+                return None
+            mapped = mmap.mmap ( f_stl.fileno (), 0, access = mmap.ACCESS_READ )
+        # the mapping stays open as long as there are arrays using it
+
+    facets = np.frombuffer ( mapped, dtype = mesh.Mesh.dtype, count = facet_count,
+        offset = STL_HEADER_SIZE + STL_COUNT_SIZE )
+    return mesh.Mesh ( facets, calculate_normals = False,
+        name = mapped [ :STL_HEADER_SIZE ].strip ()) # same name as numpy-stl uses
+# end map_binary_stl (…)
+
+
+def binary_stl_facet_count ( prefix, file_size ):
+    """ binary_stl_facet_count ( prefix, file_size )
+
+    Get the number of facets in a binary stl file, if the file size matches
+
+    @param prefix - bytes from the start of the file: at least header and count
+    @param file_size - total size of the file in bytes
+    @returns number of facets in the file, or None when not a binary stl file
+    """
+    if len ( prefix ) < STL_HEADER_SIZE + STL_COUNT_SIZE:
+        return None
+    facet_count = int.from_bytes (
+        prefix [ STL_HEADER_SIZE: STL_HEADER_SIZE + STL_COUNT_SIZE ], 'little' )
+    if file_size != ( STL_HEADER_SIZE + STL_COUNT_SIZE +
+            facet_count * mesh.Mesh.dtype.itemsize ):
+        return None
+    return facet_count
+# end binary_stl_facet_count (…)
+
+
+def ascii_stl_vertexes ( f_stl, chunk_size = 1 << 20 ):
+    """ ascii_stl_vertexes ( f_stl, chunk_size )
+
+    Generator for the vertex coordinate text from an ascii stl file, a chunk at
+    a time.
+
+    Each chunk is cut at the last line end, then the 3 coordinate strings
+    following every `vertex` keyword are pulled out.  The coordinate text is
+    not converted to numbers.
+
+    When reading from a memory mapped file, the pages already copied to a
+    chunk are released, so the mapped file does not stay resident.
+
+    @param f_stl - handle for stl file opened in binary mode, or a read only mmap
+    @param chunk_size - approximate number of bytes to process together
+    @returns (yields) list of ( x, y, z ) vertex coordinate bytes for each chunk
+    """
+    vertex_pattern = re.compile (
+        rb'vertex[ \t]+([^\s]+)[ \t]+([^\s]+)[ \t]+([^\s]+)', re.IGNORECASE )
+    release = isinstance ( f_stl, mmap.mmap ) and hasattr ( mmap, 'MADV_DONTNEED' )
+    partial_line = b''
+    while True:
+        chunk = f_stl.read ( chunk_size )
+        if not chunk:
+            break
+        if release:
+            f_stl.madvise ( mmap.MADV_DONTNEED, 0,
+                f_stl.tell () - f_stl.tell () % mmap.PAGESIZE )
+        chunk = partial_line + chunk
+        line_end = chunk.rfind ( b'\n' ) + 1
+        partial_line = chunk [ line_end: ]
+        yield vertex_pattern.findall ( chunk, 0, line_end )
+    if partial_line:
+        yield vertex_pattern.findall ( partial_line )
+# end ascii_stl_vertexes (…)
+
+
+def ascii_stl2minimized_polyhedron ( mdl, file_spec, data = None ):
+    """ ascii_stl2minimized_polyhedron ( mdl, file_spec, data )
+
+    Populate .scad 3d polyhedron model directly from the text of an ascii stl
+    file, keeping the original vertex coordinate text.
+
+    design.md: stl ASCII vertex format text is close enough to a point in an
+    scad polyhedron to not need to convert to floating point and back.  Vertex
+    points are made unique by their coordinate text (ignoring the white space
+    between the coordinates), and kept in the order first seen.  The points of
+    the generated object are a ( n, 3 ) numpy array of coordinate strings, which
+    are written to the .scad file unchanged.
+
+    @param mdl - the 3d scad model to update
+    @param file_spec - full file path specification for stl file to load
+    @param data - the stl file content, when it has already been read
+    @returns True if the file was loaded, False if it is not an ascii stl file
+    @outputs updated mdl
+    """
+    if data is None:
+        stl_context = open ( file_spec, 'rb' )
+    elif isinstance ( data, mmap.mmap ):
+        # read lines straight from the (caller owned) map: a copy of it would
+        # hold the whole file in memory
+        data.seek ( 0 )
+        stl_context = contextlib.nullcontext ( data )
+    else: # content read from a pipe
+        stl_context = io.BytesIO ( data )
+    with stl_context as f_stl:
+        file_size = len ( data ) if data is not None else os.fstat ( f_stl.fileno ()).st_size
+        prefix = f_stl.readline ()
+        if ( not prefix.lstrip ().lower ().startswith ( b'solid' ) or
+                binary_stl_facet_count ( prefix + f_stl.read (
+                    STL_HEADER_SIZE + STL_COUNT_SIZE ), file_size ) is not None ):
+            return False # binary stl file
+        f_stl.seek ( len ( prefix ))
+
+        point_lookup = {} # vertex text to point index
+        face_points = []
+        for vertex_text in ascii_stl_vertexes ( f_stl ):
+            face_points.append ( np.array ([ point_lookup.setdefault (
+                vtx, len ( point_lookup )) for vtx in vertex_text ], dtype = np.int32 ))
+
+    face_points = np.concatenate ( face_points ) if face_points else np.empty ( 0, np.int32 )
+    if len ( face_points ) % 3 != 0:
+        print ( '\n|%s| does not have 3 vertexes for every facet' % file_spec )
+        return False
+    mdl.solid = prefix.strip () [ 5: ].strip ().decode ( 'ascii' )
+    mdl.objects.append ( ScadObject (
+        np.char.decode ( np.array ( list ( point_lookup ),
+            dtype = bytes ).reshape (( -1, 3 )), 'ascii' ),
+        np.reshape ( face_points, ( -1, 3 ))))
+    return True
+# end ascii_stl2minimized_polyhedron (…)
+
+
 def file_path_info ( f_handle ):
     """show file path information for a file handle"""
     # keep (part) around for --verbose
@@ -806,18 +4168,19 @@ def show_mesh_info ( msh ):
     between ascii and binary
     """
     vol, cog, inertia = msh.get_mass_properties()
-    bounding_box = np.array ([
-        [ min(np.reshape(msh.x, -1)), min(np.reshape(msh.y, -1)), min(np.reshape(msh.z, -1))],
-        [ max(np.reshape(msh.x, -1)), max(np.reshape(msh.y, -1)), max(np.reshape(msh.z, -1))]])
+    vertexes = np.reshape ( msh.vectors, ( -1, 3 ))
+    bounding_box = np.array ([ vertexes.min ( axis = 0 ), vertexes.max ( axis = 0 )])
+    area = 0.5 * np.linalg.norm ( np.cross ( msh.v1 - msh.v0, msh.v2 - msh.v0 ), axis = 1 ).sum ()
     print ( '\nSTL Mesh properties:\n'
         '\nName = "{0}"'
         '\nVolume = {1}'
+        '\nSurface area = {7}'
         '\n{2} Facets, {3} Vertexes'
         '\nPosition of the center of gravity (COG):\n{4}'
         '\nInertia matrix expressed at the COG:\n{5}'
         '\nBounding Box:\n{6}'
         ''.format ( msh.name, vol, len ( msh ), 3 * len ( msh.v0 ), cog,
-        inertia, bounding_box ))
+        inertia, bounding_box, area ))
 
     if min ( bounding_box [ 0 ]) <= 0:
         print ( '\nNOTE: Not a standard STL source file;\n'
@@ -834,7 +4197,7 @@ if __name__ == '__main__':
 # names, variable names, keywords
 #   cSpell:words riham rslt stlmodule nargs statvfs fileno pylint
 # functions, methods
-#   cSpell:words arange tolist
+#   cSpell:words arange tolist lexsort cumsum ascontiguousarray argsort nbytes reduceat
 # terms
 #   cSpell:words dedup
 # cSpell:words